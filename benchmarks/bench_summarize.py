@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+summarize_export.py のサマリ生成パスのベンチマーク
+
+シード固定で AIPerf 形式の export（profile_export.jsonl）を生成し、次の各ステージの
+実行時間（wall time）とピークメモリをサイズ・フィールド名のバリアントごとに測定します。
+
+- load: load_export_data（JSONL の読み込み）
+- extract_ttft / extract_latency / extract_itl: extract_metric_values
+- percentiles: calculate_percentiles（TTFT / Latency / ITL の3回分）
+- tokens_per_sec: extract_tokens_per_sec
+
+結果は baseline と比較し、wall time かピークメモリが許容幅（デフォルト +50%）を超えた
+ステージを回帰として報告します（--save-baseline で現在の結果を baseline にする）。
+回帰、子プロセスで失敗したケース、baseline が無い（比較できたケースが無い）場合は終了コード1で失敗します。
+baseline はマシンと Python のバージョンに依存するため、ホストごとに
+benchmarks/baselines/<ホスト名>-py<バージョン>.json（git 管理外）に記録し、同じファイルと比較します。
+
+ピークメモリは TRACEMALLOC_MAX_RECORDS 件以下のサイズではステージごとに tracemalloc で測定します。
+load_export_data は全レコードを list に保持するため 1m で約3GB を使い、tracemalloc を有効にすると
+メモリが足りなくなるので、それより大きいサイズはケースごとに子プロセスで実行し、子プロセス全体の
+ピークRSS（os.wait4 で得る rusage の ru_maxrss）を process_rss ステージとして記録します。
+10m は現在のローダーでは 5GB 程度のマシンには載らないため、明示的に指定した場合のみ実行します。
+
+使用例:
+    python benchmarks/bench_summarize.py                       # 10k, 1m × 全バリアント
+    python benchmarks/bench_summarize.py --sizes 10k,1m,10m --variants aiperf
+    python benchmarks/bench_summarize.py --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from summarize_export import (  # noqa: E402
+    calculate_percentiles,
+    extract_metric_values,
+    extract_tokens_per_sec,
+    load_export_data,
+)
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+DEFAULT_SEED = 42
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_SIZES = "10k,1m"
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+VARIANTS = ("aiperf", "flat", "alias")
+# tracemalloc でピークメモリを測定するサイズの上限（オーバーヘッドで 1m はメモリ不足になる）。
+# これより大きいサイズは子プロセスのピークRSSを測定する
+TRACEMALLOC_MAX_RECORDS = 100_000
+# 子プロセスで実行したケースのピークRSSを記録するステージ名
+PROCESS_STAGE = "process_rss"
+# これより短いステージの wall time は揺らぎが大きいため回帰判定しない
+MIN_COMPARABLE_WALL_SEC = 0.05
+# 生成するレコードのうちエラー（HTTP 429）にする割合
+ERROR_RATE = 0.01
+
+
+def _record(rng: random.Random, index: int, variant: str) -> Dict[str, Any]:
+    """1リクエスト分のレコード（値は対数正規分布、単位は ms）"""
+    start_ns = 1_700_000_000_000_000_000 + index * 5_000_000
+    if rng.random() < ERROR_RATE:
+        return {
+            "metadata": {"request_start_ns": start_ns, "request_end_ns": start_ns + 2_000_000},
+            "error": {"code": 429, "type": "RateLimitError", "message": "Rate limit reached"},
+        }
+
+    ttft = rng.lognormvariate(4.5, 0.5)
+    itl = rng.lognormvariate(3.0, 0.3)
+    output_tokens = rng.randint(16, 512)
+    input_tokens = rng.randint(64, 4096)
+    latency = ttft + itl * (output_tokens - 1)
+
+    if variant == "flat":
+        # 直接フィールド・別名（ttft / latency / itl / output_tokens）
+        return {
+            "request_start_ns": start_ns,
+            "request_end_ns": start_ns + int(latency * 1e6),
+            "ttft": ttft,
+            "latency": latency,
+            "itl": itl,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+        }
+
+    def metric(value: float, unit: str) -> Dict[str, Any]:
+        return {"value": value, "unit": unit}
+
+    metadata = {
+        "request_start_ns": start_ns,
+        "request_end_ns": start_ns + int(latency * 1e6),
+        "x_correlation_id": f"session-{index}",
+        "turn_index": 0,
+    }
+    if variant == "alias":
+        # metrics 辞書内の別名
+        metrics = {
+            "time_to_first_output_token": metric(ttft, "ms"),
+            "e2e_latency": metric(latency, "ms"),
+            "inter_chunk_latency": metric(itl, "ms"),
+            "prompt_tokens": metric(input_tokens, "tokens"),
+            "completion_tokens": metric(output_tokens, "tokens"),
+        }
+    else:
+        # AIPerf の export と同じフィールド名
+        metrics = {
+            "time_to_first_token": metric(ttft, "ms"),
+            "request_latency": metric(latency, "ms"),
+            "inter_token_latency": metric(itl, "ms"),
+            "input_sequence_length": metric(input_tokens, "tokens"),
+            "output_token_count": metric(output_tokens, "tokens"),
+            "output_sequence_length": metric(output_tokens, "tokens"),
+        }
+    return {"metadata": metadata, "metrics": metrics}
+
+
+def generate_records(count: int, variant: str = "aiperf", seed: int = DEFAULT_SEED) -> Iterator[Dict[str, Any]]:
+    """シード固定でレコードを生成する（同じシードならバリアントが違ってもフィールド名以外は同じ値）"""
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown variant: {variant} (choose from {', '.join(VARIANTS)})")
+    rng = random.Random(seed)
+    for index in range(count):
+        yield _record(rng, index, variant)
+
+
+def write_export(path: Path, count: int, variant: str, seed: int = DEFAULT_SEED) -> Path:
+    """生成したレコードを profile_export.jsonl 形式で書き出す"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for record in generate_records(count, variant, seed):
+            f.write(json.dumps(record) + "\n")
+    return path
+
+
+def measure(fn: Callable[[], Any], track_memory: bool = True) -> Tuple[Any, float, Optional[float]]:
+    """fn を実行し、(戻り値, wall time 秒, ピークメモリ MB) を返す
+
+    tracemalloc は実行を遅くするため、wall time は tracemalloc なしの実行で測り、
+    ピークメモリはもう1回 tracemalloc を有効にして実行して測る。
+    """
+    start = time.perf_counter()
+    result = fn()
+    wall_sec = time.perf_counter() - start
+    if not track_memory:
+        return result, wall_sec, None
+
+    del result
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, wall_sec, peak / (1024 * 1024)
+
+
+def run_benchmark(export_path: Path, track_memory: bool = True) -> Dict[str, Dict[str, Any]]:
+    """1つの export に対して各ステージを測定"""
+    results: Dict[str, Dict[str, Any]] = {}
+
+    def record(stage: str, fn: Callable[[], Any]) -> Any:
+        value, wall_sec, peak_mb = measure(fn, track_memory)
+        results[stage] = {"wall_sec": round(wall_sec, 4), "peak_mb": round(peak_mb, 3) if peak_mb is not None else None}
+        return value
+
+    data = record("load", lambda: load_export_data([export_path]))
+    results["load"]["records"] = len(data)
+    values = {}
+    for stage, metric in [("extract_ttft", "time_to_first_token"), ("extract_latency", "request_latency"),
+                          ("extract_itl", "inter_token_latency")]:
+        values[metric] = record(stage, lambda m=metric: extract_metric_values(data, m))
+        results[stage]["values"] = len(values[metric])
+    record("percentiles", lambda: [calculate_percentiles(v) for v in values.values()])
+    tps = record("tokens_per_sec", lambda: extract_tokens_per_sec(data))
+    results["tokens_per_sec"]["values"] = len(tps)
+    return results
+
+
+def _maxrss_mb(maxrss: int) -> float:
+    """ru_maxrss を MB に変換（Linux は KB、macOS はバイト単位）"""
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def run_benchmark_subprocess(export_path: Path) -> Tuple[Optional[Dict[str, Dict[str, Any]]], float, int]:
+    """子プロセスで run_benchmark（tracemalloc なし）を実行し、(結果, ピークRSS MB, 終了コード) を返す
+
+    RUSAGE_CHILDREN の ru_maxrss はそれまでに終了した全ての子プロセスの最大値になるため、
+    os.wait4 でこの子プロセスだけの rusage を受け取る。
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--child-export", str(export_path)],
+        stdout=subprocess.PIPE,
+    )
+    output = process.stdout.read()
+    process.stdout.close()
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall_sec = time.perf_counter() - start
+    peak_mb = _maxrss_mb(rusage.ru_maxrss)
+    if process.returncode != 0:
+        return None, peak_mb, process.returncode
+
+    results = json.loads(output)
+    results[PROCESS_STAGE] = {"wall_sec": round(wall_sec, 4), "peak_mb": round(peak_mb, 3)}
+    return results, peak_mb, process.returncode
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Dict[str, Any]]],
+    baseline: Dict[str, Dict[str, Dict[str, Any]]],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """baseline より wall time / ピークメモリが (1 + tolerance) 倍を超えたステージを返す
+
+    MIN_COMPARABLE_WALL_SEC 未満の wall time と、baseline に無いケース・ステージは比較しない。
+    """
+    regressions = []
+    for case, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(case, {}).get(stage)
+            if not previous:
+                continue
+            for key, unit in [("wall_sec", "s"), ("peak_mb", "MB")]:
+                before, after = previous.get(key), current.get(key)
+                if before is None or after is None or before <= 0:
+                    continue
+                if key == "wall_sec" and after < MIN_COMPARABLE_WALL_SEC:
+                    continue
+                if after > before * (1 + tolerance):
+                    regressions.append(
+                        f"{case} {stage}: {key} {before:.3f}{unit} -> {after:.3f}{unit} (+{(after / before - 1) * 100:.0f}%)"
+                    )
+    return regressions
+
+
+def default_baseline_path() -> Path:
+    """このホスト・Python バージョン用の baseline のパス"""
+    host = re.sub(r"[^A-Za-z0-9._-]", "_", socket.gethostname()) or "unknown"
+    version = ".".join(platform.python_version_tuple()[:2])
+    return BASELINE_DIR / f"{host}-py{version}.json"
+
+
+def load_baseline(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results: Dict[str, Any], path: Path) -> Path:
+    """既存の baseline に今回測定したケースを上書きして保存"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    baseline = load_baseline(path)
+    baseline.setdefault("results", {}).update(results)
+    baseline["machine"] = machine_info()
+    baseline["recorded_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+    return path
+
+
+def machine_info() -> Dict[str, Any]:
+    return {
+        "hostname": socket.gethostname(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def machine_mismatches(recorded: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """baseline を記録したマシンと今のマシンで異なる項目（Python はマイナーバージョンまで比較）"""
+    mismatches = []
+    for key in ("hostname", "platform", "cpu_count", "python"):
+        before, after = recorded.get(key), current.get(key)
+        if key == "python" and before and after:
+            before, after = ".".join(str(before).split(".")[:2]), ".".join(str(after).split(".")[:2])
+        if before is not None and before != after:
+            mismatches.append(f"{key}: {recorded.get(key)} -> {current.get(key)}")
+    return mismatches
+
+
+def format_results(results: Dict[str, Dict[str, Dict[str, Any]]]) -> List[str]:
+    lines = [f"{'case':<14}{'stage':<18}{'wall (s)':>10}{'peak (MB)':>12}{'per 1k rec (ms)':>18}"]
+    for case, stages in results.items():
+        records = stages["load"]["records"] or 1
+        for stage, stats in stages.items():
+            peak = f"{stats['peak_mb']:.1f}" if stats["peak_mb"] is not None else "-"
+            lines.append(
+                f"{case:<14}{stage:<18}{stats['wall_sec']:>10.3f}{peak:>12}"
+                f"{stats['wall_sec'] / records * 1e6:>18.3f}"
+            )
+    return lines
+
+
+def _parse_list(value: str, allowed) -> List[str]:
+    items = [v.strip().lower() for v in value.split(",") if v.strip()]
+    unknown = [v for v in items if v not in allowed]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown value(s): {', '.join(unknown)} (choose from {', '.join(allowed)})")
+    return items
+
+
+def report_failures(failures: Dict[str, Dict[str, Any]]):
+    """子プロセスで失敗したケースがあれば報告して終了コード1で終了"""
+    if not failures:
+        return
+    print(f"Error: {len(failures)} case(s) failed and were not measured: {', '.join(failures)}", file=sys.stderr)
+    sys.exit(1)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="summarize_export.py のサマリ生成パスのベンチマーク")
+    parser.add_argument("--sizes", type=lambda v: _parse_list(v, SIZES), default=_parse_list(DEFAULT_SIZES, SIZES),
+                        help=f"レコード数（{', '.join(SIZES)}。デフォルト: {DEFAULT_SIZES}）")
+    parser.add_argument("--variants", type=lambda v: _parse_list(v, VARIANTS), default=list(VARIANTS),
+                        help=f"フィールド名のバリアント（{', '.join(VARIANTS)}。デフォルト: すべて）")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"乱数シード（デフォルト: {DEFAULT_SEED}）")
+    parser.add_argument("--data-dir", default=None,
+                        help="生成した export を置くディレクトリ（指定すると再利用する。デフォルト: 一時ディレクトリ）")
+    parser.add_argument("--no-memory", action="store_true", help="ピークメモリを測定しない（大きなサイズで時間を短縮）")
+    parser.add_argument("--baseline", default=None,
+                        help="baseline のパス（デフォルト: benchmarks/baselines/<ホスト名>-py<バージョン>.json）")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を baseline として保存")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"回帰とみなす増加率（デフォルト: {DEFAULT_TOLERANCE} = +50%%）")
+    parser.add_argument("--output", default=None, help="結果を JSON で保存するパス")
+    parser.add_argument("--child-export", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child_export:
+        # run_benchmark_subprocess から起動された子プロセス: 結果を stdout に JSON で返す
+        print(json.dumps(run_benchmark(Path(args.child_export), track_memory=False)))
+        return
+
+    results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    failures: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(args.data_dir) if args.data_dir else Path(tmp)
+        for size in args.sizes:
+            for variant in args.variants:
+                case = f"{size}/{variant}"
+                export_path = data_dir / f"{size}_{variant}_seed{args.seed}.jsonl"
+                if not export_path.exists():
+                    print(f"Generating {case} -> {export_path}", file=sys.stderr)
+                    write_export(export_path, SIZES[size], variant, args.seed)
+                print(f"Benchmarking {case}...", file=sys.stderr)
+                if args.no_memory or SIZES[size] <= TRACEMALLOC_MAX_RECORDS:
+                    results[case] = run_benchmark(export_path, track_memory=not args.no_memory)
+                    continue
+                print(f"Note: Measuring peak RSS of a subprocess for {case} (> {TRACEMALLOC_MAX_RECORDS} records)",
+                      file=sys.stderr)
+                case_results, peak_mb, returncode = run_benchmark_subprocess(export_path)
+                if case_results is None:
+                    print(f"Error: {case} failed in the subprocess (exit code {returncode}, peak RSS {peak_mb:.0f}MB)",
+                          file=sys.stderr)
+                    failures[case] = {"returncode": returncode, "peak_mb": round(peak_mb, 1)}
+                    continue
+                results[case] = case_results
+
+    print("\n".join(format_results(results)))
+    if args.output:
+        output = {"machine": machine_info(), "results": results, "failures": failures}
+        Path(args.output).write_text(json.dumps(output, indent=2) + "\n", encoding="utf-8")
+
+    baseline_path = Path(args.baseline) if args.baseline else default_baseline_path()
+    if args.save_baseline:
+        print(f"Baseline saved to: {save_baseline(results, baseline_path)}", file=sys.stderr)
+        report_failures(failures)
+        return
+
+    baseline = load_baseline(baseline_path)
+    if not baseline:
+        print(f"Error: No baseline found at {baseline_path}; nothing was compared "
+              "(run with --save-baseline to create one)", file=sys.stderr)
+        report_failures(failures)
+        sys.exit(1)
+    mismatches = machine_mismatches(baseline.get("machine", {}), machine_info())
+    if mismatches:
+        print(f"Warning: Baseline was recorded on a different machine ({'; '.join(mismatches)}); "
+              "comparisons may not be meaningful", file=sys.stderr)
+    uncompared = [case for case in results if case not in baseline.get("results", {})]
+    if uncompared:
+        print(f"Warning: Not in the baseline, not compared: {', '.join(uncompared)}", file=sys.stderr)
+    regressions = compare_to_baseline(results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        print(f"Error: {len(regressions)} regression(s) against {baseline_path}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+    nothing_compared = bool(results) and len(uncompared) == len(results)
+    if nothing_compared:
+        print(f"Error: No case was compared against {baseline_path}", file=sys.stderr)
+    report_failures(failures)
+    if regressions or nothing_compared:
+        sys.exit(1)
+    print(f"No regressions against {baseline_path} (tolerance +{args.tolerance * 100:.0f}%)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,8 +30,14 @@ case "${1:-help}" in
         bash -c 'for c in 1 5 10 20 50; do CONCURRENCY=$c REQUEST_COUNT=$((c * 3)) bash scripts/run_aiperf_profile.sh sweep_$c; done'
         python3 scripts/summarize_export.py
         ;;
+    coordinator)
+        python3 scripts/distributed_run.py coordinator
+        ;;
+    shard)
+        python3 scripts/distributed_run.py shard
+        ;;
     *)
-        echo "Usage: docker run ... [setup|smoke|warmup|profile|summary|sweep]"
+        echo "Usage: docker run ... [setup|smoke|warmup|profile|summary|sweep|coordinator|shard]"
         echo ""
         echo "Available commands:"
         echo "  setup    - Show setup info (dependencies already installed)"
@@ -40,6 +46,8 @@ case "${1:-help}" in
         echo "  profile  - Run full profile benchmark"
         echo "  summary  - Generate summary from artifacts"
         echo "  sweep    - Run concurrency sweep"
+        echo "  coordinator - Start barrier for distributed shards and merge their exports (DIST_SHARDS)"
+        echo "  shard    - Run one load-generator shard (DIST_COORDINATOR_URL)"
         exit 1
         ;;
 esac
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+レート制限に合わせたリクエストレートの自動調整（AIMD）
+
+OpenAI API のようにクォータで 429 が返るエンドポイントに対して、本番の profile 実行前に
+本番と同じ大きさのリクエスト（入力 INPUT_TOKENS_MEAN 語程度のプロンプト、max_tokens=OUTPUT_TOKENS_MEAN）を
+送るプローブを行い、AIMD（加算的増加・乗算的減少）で 429 が出ない持続可能なリクエストレートを探します。
+リクエスト数だけでなくトークン数（1分あたり）の制限も、本番と同じ量を消費して検出するためです。
+
+- 429 が出なかったウィンドウ: rate += increase_step（同時実行数の上限で送れなかった分があれば増やさない）
+- 429 が出たウィンドウ: rate *= decrease_factor（Retry-After の間は送信を止める）
+- x-ratelimit-limit-requests（1分あたり）があれば、その値 / 60 を上限にする
+- x-ratelimit-limit-tokens（1分あたり）があれば、その値 / (ISL + OSL) / 60 も上限にする
+- x-ratelimit-remaining-requests が 0、または remaining-tokens が1リクエスト分未満のウィンドウでは増加しない
+- 持続可能なレート: 目標レートではなく、プローブ後半に実際に成功したリクエスト数 / 秒
+- 同時実行数は max_in_flight までに制限し、上限に達しているときの送信は行わずに数える
+  （キューに溜めない。プローブ時間の終了後に溜まったリクエストが送られることもない）
+
+結果は artifactディレクトリの pacing.json に保存し、持続可能なレートを標準出力に出します。
+run_aiperf_profile.sh は ADAPTIVE_PACING=1 のとき、この値を --request-rate として渡します。
+
+使用例:
+    python scripts/adaptive_pacing.py --output artifacts/ISL100_OSL200_CON10/pacing.json
+"""
+
+import argparse
+import email.utils
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # pragma: no cover
+    load_dotenv = None  # type: ignore
+
+PACING_FILE_NAME = "pacing.json"
+OPENAI_CHAT_ENDPOINT = "https://api.openai.com/v1/chat/completions"
+
+DEFAULT_INITIAL_RATE = 1.0
+DEFAULT_MIN_RATE = 0.1
+DEFAULT_INCREASE_STEP = 0.5
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_WINDOW_SEC = 2.0
+DEFAULT_DURATION_SEC = 30.0
+DEFAULT_SAFETY_FACTOR = 0.9
+DEFAULT_MAX_IN_FLIGHT = 32
+# run_aiperf_profile.sh の INPUT_TOKENS_MEAN / OUTPUT_TOKENS_MEAN の既定値と同じ
+DEFAULT_INPUT_TOKENS = 100
+DEFAULT_OUTPUT_TOKENS = 200
+# プローブのプロンプトに並べる単語（多くの tokenizer で1語1トークン程度）
+PROBE_FILLER_WORD = "hello"
+
+# "6m0s", "1.5s", "20ms", "1h2m" のような x-ratelimit-reset-* の値
+DURATION_PART_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """x-ratelimit-reset-* の値（"6m0s", "20ms" や秒数）を秒に変換"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART_PATTERN.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """retry-after-ms / Retry-After（秒またはHTTP日付）から待ち時間（秒）を取得"""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> Dict[str, Any]:
+    """OpenAI API 形式のレート制限ヘッダを読む（ヘッダ名は小文字で渡す）"""
+    return {
+        "limit_requests": _int_header(headers, "x-ratelimit-limit-requests"),
+        "remaining_requests": _int_header(headers, "x-ratelimit-remaining-requests"),
+        "reset_requests_sec": parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+        "limit_tokens": _int_header(headers, "x-ratelimit-limit-tokens"),
+        "remaining_tokens": _int_header(headers, "x-ratelimit-remaining-tokens"),
+        "reset_tokens_sec": parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+        "retry_after_sec": parse_retry_after(headers),
+    }
+
+
+class AIMDController:
+    """ウィンドウ単位の AIMD でリクエストレート（件/秒）を調整する
+
+    record() はワーカースレッドから呼ばれる。end_window() でそのウィンドウに完了した
+    リクエストの結果からレートを更新する（429 がいくつ出ても減少は1ウィンドウ1回）。
+    record_skipped() は同時実行数の上限で送れなかった送信を数え、そのウィンドウではレートを増やさない。
+    tokens_per_request（本番の ISL + OSL）を渡すと、トークン数の制限ヘッダからもレートの上限を決める。
+    """
+
+    def __init__(
+        self,
+        initial_rate: float = DEFAULT_INITIAL_RATE,
+        min_rate: float = DEFAULT_MIN_RATE,
+        max_rate: Optional[float] = None,
+        increase_step: float = DEFAULT_INCREASE_STEP,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        tokens_per_request: Optional[float] = None,
+    ):
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+        self.rate = initial_rate
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.tokens_per_request = tokens_per_request
+        self.header_max_rate: Optional[float] = None
+        self.header_token_max_rate: Optional[float] = None
+        self.windows: List[Dict[str, Any]] = []
+        self.elapsed_sec = 0.0
+        self.lock = threading.Lock()
+        self._reset_window()
+
+    def _reset_window(self):
+        self._ok = 0
+        self._rate_limited = 0
+        self._errors = 0
+        self._skipped = 0
+        self._retry_after: Optional[float] = None
+        self._near_limit = False
+
+    @property
+    def ceiling(self) -> Optional[float]:
+        """設定値とレート制限ヘッダ（リクエスト数・トークン数）から決まるレートの上限"""
+        limits = [v for v in (self.max_rate, self.header_max_rate, self.header_token_max_rate) if v]
+        return min(limits) if limits else None
+
+    def record(self, status: Optional[int], headers: Mapping[str, str]):
+        """1リクエストの結果（HTTPステータス、接続失敗は None）を記録"""
+        limits = parse_rate_limit_headers(headers)
+        with self.lock:
+            if status == 429:
+                self._rate_limited += 1
+                retry_after = limits["retry_after_sec"]
+                if retry_after is None:
+                    resets = [v for v in (limits["reset_requests_sec"], limits["reset_tokens_sec"]) if v is not None]
+                    retry_after = max(resets) if resets else None
+                if retry_after is not None:
+                    self._retry_after = max(self._retry_after or 0.0, retry_after)
+            elif status is not None and 200 <= status < 300:
+                self._ok += 1
+            else:
+                self._errors += 1
+
+            if limits["limit_requests"]:
+                self.header_max_rate = limits["limit_requests"] / 60.0
+            if limits["remaining_requests"] == 0:
+                self._near_limit = True
+            if self.tokens_per_request:
+                if limits["limit_tokens"]:
+                    self.header_token_max_rate = limits["limit_tokens"] / self.tokens_per_request / 60.0
+                if limits["remaining_tokens"] is not None and limits["remaining_tokens"] < self.tokens_per_request:
+                    self._near_limit = True
+
+    def record_skipped(self):
+        """同時実行数の上限に達していて送れなかった送信を記録"""
+        with self.lock:
+            self._skipped += 1
+
+    def end_window(self, duration_sec: float, drain: bool = False) -> Dict[str, Any]:
+        """長さ duration_sec のウィンドウを閉じてレートを更新し、そのウィンドウの記録を返す
+
+        drain=True はプローブ時間の終了後に完了した実行中のリクエストの分で、レートは更新せず、
+        持続可能なレートの推定にも使わない。
+        """
+        with self.lock:
+            self.elapsed_sec += max(duration_sec, 0.0)
+            window = {
+                "elapsed_sec": round(self.elapsed_sec, 3),
+                "duration_sec": round(duration_sec, 3),
+                "rate": self.rate,
+                "throughput": self._ok / duration_sec if duration_sec > 0 else None,
+                "ok": self._ok,
+                "rate_limited": self._rate_limited,
+                "errors": self._errors,
+                "skipped": self._skipped,
+                "retry_after_sec": self._retry_after,
+            }
+            if drain:
+                window["drain"] = True
+            elif self._rate_limited:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            elif self._ok and not self._near_limit and not self._skipped:
+                self.rate += self.increase_step
+            ceiling = self.ceiling
+            if ceiling is not None:
+                self.rate = min(self.rate, ceiling)
+            window["next_rate"] = self.rate
+            self.windows.append(window)
+            self._reset_window()
+            return window
+
+    def sustainable_rate(self) -> Optional[float]:
+        """持続可能なレートの推定
+
+        AIMD は上限付近でのこぎり波になるため、プローブ後半のウィンドウで実際に成功した
+        リクエスト数をその合計時間で割る（後半に成功が無ければ全体）。429 を受けたウィンドウや
+        Retry-After による停止時間も時間に含めるので、停止中に回復した分をまとめて通した
+        バーストで上限を過大に見積もらない。目標レートはクライアントが送り切れなかった場合や
+        応答が遅い場合に実際より高くなるため使わない。上限（ceiling）を超えた分は切り詰める。
+        """
+        windows = [w for w in self.windows if not w.get("drain") and w["duration_sec"] > 0]
+        candidates = windows[len(windows) // 2:]
+        if not sum(w["ok"] for w in candidates):
+            candidates = windows
+        ok = sum(w["ok"] for w in candidates)
+        if not ok:
+            return None
+        throughput = ok / sum(w["duration_sec"] for w in candidates)
+        ceiling = self.ceiling
+        return min(throughput, ceiling) if ceiling else throughput
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "initial_rate": self.initial_rate,
+            "final_rate": self.rate,
+            "sustainable_rate": self.sustainable_rate(),
+            "header_max_rate": self.header_max_rate,
+            "header_token_max_rate": self.header_token_max_rate,
+            "tokens_per_request": self.tokens_per_request,
+            "increase_step": self.increase_step,
+            "decrease_factor": self.decrease_factor,
+            "total_ok": sum(w["ok"] for w in self.windows),
+            "total_rate_limited": sum(w["rate_limited"] for w in self.windows),
+            "total_errors": sum(w["errors"] for w in self.windows),
+            "total_skipped": sum(w["skipped"] for w in self.windows),
+            "windows": self.windows,
+        }
+
+
+def resolve_chat_endpoint(url: str) -> str:
+    """AIPERF_URL から chat completions のエンドポイントを決める（smoke_stream.py と同じ規則）"""
+    url = url.strip().rstrip("/")
+    if not url or url in ("https://api.openai.com/v1", "https://api.openai.com"):
+        return OPENAI_CHAT_ENDPOINT
+    if not url.startswith("http://") and not url.startswith("https://"):
+        url = f"http://{url}"
+    return f"{url}/v1/chat/completions"
+
+
+def build_probe_prompt(input_tokens: int) -> str:
+    """input_tokens 語（多くの tokenizer でほぼ同じトークン数）のプロンプト"""
+    return " ".join([PROBE_FILLER_WORD] * max(1, input_tokens))
+
+
+def send_probe(
+    endpoint: str,
+    model: str,
+    api_key: str = "",
+    timeout: float = 30.0,
+    input_tokens: int = 1,
+    output_tokens: int = 1,
+) -> Tuple[Optional[int], Dict[str, str]]:
+    """入力 input_tokens 語・max_tokens=output_tokens のリクエストを送り、(HTTPステータス, 小文字化したヘッダ) を返す"""
+    body = json.dumps({
+        "model": model,
+        "messages": [{"role": "user", "content": build_probe_prompt(input_tokens)}],
+        "max_tokens": max(1, output_tokens),
+        "stream": False,
+    }).encode("utf-8")
+    request = urllib.request.Request(endpoint, data=body, method="POST")
+    request.add_header("Content-Type", "application/json")
+    if api_key:
+        request.add_header("Authorization", f"Bearer {api_key}")
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status, {k.lower(): v for k, v in response.headers.items()}
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, {k.lower(): v for k, v in e.headers.items()}
+    except (urllib.error.URLError, OSError):
+        return None, {}
+
+
+def run_probe(
+    controller: AIMDController,
+    sender: Callable[[], Tuple[Optional[int], Dict[str, str]]],
+    duration_sec: float = DEFAULT_DURATION_SEC,
+    window_sec: float = DEFAULT_WINDOW_SEC,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> AIMDController:
+    """controller のレートで sender を呼び続け、window_sec ごとにレートを更新する
+
+    同時に実行中のリクエストは max_in_flight までで、上限に達しているときの送信は行わずに
+    controller.record_skipped() で数える（スレッドプールのキューに溜めない）。
+    Retry-After 付きの 429 を受けたウィンドウの後は、その時間だけ送信を止める（停止時間は次のウィンドウに含める）。
+    duration_sec の経過後は新しく送らず、実行中のリクエストの結果は drain のウィンドウに記録する。
+    """
+    start = time.monotonic()
+    deadline = start + duration_sec
+    window_start = start
+    window_end = start + window_sec
+    next_send = start
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def worker():
+        try:
+            status, headers = sender()
+            controller.record(status, headers)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        while True:
+            now = time.monotonic()
+            if now >= window_end or now >= deadline:
+                window = controller.end_window(min(now, deadline) - window_start)
+                if now >= deadline:
+                    break
+                pause = window["retry_after_sec"] if window["rate_limited"] else None
+                next_send = max(next_send, now + (pause or 0.0))
+                window_start = now
+                window_end = max(now, next_send) + window_sec
+            if now >= next_send:
+                if in_flight.acquire(blocking=False):
+                    executor.submit(worker)
+                else:
+                    controller.record_skipped()
+                # 遅れた分をまとめて送らない（バーストさせない）
+                next_send = max(next_send + 1.0 / controller.rate, now)
+            time.sleep(max(0.0, min(next_send, window_end, deadline) - time.monotonic()))
+        drain_start = time.monotonic()
+
+    # プローブ時間の終了時に実行中だったリクエストの結果
+    controller.end_window(time.monotonic() - drain_start, drain=True)
+    return controller
+
+
+def write_pacing_result(path: Path, result: Dict[str, Any]) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load_pacing_result(artifact_dir: Path) -> Optional[Dict[str, Any]]:
+    """artifactディレクトリの pacing.json を読み込む（無い・壊れている場合は None）"""
+    path = artifact_dir / PACING_FILE_NAME
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Failed to read {path}: {e}", file=sys.stderr)
+        return None
+
+
+def _int_env(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    try:
+        return int(value) if value else default
+    except ValueError:
+        return default
+
+
+def _float_env(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    try:
+        return float(value) if value else default
+    except ValueError:
+        return default
+
+
+def main(argv: Optional[List[str]] = None):
+    if load_dotenv is not None:
+        load_dotenv()
+
+    parser = argparse.ArgumentParser(description="429 / レート制限ヘッダを見て AIMD で持続可能なリクエストレートを探す")
+    parser.add_argument("--output", default=PACING_FILE_NAME, help=f"結果の保存先（デフォルト: {PACING_FILE_NAME}）")
+    parser.add_argument("--duration", type=float, default=_float_env("PACING_DURATION_SEC", DEFAULT_DURATION_SEC),
+                        help="プローブ時間（秒）")
+    parser.add_argument("--window", type=float, default=_float_env("PACING_WINDOW_SEC", DEFAULT_WINDOW_SEC),
+                        help="レートを更新する間隔（秒）")
+    parser.add_argument("--initial-rate", type=float,
+                        default=_float_env("PACING_INITIAL_RATE", DEFAULT_INITIAL_RATE), help="初期レート（件/秒）")
+    parser.add_argument("--max-rate", type=float, default=_float_env("PACING_MAX_RATE", None), help="レートの上限（件/秒）")
+    parser.add_argument("--max-in-flight", type=int,
+                        default=_int_env("PACING_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT),
+                        help=f"同時に実行中にするリクエストの上限（デフォルト: {DEFAULT_MAX_IN_FLIGHT}）")
+    parser.add_argument("--increase-step", type=float, default=DEFAULT_INCREASE_STEP, help="加算的増加の幅（件/秒）")
+    parser.add_argument("--decrease-factor", type=float, default=DEFAULT_DECREASE_FACTOR, help="乗算的減少の係数")
+    parser.add_argument("--input-tokens", type=int, default=_int_env("INPUT_TOKENS_MEAN", DEFAULT_INPUT_TOKENS),
+                        help="プローブの入力トークン数（デフォルト: INPUT_TOKENS_MEAN）")
+    parser.add_argument("--output-tokens", type=int, default=_int_env("OUTPUT_TOKENS_MEAN", DEFAULT_OUTPUT_TOKENS),
+                        help="プローブの max_tokens（デフォルト: OUTPUT_TOKENS_MEAN）")
+    parser.add_argument("--safety-factor", type=float,
+                        default=_float_env("PACING_SAFETY_FACTOR", DEFAULT_SAFETY_FACTOR),
+                        help="本番実行に渡すレート = 持続可能なレート × この係数")
+    args = parser.parse_args(argv)
+
+    model = os.getenv("MODEL", "")
+    if not model:
+        print("Error: MODEL is not set in .env", file=sys.stderr)
+        sys.exit(1)
+    endpoint = resolve_chat_endpoint(os.getenv("AIPERF_URL", ""))
+    api_key = os.getenv("API_KEY", "")
+    timeout = _float_env("REQUEST_TIMEOUT_SECONDS", 30.0)
+
+    print(
+        f"Probing sustainable request rate: {endpoint} ({args.duration:.0f}s, "
+        f"ISL={args.input_tokens} OSL={args.output_tokens})",
+        file=sys.stderr,
+    )
+    controller = AIMDController(
+        initial_rate=args.initial_rate,
+        max_rate=args.max_rate,
+        increase_step=args.increase_step,
+        decrease_factor=args.decrease_factor,
+        tokens_per_request=args.input_tokens + args.output_tokens,
+    )
+    run_probe(
+        controller,
+        lambda: send_probe(endpoint, model, api_key, timeout, args.input_tokens, args.output_tokens),
+        args.duration,
+        args.window,
+        max_in_flight=args.max_in_flight,
+    )
+
+    result = controller.to_dict()
+    result["endpoint"] = endpoint
+    result["model"] = model
+    result["safety_factor"] = args.safety_factor
+    sustainable = result["sustainable_rate"]
+    result["request_rate"] = round(sustainable * args.safety_factor, 3) if sustainable else None
+    path = write_pacing_result(Path(args.output), result)
+
+    print(
+        f"OK={result['total_ok']} 429={result['total_rate_limited']} errors={result['total_errors']} "
+        f"skipped={result['total_skipped']} "
+        f"sustainable_rate={sustainable if sustainable is None else round(sustainable, 3)} -> {path}",
+        file=sys.stderr,
+    )
+    if result["request_rate"] is None:
+        print("Error: No probe request succeeded", file=sys.stderr)
+        sys.exit(1)
+    print(result["request_rate"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+profile_export.jsonl / profile_export*.json を圧縮した列指向形式にアーカイブ
+
+- pyarrow がある場合: Parquet（zstd圧縮）→ profile_export.parquet
+- pyarrow が無い場合: NumPy の圧縮npz → profile_export.npz
+
+ネストしたレコードは "metrics.time_to_first_token" のようなドット区切りの列に展開し
+（キー中の "." はエスケープ）、AIPerfの {'value': ..., 'unit': ...} 形式は値の列と単位
+（メタデータ、行によって異なる場合は行ごとの補助列）に分けて保存します。
+読み戻したレコードが元とフィールド単位で一致することを確認してから元のexportを削除できます。
+summarize_export.py はアーカイブを find_export_files / load_export_data でそのまま読めます。
+
+使用例:
+    python scripts/archive_export.py artifacts/ISL100_OSL200_CON10
+    python scripts/archive_export.py artifacts/ISL100_OSL200_CON10 --remove-source
+"""
+
+import argparse
+import json
+import math
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+ARCHIVE_FORMAT_VERSION = 2
+ARCHIVE_METADATA_KEY = "aiperf_archive"
+KEY_SEPARATOR = "."
+ESCAPE_CHAR = "\\"
+# 単位・有無の補助列の名前に付ける接尾辞（エスケープ済みの列名には現れない "\@" で始める）
+UNIT_COLUMN_SUFFIX = ESCAPE_CHAR + "@unit"
+PRESENT_COLUMN_SUFFIX = ESCAPE_CHAR + "@present"
+
+# 列の型（kind）: int / float / bool / str / json（リスト等はJSON文字列で保存）
+NUMPY_DTYPES = {"int": np.int64, "float": np.float64, "bool": np.bool_}
+
+
+def escape_key(key: str) -> str:
+    """キー中の区切り文字とエスケープ文字をエスケープ（"a.b" → "a\\.b"）"""
+    return key.replace(ESCAPE_CHAR, ESCAPE_CHAR * 2).replace(KEY_SEPARATOR, ESCAPE_CHAR + KEY_SEPARATOR)
+
+
+@lru_cache(maxsize=4096)
+def split_path(path: str) -> Tuple[str, ...]:
+    """エスケープされた列名をキーの並びに戻す（escape_key の逆変換）"""
+    keys: List[str] = []
+    current: List[str] = []
+    escaped = False
+    for char in path:
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == ESCAPE_CHAR:
+            escaped = True
+        elif char == KEY_SEPARATOR:
+            keys.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    keys.append("".join(current))
+    return tuple(keys)
+
+
+def flatten_record(record: Dict, prefix: str = "") -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """ネストしたレコードをドット区切りのキーに展開（戻り値: 値, 単位）
+
+    キー中の "." はエスケープする。空の dict と null は値としてそのまま残す。
+    """
+    values: Dict[str, Any] = {}
+    units: Dict[str, str] = {}
+    for key, value in record.items():
+        path = f"{prefix}{escape_key(str(key))}"
+        if isinstance(value, dict) and value:
+            if set(value) == {"value", "unit"} and isinstance(value["unit"], str):
+                values[path] = value["value"]
+                units[path] = value["unit"]
+            else:
+                nested_values, nested_units = flatten_record(value, f"{path}{KEY_SEPARATOR}")
+                values.update(nested_values)
+                units.update(nested_units)
+        else:
+            values[path] = value
+    return values, units
+
+
+def unflatten_record(flat: Dict[str, Any], units: Dict[str, str]) -> Dict:
+    """flatten_record の逆変換"""
+    record: Dict[str, Any] = {}
+    for path, value in flat.items():
+        if path in units:
+            value = {"value": value, "unit": units[path]}
+        keys = split_path(path)
+        node = record
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return record
+
+
+def infer_kind(values: List[Any]) -> str:
+    """列の値から保存する型を決める"""
+    present = [v for v in values if v is not None]
+    if not present:
+        return "str"
+    if all(isinstance(v, bool) for v in present):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "float"
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    return "json"
+
+
+def records_to_columns(records: List[Dict]) -> Dict[str, Any]:
+    """レコードを列指向（列名 → 値のリスト + 型 + 単位）に変換
+
+    列の値の None は「その行にキーが無い」を表す。null の値を持つ列は null_columns
+    （全行にキーがある）か、行ごとの有無（present）で区別する。単位が行によって異なる列は、
+    列単位の units ではなく行ごとの単位（row_units）を持つ。
+    """
+    rows = []
+    row_units = []
+    names: Dict[str, None] = {}
+    for record in records:
+        flat, record_units = flatten_record(record)
+        rows.append(flat)
+        row_units.append(record_units)
+        names.update(dict.fromkeys(flat))
+
+    columns: Dict[str, List[Any]] = {}
+    kinds: Dict[str, str] = {}
+    units: Dict[str, str] = {}
+    unit_columns: Dict[str, List[Optional[str]]] = {}
+    present_columns: Dict[str, List[bool]] = {}
+    null_columns: List[str] = []
+    for name in names:
+        values = [row.get(name) for row in rows]
+        kind = infer_kind(values)
+        if kind == "json":
+            values = [json.dumps(v, ensure_ascii=False) if v is not None else None for v in values]
+        columns[name] = values
+        kinds[name] = kind
+
+        present = [name in row for row in rows]
+        if any(p and row[name] is None for p, row in zip(present, rows)):
+            if all(present):
+                null_columns.append(name)
+            else:
+                present_columns[name] = present
+
+        column_units = [ru.get(name) if p else None for p, ru in zip(present, row_units)]
+        distinct = {u for p, u in zip(present, column_units) if p}
+        if len(distinct) > 1:
+            unit_columns[name] = column_units
+        elif distinct and None not in distinct:
+            units[name] = distinct.pop()
+
+    return {
+        "version": ARCHIVE_FORMAT_VERSION,
+        "row_count": len(records),
+        "columns": columns,
+        "kinds": kinds,
+        "units": units,
+        "unit_columns": unit_columns,
+        "present_columns": present_columns,
+        "null_columns": null_columns,
+    }
+
+
+def _upgrade_table(table: Dict[str, Any]) -> Dict[str, Any]:
+    """version 1 のアーカイブ（キーのエスケープ無し、None は常に省略）を現在の形にそろえる"""
+    if table.get("version", 1) >= 2:
+        return table
+
+    def rename(name: str) -> str:
+        return KEY_SEPARATOR.join(escape_key(k) for k in name.split(KEY_SEPARATOR))
+
+    return {
+        "version": ARCHIVE_FORMAT_VERSION,
+        "row_count": table["row_count"],
+        "columns": {rename(n): v for n, v in table["columns"].items()},
+        "kinds": {rename(n): k for n, k in table["kinds"].items()},
+        "units": {rename(n): u for n, u in table["units"].items()},
+        "unit_columns": {},
+        "present_columns": {},
+        "null_columns": [],
+    }
+
+
+def columns_to_records(table: Dict[str, Any]) -> List[Dict]:
+    """records_to_columns の逆変換"""
+    table = _upgrade_table(table)
+    columns, kinds, units = table["columns"], table["kinds"], table["units"]
+    unit_columns, present_columns = table["unit_columns"], table["present_columns"]
+    null_columns = set(table["null_columns"])
+    decoded = {}
+    for name, values in columns.items():
+        if kinds[name] == "json":
+            values = [json.loads(v) if v is not None else None for v in values]
+        decoded[name] = values
+
+    records = []
+    for i in range(table["row_count"]):
+        flat = {}
+        record_units = {}
+        for name, values in decoded.items():
+            value = values[i]
+            if name in present_columns:
+                if not present_columns[name][i]:
+                    continue
+            elif value is None and name not in null_columns:
+                continue
+            flat[name] = value
+            unit = unit_columns[name][i] if name in unit_columns else units.get(name)
+            if unit is not None:
+                record_units[name] = unit
+        records.append(unflatten_record(flat, record_units))
+    return records
+
+
+def _physical_columns(table: Dict[str, Any]) -> List[Tuple[str, str, List[Any]]]:
+    """保存する列（名前, 型, 値）。値の列の後に行ごとの単位・有無の補助列を並べる"""
+    physical = [(name, table["kinds"][name], values) for name, values in table["columns"].items()]
+    physical += [(name + UNIT_COLUMN_SUFFIX, "str", values) for name, values in table["unit_columns"].items()]
+    physical += [(name + PRESENT_COLUMN_SUFFIX, "bool", values) for name, values in table["present_columns"].items()]
+    return physical
+
+
+def _metadata(table: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "version": ARCHIVE_FORMAT_VERSION,
+        "row_count": table["row_count"],
+        "columns": list(table["columns"]),
+        "kinds": table["kinds"],
+        "units": table["units"],
+        "unit_columns": list(table["unit_columns"]),
+        "present_columns": list(table["present_columns"]),
+        "null_columns": table["null_columns"],
+    }
+
+
+def _table_from_physical(meta: Dict[str, Any], physical: List[List[Any]]) -> Dict[str, Any]:
+    """_physical_columns の順に読んだ列からテーブルを組み立てる"""
+    names = meta["columns"]
+    unit_names = meta.get("unit_columns", [])
+    present_names = meta.get("present_columns", [])
+    values = iter(physical)
+    columns = {name: next(values) for name in names}
+    unit_columns = {name: next(values) for name in unit_names}
+    present_columns = {name: next(values) for name in present_names}
+    return {
+        "version": meta.get("version", 1),
+        "row_count": meta["row_count"],
+        "columns": columns,
+        "kinds": meta["kinds"],
+        "units": meta["units"],
+        "unit_columns": unit_columns,
+        "present_columns": present_columns,
+        "null_columns": meta.get("null_columns", []),
+    }
+
+
+def _physical_names(meta: Dict[str, Any]) -> List[str]:
+    return (
+        list(meta["columns"])
+        + [name + UNIT_COLUMN_SUFFIX for name in meta.get("unit_columns", [])]
+        + [name + PRESENT_COLUMN_SUFFIX for name in meta.get("present_columns", [])]
+    )
+
+
+def write_npz(table: Dict[str, Any], path: Path) -> None:
+    """NumPyの圧縮npzで保存（列ごとに値の配列と欠損マスクを持つ。pickleは使わない）"""
+    arrays: Dict[str, np.ndarray] = {"__meta__": np.array(json.dumps(_metadata(table), ensure_ascii=False))}
+    for index, (_, kind, values) in enumerate(_physical_columns(table)):
+        mask = np.array([v is not None for v in values], dtype=np.bool_)
+        if kind in NUMPY_DTYPES:
+            filled = [v if v is not None else 0 for v in values]
+            data = np.array(filled, dtype=NUMPY_DTYPES[kind])
+        else:
+            data = np.array([v if v is not None else "" for v in values], dtype=np.str_)
+        arrays[f"c{index}_values"] = data
+        arrays[f"c{index}_mask"] = mask
+    np.savez_compressed(path, **arrays)
+
+
+def read_npz(path: Path) -> Dict[str, Any]:
+    with np.load(path, allow_pickle=False) as archive:
+        meta = json.loads(str(archive["__meta__"]))
+        physical = []
+        for index in range(len(_physical_names(meta))):
+            data = archive[f"c{index}_values"].tolist()
+            mask = archive[f"c{index}_mask"].tolist()
+            physical.append([v if present else None for v, present in zip(data, mask)])
+    return _table_from_physical(meta, physical)
+
+
+def write_parquet(table: Dict[str, Any], path: Path) -> None:
+    """Parquet（zstd圧縮）で保存"""
+    arrow_types = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "str": pa.string(), "json": pa.string()}
+    physical = _physical_columns(table)
+    arrays = [pa.array(values, type=arrow_types[kind]) for _, kind, values in physical]
+    arrow_table = pa.Table.from_arrays(arrays, names=[name for name, _, _ in physical])
+    arrow_table = arrow_table.replace_schema_metadata(
+        {ARCHIVE_METADATA_KEY: json.dumps(_metadata(table), ensure_ascii=False)}
+    )
+    pq.write_table(arrow_table, path, compression="zstd")
+
+
+def read_parquet(path: Path) -> Dict[str, Any]:
+    if pq is None:
+        raise RuntimeError(f"pyarrow is required to read {path}. Install it with 'pip install pyarrow'.")
+    arrow_table = pq.read_table(path)
+    meta = json.loads(arrow_table.schema.metadata[ARCHIVE_METADATA_KEY.encode()])
+    physical = [arrow_table.column(name).to_pylist() for name in _physical_names(meta)]
+    return _table_from_physical(meta, physical)
+
+
+def write_archive(records: List[Dict], artifact_dir: Path, fmt: str = "auto") -> Path:
+    """レコードをアーカイブとして保存し、保存先を返す"""
+    if fmt == "auto":
+        fmt = "parquet" if pa is not None else "npz"
+    if fmt == "parquet" and pa is None:
+        raise RuntimeError("pyarrow is not installed. Use --format npz or 'pip install pyarrow'.")
+
+    table = records_to_columns(records)
+    path = artifact_dir / f"profile_export.{fmt}"
+    if fmt == "parquet":
+        write_parquet(table, path)
+    else:
+        write_npz(table, path)
+    return path
+
+
+def read_archive(path: Path) -> List[Dict]:
+    """アーカイブ（.parquet / .npz）をレコードのリストとして読み込む"""
+    table = read_parquet(path) if path.suffix == ".parquet" else read_npz(path)
+    return columns_to_records(table)
+
+
+def _values_equal(expected: Any, actual: Any) -> bool:
+    """値の比較（NaN 同士は一致、int と float の列にまとめた数値は値で比較、bool は型も比較）"""
+    if isinstance(expected, float) and isinstance(actual, float) and math.isnan(expected) and math.isnan(actual):
+        return True
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return type(expected) is type(actual) and expected == actual
+    return expected == actual
+
+
+def _find_difference(expected: Any, actual: Any, path: str = "") -> Optional[str]:
+    """2つの値を再帰的に比較し、最初に異なるフィールドのパスを返す（一致すれば None）"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in list(expected) + [k for k in actual if k not in expected]:
+            child = f"{path}{KEY_SEPARATOR}{key}" if path else str(key)
+            if key not in expected or key not in actual:
+                return child
+            difference = _find_difference(expected[key], actual[key], child)
+            if difference is not None:
+                return difference
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return path or "."
+        for index, (e, a) in enumerate(zip(expected, actual)):
+            difference = _find_difference(e, a, f"{path}[{index}]")
+            if difference is not None:
+                return difference
+        return None
+    return None if _values_equal(expected, actual) else (path or ".")
+
+
+def verify_archive(records: List[Dict], restored: List[Dict]) -> Optional[str]:
+    """読み戻したレコードが元のレコードとフィールド単位で一致するか確認し、不一致の内容を返す"""
+    if len(restored) != len(records):
+        return f"{len(restored)} != {len(records)} records"
+    for index, (expected, actual) in enumerate(zip(records, restored)):
+        difference = _find_difference(expected, actual)
+        if difference is not None:
+            return f"record {index}: field {difference} differs"
+    return None
+
+
+def _total_size(paths: List[Path]) -> int:
+    return sum(p.stat().st_size for p in paths)
+
+
+def main(argv: Optional[List[str]] = None):
+    # summarize_export は load_export_data でこのモジュールを使うため、循環importを避けてここで読み込む
+    from summarize_export import find_export_files, load_export_data
+
+    parser = argparse.ArgumentParser(description="profile_export をParquet/npzの列指向アーカイブに変換")
+    parser.add_argument("artifact_dir", help="対象のartifactディレクトリ")
+    parser.add_argument(
+        "--format",
+        choices=["auto", "parquet", "npz"],
+        default="auto",
+        help="保存形式（auto: pyarrowがあればparquet、無ければnpz）",
+    )
+    parser.add_argument(
+        "--remove-source",
+        action="store_true",
+        help="アーカイブを読み戻して全レコードのフィールドが一致することを確認した後、元のexportファイルを削除",
+    )
+    args = parser.parse_args(argv)
+
+    artifact_dir = Path(args.artifact_dir)
+    source_files = find_export_files(artifact_dir, include_archives=False)
+    if not source_files:
+        print(f"Error: No export files found in {artifact_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    records = load_export_data(source_files)
+    try:
+        archive_path = write_archive(records, artifact_dir, args.format)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    difference = verify_archive(records, read_archive(archive_path))
+    if difference is not None:
+        print(f"Error: Archive verification failed ({difference})", file=sys.stderr)
+        archive_path.unlink()
+        sys.exit(1)
+
+    source_size = _total_size(source_files)
+    archive_size = archive_path.stat().st_size
+    ratio = source_size / archive_size if archive_size else 0.0
+    print(
+        f"Archived {len(records)} records: {source_size:,} bytes -> {archive_size:,} bytes "
+        f"({ratio:.1f}x) {archive_path}",
+        file=sys.stderr,
+    )
+
+    if args.remove_source:
+        for source in source_files:
+            source.unlink()
+            print(f"Removed: {source}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
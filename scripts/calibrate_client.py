@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+クライアント側オーバーヘッドのキャリブレーション
+
+ゼロレイテンシのローカルスタブサーバ（stub_server.py）に対して、各concurrencyで
+run_aiperf_profile.sh を実行し、ベンチマーククライアント自身の下限値
+（TTFT / ITL / Request Latency の床、および最大達成リクエストレート）を測定します。
+
+結果は各 artifacts/calibration_ISL*_OSL*_CON*/client_calibration.json と、
+集約版の artifacts/client_calibration.json に保存され、summarize_export.py が
+実測値の隣に表示します。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from stub_server import make_server, start_in_thread
+from summarize_export import (
+    CALIBRATION_FILE_NAME,
+    calculate_percentiles,
+    extract_metric_values,
+    extract_request_spans,
+    find_export_files,
+    load_export_data,
+)
+
+# make sweep と同じconcurrency
+DEFAULT_CONCURRENCIES = [1, 5, 10, 20, 50]
+# 最大リクエストレートを安定して測るため、sweepより多めに投げる
+DEFAULT_REQUESTS_PER_CONCURRENCY = 10
+
+
+def parse_concurrencies(value: str) -> List[int]:
+    """カンマ/空白区切りのconcurrency指定（例: "1,5,10"）をパース"""
+    concurrencies = []
+    for item in value.replace(",", " ").split():
+        concurrency = int(item)
+        if concurrency <= 0:
+            raise ValueError(f"concurrency must be positive: {item}")
+        concurrencies.append(concurrency)
+    return concurrencies
+
+
+def compute_calibration_stats(data: List[Dict]) -> Dict[str, Any]:
+    """スタブサーバに対する実行結果からクライアントの下限値を算出"""
+    result: Dict[str, Any] = {"request_count": len(data)}
+
+    for metric_name, key in [
+        ("time_to_first_token", "ttft"),
+        ("request_latency", "request_latency"),
+        ("inter_token_latency", "inter_token_latency"),
+    ]:
+        values = extract_metric_values(data, metric_name)
+        if values:
+            stats = calculate_percentiles(values)
+            stats["count"] = len(values)
+            result[key] = stats
+
+    # 最大達成リクエストレート = 完了リクエスト数 / (最後の終了 - 最初の開始)
+    spans = extract_request_spans(data)
+    if spans:
+        duration_sec = (max(end for _, end in spans) - min(start for start, _ in spans)) / 1e9
+        if duration_sec > 0:
+            result["max_request_rate"] = len(spans) / duration_sec
+            result["duration_sec"] = duration_sec
+
+    return result
+
+
+def update_calibration_file(path: Path, concurrency: int, stats: Dict[str, Any]) -> None:
+    """集約版のキャリブレーションファイルに1つのconcurrencyの結果を書き込む"""
+    calibration: Dict[str, Any] = {}
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                calibration = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Ignoring unreadable {path}: {e}", file=sys.stderr)
+
+    calibration.setdefault("concurrency", {})[str(concurrency)] = stats
+    calibration["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2, ensure_ascii=False)
+
+
+def run_calibration_point(base_url: str, concurrency: int, request_count: int) -> Optional[Path]:
+    """1つのconcurrencyでスタブサーバに対してAIPerfを実行し、artifactディレクトリを返す"""
+    isl = os.getenv("INPUT_TOKENS_MEAN", "100")
+    osl = os.getenv("OUTPUT_TOKENS_MEAN", "200")
+    artifact_dir = Path(f"artifacts/calibration_ISL{isl}_OSL{osl}_CON{concurrency}")
+
+    env = dict(os.environ)
+    env.update({
+        "AIPERF_URL": base_url,
+        "CONCURRENCY": str(concurrency),
+        "REQUEST_COUNT": str(request_count),
+        "INPUT_TOKENS_MEAN": isl,
+        "OUTPUT_TOKENS_MEAN": osl,
+        # スタブのモデル名はHuggingFaceに存在しないため、Tokenizer未指定時はgpt2を使う
+        "TOKENIZER": os.getenv("TOKENIZER") or "gpt2",
+        # run_aiperf_profile.sh で .env より優先させる変数（実行条件以外）
+        "ENV_OVERRIDES": "AIPERF_URL TOKENIZER",
+    })
+
+    print(f"Calibrating CONCURRENCY={concurrency} (REQUEST_COUNT={request_count})...", file=sys.stderr)
+    proc = subprocess.run(["bash", "scripts/run_aiperf_profile.sh", "calibration"], env=env)
+    if proc.returncode != 0:
+        print(f"Error: calibration run failed for CONCURRENCY={concurrency}", file=sys.stderr)
+        return None
+    return artifact_dir
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="ゼロレイテンシのスタブサーバでクライアント側オーバーヘッドを測定")
+    parser.add_argument(
+        "--concurrency",
+        default=os.getenv("CALIBRATION_CONCURRENCIES", ",".join(str(c) for c in DEFAULT_CONCURRENCIES)),
+        help="測定するconcurrency（カンマ区切り、デフォルト: 1,5,10,20,50）",
+    )
+    parser.add_argument(
+        "--requests-per-concurrency",
+        type=int,
+        default=DEFAULT_REQUESTS_PER_CONCURRENCY,
+        help=f"REQUEST_COUNT = concurrency * この値（デフォルト: {DEFAULT_REQUESTS_PER_CONCURRENCY}）",
+    )
+    args = parser.parse_args()
+
+    try:
+        concurrencies = parse_concurrencies(args.concurrency)
+    except ValueError as e:
+        print(f"Error: invalid --concurrency: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    server = make_server()
+    _, base_url = start_in_thread(server)
+    print(f"Stub server started: {base_url}", file=sys.stderr)
+
+    calibration_file = Path("artifacts") / CALIBRATION_FILE_NAME
+    failed = 0
+    try:
+        for concurrency in concurrencies:
+            artifact_dir = run_calibration_point(base_url, concurrency, concurrency * args.requests_per_concurrency)
+            export_files = find_export_files(artifact_dir) if artifact_dir else []
+            data = load_export_data(export_files) if export_files else []
+            if not data:
+                print(f"Error: No calibration data for CONCURRENCY={concurrency}", file=sys.stderr)
+                failed += 1
+                continue
+
+            stats = compute_calibration_stats(data)
+            with open(artifact_dir / CALIBRATION_FILE_NAME, "w", encoding="utf-8") as f:
+                json.dump(stats, f, indent=2, ensure_ascii=False)
+            update_calibration_file(calibration_file, concurrency, stats)
+
+            ttft_p50 = stats.get("ttft", {}).get("p50", 0.0)
+            rate = stats.get("max_request_rate", 0.0)
+            print(f"  CON={concurrency}: TTFT floor p50={ttft_p50:.2f} ms, max rate={rate:.2f} req/s", file=sys.stderr)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"\nCalibration saved to: {calibration_file}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
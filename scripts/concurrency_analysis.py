@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+実際に達成された並行度（in-flight リクエスト数）の再構成
+
+summarize_export.py から呼ばれ、各リクエストの開始/終了時刻からスイープライン法で
+in-flight数の推移を再構成し、時間加重の平均・パーセンタイルを算出します。
+worker が追いつかずに `--concurrency` の設定値を保てなかった実行（クライアント飽和）を検出します。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from export_records import extract_request_spans
+
+# 定常区間の平均並行度が設定値のこの割合を下回ったら飽和とみなす
+SATURATION_RATIO_THRESHOLD = 0.8
+
+CONCURRENCY_PERCENTILES = (50, 95, 99)
+
+
+def sweep_concurrency(start_ns: np.ndarray, end_ns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """スイープライン法で in-flight 数の推移を求める
+
+    戻り値は (イベント時刻, その時刻以降の in-flight 数)。同時刻では終了を開始より先に処理する。
+    """
+    times = np.concatenate([start_ns, end_ns])
+    deltas = np.concatenate([np.ones(len(start_ns), dtype=np.int64), -np.ones(len(end_ns), dtype=np.int64)])
+    order = np.lexsort((deltas, times))
+    return times[order], np.cumsum(deltas[order])
+
+
+def summarize_levels(
+    times: np.ndarray,
+    levels: np.ndarray,
+    window: Optional[Tuple[int, int]] = None,
+) -> Optional[Dict[str, float]]:
+    """in-flight 数の時間加重の平均・パーセンタイル・最大値（window 指定時はその区間のみ）"""
+    if len(times) < 2:
+        return None
+    lo, hi = window if window else (times[0], times[-1])
+    clipped = np.clip(times, lo, hi)
+    durations = np.diff(clipped).astype(np.float64)
+    segment_levels = levels[:-1]
+    total = durations.sum()
+    if total <= 0:
+        return None
+
+    order = np.argsort(segment_levels, kind="stable")
+    sorted_levels = segment_levels[order]
+    cumulative = np.cumsum(durations[order]) / total
+
+    result = {
+        "mean": float(np.dot(segment_levels, durations) / total),
+        "max": float(segment_levels[durations > 0].max()),
+        "duration_sec": float(total / 1e9),
+    }
+    for p in CONCURRENCY_PERCENTILES:
+        index = min(int(np.searchsorted(cumulative, p / 100.0, side="left")), len(sorted_levels) - 1)
+        result[f"p{p}"] = float(sorted_levels[index])
+    return result
+
+
+def analyze_concurrency(data: List[Dict], configured: Optional[int]) -> Optional[Dict[str, Any]]:
+    """達成並行度の分析
+
+    - overall: 最初の開始〜最後の終了
+    - steady: 最初の開始〜最後の開始（最後のリクエストを投げた後は新規リクエストが無く、
+      並行度が自然に下がっていくため、飽和判定はこの区間で行う）
+    """
+    spans = extract_request_spans(data)
+    if len(spans) < 2:
+        return None
+
+    start_ns = np.array([s for s, _ in spans], dtype=np.int64)
+    end_ns = np.array([e for _, e in spans], dtype=np.int64)
+    times, levels = sweep_concurrency(start_ns, end_ns)
+
+    overall = summarize_levels(times, levels)
+    steady = summarize_levels(times, levels, (int(start_ns.min()), int(start_ns.max())))
+    if overall is None:
+        return None
+
+    result: Dict[str, Any] = {
+        "configured": configured,
+        "request_count": len(spans),
+        "overall": overall,
+        "steady": steady,
+        "ratio": None,
+        "saturated": False,
+    }
+    reference = steady or overall
+    if configured:
+        result["ratio"] = reference["mean"] / configured
+        result["saturated"] = result["ratio"] < SATURATION_RATIO_THRESHOLD
+    return result
+
+
+def format_concurrency_markdown(analysis: Dict[str, Any]) -> List[str]:
+    """summary.md 用の達成並行度セクション"""
+    lines = [
+        "",
+        "## Achieved Concurrency",
+        "",
+        "| Window | Mean | p50 | p95 | p99 | Max | Duration (s) |",
+        "|--------|------|-----|-----|-----|-----|--------------|",
+    ]
+    for label, key in [("Steady (first start - last start)", "steady"), ("Overall", "overall")]:
+        stats = analysis.get(key)
+        if stats:
+            lines.append(
+                f"| {label} | {stats['mean']:.2f} | {stats['p50']:.0f} | {stats['p95']:.0f} | "
+                f"{stats['p99']:.0f} | {stats['max']:.0f} | {stats['duration_sec']:.2f} |"
+            )
+
+    if analysis["configured"]:
+        lines.extend([
+            "",
+            f"**Configured Concurrency:** {analysis['configured']} / "
+            f"**Achieved (steady mean):** {analysis['ratio'] * 100:.1f}%",
+        ])
+    if analysis["saturated"]:
+        lines.extend([
+            "",
+            f"⚠️ 達成並行度が設定値の{SATURATION_RATIO_THRESHOLD * 100:.0f}%を下回っています。"
+            "サーバに掛かった負荷はディレクトリ名の CON より小さく、クライアント側の飽和が疑われます。",
+        ])
+    return lines
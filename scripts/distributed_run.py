@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""
+複数の負荷生成プロセス / ホストによる分散実行と export のマージ
+
+1台のクライアントでは大きな推論クラスタを飽和させられない場合に、CONCURRENCY と
+REQUEST_COUNT を N 個のシャードに分けて run_aiperf_profile.sh を並列に実行します。
+
+- coordinator: 開始バリア（全シャードが揃ったら共通の開始時刻を返す）と時刻合わせ用の
+  /time を提供する小さなHTTPサーバ。全シャードの完了後に export をマージする
+- shard: coordinator との時計のずれを NTP 方式（往復時間が最小のサンプルの中点）で推定し、
+  バリアで受け取った開始時刻まで待ってから自分の分の CONCURRENCY で実行する
+- レート: REQUEST_RATE（ADAPTIVE_PACING=1 なら coordinator が1回だけプローブした結果）を
+  シャード数で割って各シャードに渡す。シャードでは ADAPTIVE_PACING を無効にする
+- merge: 各シャードの profile_export.jsonl のタイムスタンプを coordinator の時計に補正して
+  親の artifactディレクトリにまとめる（summarize_export.py からは1回の実行に見える）
+
+使用例:
+    # ローカルで4プロセス
+    python scripts/distributed_run.py run --shards 4
+
+    # 複数ホスト（artifacts/ は共有ボリューム）
+    python scripts/distributed_run.py coordinator --shards 4 --port 9500
+    python scripts/distributed_run.py shard --coordinator http://<coordinator-host>:9500
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # pragma: no cover
+    load_dotenv = None  # type: ignore
+
+from adaptive_pacing import PACING_FILE_NAME
+from run_meta import default_artifact_dir, load_run_meta, write_run_meta
+from summarize_export import find_export_files, load_export_data
+
+SHARDS_DIR_NAME = "shards"
+SHARD_INFO_FILE_NAME = "shard_info.json"
+SHARDS_SUMMARY_FILE_NAME = "shards.json"
+MERGED_EXPORT_FILE_NAME = "profile_export.jsonl"
+
+DEFAULT_PORT = 9500
+DEFAULT_START_DELAY_SEC = 5.0
+DEFAULT_BARRIER_TIMEOUT_SEC = 600.0
+DEFAULT_DONE_TIMEOUT_SEC = 7200.0
+DEFAULT_OFFSET_SAMPLES = 8
+
+# metadata の *_ns のうち、この値より大きいものをエポックからの時刻とみなして補正する
+# （所要時間を表す *_ns は通常これよりはるかに小さい。約3年 = 1e17 ns）
+EPOCH_NS_THRESHOLD = 10 ** 17
+
+
+def split_counts(total: int, shards: int) -> List[int]:
+    """total を shards 個にできるだけ均等に分ける（先頭のシャードから1ずつ多くする）"""
+    base, remainder = divmod(total, shards)
+    return [base + (1 if i < remainder else 0) for i in range(shards)]
+
+
+def validate_shards(shards: int, concurrency: int) -> Optional[str]:
+    """シャード数が不正ならエラーメッセージを返す
+
+    シャード数が CONCURRENCY を超えると並行度0のシャードができ、そのシャードの REQUEST_COUNT が
+    実行されないまま合計より少ないリクエスト数でマージされてしまうため、拒否する。
+    """
+    if shards < 1:
+        return "--shards must be a positive integer"
+    if shards > concurrency:
+        return f"--shards ({shards}) must not exceed CONCURRENCY ({concurrency}); each shard needs at least 1 concurrent request"
+    return None
+
+
+def shard_artifact_dir(artifact_dir: Path, index: int) -> Path:
+    return artifact_dir / SHARDS_DIR_NAME / f"shard_{index:02d}"
+
+
+class Coordinator:
+    """開始バリアとシャードの完了待ち
+
+    register() は全シャードが揃うまでブロックし、揃った時点で
+    「現在時刻 + start_delay_sec」（coordinator の時計）を共通の開始時刻として返す。
+    rate_ready=False で作った場合は、set_request_rate() でレートが決まるまで開始時刻を決めない
+    （coordinator がペーシングのプローブ中でも、先にシャードの登録を受け付けられるように）。
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        artifact_dir: Path,
+        mode: str = "profile",
+        start_delay_sec: float = DEFAULT_START_DELAY_SEC,
+        barrier_timeout_sec: float = DEFAULT_BARRIER_TIMEOUT_SEC,
+        request_rate: Optional[float] = None,
+        rate_ready: bool = True,
+    ):
+        self.shards = shards
+        self.artifact_dir = artifact_dir
+        self.mode = mode
+        self.start_delay_sec = start_delay_sec
+        self.barrier_timeout_sec = barrier_timeout_sec
+        self.request_rate = request_rate
+        self.rate_ready = rate_ready
+        self.registered = 0
+        self.start_at: Optional[float] = None
+        self.done: Dict[int, int] = {}
+        self.condition = threading.Condition()
+
+    def register(self, host: str = "") -> Optional[Dict[str, Any]]:
+        """シャード番号を割り当て、全員が揃うまで待つ（定員超過・タイムアウトは None）"""
+        with self.condition:
+            if self.registered >= self.shards:
+                return None
+            index = self.registered
+            self.registered += 1
+            print(f"Shard {index} registered ({host or 'unknown'}) [{self.registered}/{self.shards}]", file=sys.stderr)
+            self._maybe_start()
+            if not self.condition.wait_for(lambda: self.start_at is not None, self.barrier_timeout_sec):
+                return None
+            return {
+                "index": index,
+                "shards": self.shards,
+                "start_at": self.start_at,
+                "mode": self.mode,
+                "artifact_dir": str(self.artifact_dir),
+                # 全体のレートをシャード数で割った分（None は制限なし）
+                "request_rate": self.request_rate / self.shards if self.request_rate else None,
+            }
+
+    def set_request_rate(self, request_rate: Optional[float]) -> None:
+        """全体のリクエストレートを確定する（None は制限なし）"""
+        with self.condition:
+            self.request_rate = request_rate
+            self.rate_ready = True
+            self._maybe_start()
+
+    def _maybe_start(self) -> None:
+        # condition を保持した状態で呼ぶ
+        if self.start_at is None and self.rate_ready and self.registered == self.shards:
+            self.start_at = time.time() + self.start_delay_sec
+            self.condition.notify_all()
+
+    def mark_done(self, index: int, returncode: int):
+        with self.condition:
+            self.done[index] = returncode
+            self.condition.notify_all()
+
+    def wait_done(self, timeout: Optional[float] = None) -> bool:
+        """全シャードの完了報告を待つ（timeout 秒以内に揃わなければ False）"""
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.done) >= self.shards, timeout)
+
+    def missing_shards(self) -> List[int]:
+        """完了報告の無いシャード番号"""
+        with self.condition:
+            return [index for index in range(self.shards) if index not in self.done]
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """GET /time, POST /register, POST /done"""
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/time":
+            self._send_json(200, {"time": time.time()})
+            return
+        self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        try:
+            payload = json.loads(self.rfile.read(length)) if length else {}
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "Invalid JSON body"})
+            return
+
+        coordinator: Coordinator = self.server.coordinator
+        path = self.path.rstrip("/")
+        if path == "/register":
+            assignment = coordinator.register(payload.get("host", ""))
+            if assignment is None:
+                self._send_json(409, {"error": "Barrier is full or timed out"})
+            else:
+                self._send_json(200, assignment)
+        elif path == "/done":
+            coordinator.mark_done(int(payload.get("index", -1)), int(payload.get("returncode", 0)))
+            self._send_json(200, {"ok": True})
+        else:
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def _send_json(self, status: int, body: Dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_coordinator_server(coordinator: Coordinator, host: str = "0.0.0.0", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+    server.daemon_threads = True
+    server.coordinator = coordinator
+    return server
+
+
+def _request_json(url: str, payload: Optional[Dict] = None, timeout: float = 30.0) -> Dict:
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, method="POST" if data is not None else "GET")
+    request.add_header("Content-Type", "application/json")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def _error_body(error: urllib.error.HTTPError) -> str:
+    try:
+        return json.loads(error.read()).get("error", "") or error.reason
+    except (ValueError, AttributeError, OSError):
+        return str(error.reason)
+
+
+def estimate_clock_offset(coordinator_url: str, samples: int = DEFAULT_OFFSET_SAMPLES) -> Tuple[float, float]:
+    """coordinator との時計のずれを推定（戻り値: (offset秒, 往復時間秒)）
+
+    offset = coordinator の時刻 - ローカルの時刻。往復時間が最小のサンプルで、
+    coordinator が応答した時刻を送受信の中点とみなす（NTP と同じ考え方）。
+    """
+    best: Optional[Tuple[float, float]] = None
+    for _ in range(samples):
+        t0 = time.time()
+        server_time = _request_json(f"{coordinator_url}/time")["time"]
+        t1 = time.time()
+        rtt = t1 - t0
+        offset = server_time - (t0 + t1) / 2
+        if best is None or rtt < best[1]:
+            best = (offset, rtt)
+    return best
+
+
+def run_profile_script(
+    mode: str, artifact_dir: Path, concurrency: int, request_count: int, request_rate: Optional[float] = None
+) -> int:
+    """シャード分の CONCURRENCY / REQUEST_COUNT / REQUEST_RATE で run_aiperf_profile.sh を実行
+
+    レートは coordinator が全体から割ったものを使い、シャードごとのペーシングのプローブはしない
+    （.env の値より優先させるため ENV_OVERRIDES に列挙する）。
+    """
+    env = dict(os.environ)
+    env.update({
+        "ARTIFACT_DIR": str(artifact_dir),
+        "CONCURRENCY": str(concurrency),
+        "REQUEST_COUNT": str(request_count),
+        "REQUEST_RATE": f"{request_rate:.6g}" if request_rate else "",
+        "ADAPTIVE_PACING": "0",
+        "ENV_OVERRIDES": "REQUEST_RATE ADAPTIVE_PACING",
+    })
+    return subprocess.run(["bash", "scripts/run_aiperf_profile.sh", mode], env=env).returncode
+
+
+def probe_request_rate(artifact_dir: Path) -> Optional[float]:
+    """adaptive_pacing.py で全体の持続可能なレートを1回だけ探す（失敗したら None = 制限なし）
+
+    結果は親の artifactディレクトリの pacing.json に保存される（summary.md に表示される）。
+    """
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    script = Path(__file__).resolve().parent / "adaptive_pacing.py"
+    completed = subprocess.run(
+        [sys.executable, str(script), "--output", str(artifact_dir / PACING_FILE_NAME)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        return float(completed.stdout.strip()) if completed.returncode == 0 else None
+    except ValueError:
+        return None
+
+
+def _total_request_rate() -> Optional[float]:
+    value = os.getenv("REQUEST_RATE", "").strip()
+    return float(value) if value else None
+
+
+def run_shard(
+    coordinator_url: str,
+    total_concurrency: int,
+    total_request_count: int,
+    runner: Callable[[str, Path, int, int, Optional[float]], int] = run_profile_script,
+) -> int:
+    """バリアに登録し、開始時刻まで待ってから自分の分を実行する"""
+    coordinator_url = coordinator_url.rstrip("/")
+    offset, rtt = estimate_clock_offset(coordinator_url)
+    print(f"Clock offset to coordinator: {offset * 1000:+.3f} ms (rtt {rtt * 1000:.3f} ms)", file=sys.stderr)
+
+    try:
+        assignment = _request_json(
+            f"{coordinator_url}/register", {"host": socket.gethostname()}, timeout=DEFAULT_BARRIER_TIMEOUT_SEC
+        )
+    except urllib.error.HTTPError as e:
+        # 409: 定員超過（--shards より多く起動した）か、他のシャードが揃わずバリアがタイムアウトした
+        print(f"Error: Coordinator rejected registration (HTTP {e.code}): {_error_body(e)}", file=sys.stderr)
+        return 1
+    index, shards = assignment["index"], assignment["shards"]
+    concurrency = split_counts(total_concurrency, shards)[index]
+    request_count = split_counts(total_request_count, shards)[index]
+    artifact_dir = shard_artifact_dir(Path(assignment["artifact_dir"]), index)
+    if concurrency < 1:
+        # coordinator 側の検証をすり抜けた場合（シャードごとに CONCURRENCY が異なる等）も失敗として報告する
+        print(f"Error: Shard {index}/{shards} got CONCURRENCY=0 (total {total_concurrency})", file=sys.stderr)
+        _request_json(f"{coordinator_url}/done", {"index": index, "returncode": 1})
+        return 1
+
+    # coordinator の時計での開始時刻をローカルの時計に直して待つ
+    wait_sec = assignment["start_at"] - offset - time.time()
+    print(
+        f"Shard {index}/{shards}: CONCURRENCY={concurrency} REQUEST_COUNT={request_count} "
+        f"REQUEST_RATE={assignment.get('request_rate') or 'unlimited'}, "
+        f"starting in {max(wait_sec, 0.0):.2f}s",
+        file=sys.stderr,
+    )
+    if wait_sec > 0:
+        time.sleep(wait_sec)
+
+    started_at = time.time()
+    returncode = runner(assignment["mode"], artifact_dir, concurrency, request_count, assignment.get("request_rate"))
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    with open(artifact_dir / SHARD_INFO_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump({
+            "index": index,
+            "shards": shards,
+            "host": socket.gethostname(),
+            "concurrency": concurrency,
+            "request_count": request_count,
+            "request_rate": assignment.get("request_rate"),
+            "clock_offset_ns": int(round(offset * 1e9)),
+            "clock_rtt_ns": int(round(rtt * 1e9)),
+            "start_at": assignment["start_at"],
+            "started_at_local": started_at,
+            "returncode": returncode,
+        }, f, indent=2)
+
+    _request_json(f"{coordinator_url}/done", {"index": index, "returncode": returncode})
+    return returncode
+
+
+def apply_clock_offset(record: Dict, offset_ns: int) -> Dict:
+    """metadata のエポック時刻（*_ns）に offset_ns を加えて coordinator の時計に揃える"""
+    metadata = record.get("metadata")
+    if not isinstance(metadata, dict) or not offset_ns:
+        return record
+    for key, value in metadata.items():
+        if key.endswith("_ns") and isinstance(value, int) and not isinstance(value, bool) and value > EPOCH_NS_THRESHOLD:
+            metadata[key] = value + offset_ns
+    return record
+
+
+def _start_ns(record: Dict) -> int:
+    metadata = record.get("metadata") or {}
+    value = metadata.get("request_start_ns")
+    return value if isinstance(value, int) else 0
+
+
+def _shard_export_files(shard_dir: Path) -> List[Path]:
+    # リクエスト単位の profile_export.jsonl を優先（集計済みの profile_export_*.json はマージしない）
+    jsonl_file = shard_dir / "profile_export.jsonl"
+    return [jsonl_file] if jsonl_file.exists() else find_export_files(shard_dir)
+
+
+def merge_shard_exports(artifact_dir: Path, missing_shards: Optional[List[int]] = None) -> Dict[str, Any]:
+    """シャードの export を時計を補正してマージし、親ディレクトリに書き出す
+
+    missing_shards（完了報告の無いシャード番号）のディレクトリは書き込み途中の可能性があるため読まず、
+    shards.json に記録する。
+    """
+    missing_shards = sorted(missing_shards or [])
+    skipped = {shard_artifact_dir(artifact_dir, index).name for index in missing_shards}
+    shard_dirs = sorted(
+        d for d in (artifact_dir / SHARDS_DIR_NAME).glob("shard_*") if d.is_dir() and d.name not in skipped
+    )
+    if not shard_dirs:
+        raise FileNotFoundError(f"No shard directories found in {artifact_dir / SHARDS_DIR_NAME}")
+
+    merged: List[Dict] = []
+    shard_summaries: List[Dict[str, Any]] = []
+    shard_metas: List[Dict[str, Any]] = []
+    for shard_dir in shard_dirs:
+        info_path = shard_dir / SHARD_INFO_FILE_NAME
+        info: Dict[str, Any] = {}
+        if info_path.exists():
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        else:
+            print(f"Warning: {info_path} not found; assuming no clock offset", file=sys.stderr)
+        offset_ns = int(info.get("clock_offset_ns", 0))
+        index = info.get("index", len(shard_summaries))
+
+        export_files = _shard_export_files(shard_dir)
+        records = load_export_data(export_files) if export_files else []
+        if not records:
+            print(f"Warning: No export records in {shard_dir}", file=sys.stderr)
+        for record in records:
+            apply_clock_offset(record, offset_ns)
+            record.setdefault("metadata", {})["shard_index"] = index
+        merged.extend(records)
+
+        meta = load_run_meta(shard_dir)
+        if meta:
+            shard_metas.append(meta)
+        shard_summaries.append({
+            "index": index,
+            "dir": str(shard_dir),
+            "host": info.get("host"),
+            "records": len(records),
+            "concurrency": info.get("concurrency"),
+            "request_count": info.get("request_count"),
+            "request_rate": info.get("request_rate"),
+            "clock_offset_ns": offset_ns,
+            "clock_rtt_ns": info.get("clock_rtt_ns"),
+            "returncode": info.get("returncode"),
+        })
+
+    merged.sort(key=_start_ns)
+    with open(artifact_dir / MERGED_EXPORT_FILE_NAME, "w", encoding="utf-8") as f:
+        for record in merged:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    summary = {
+        "shards": len(shard_dirs),
+        "records": len(merged),
+        "missing_shards": missing_shards,
+        "shard_details": shard_summaries,
+    }
+    with open(artifact_dir / SHARDS_SUMMARY_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    # 親の run_meta.json（CONCURRENCY / REQUEST_COUNT / REQUEST_RATE はシャードの合計）
+    if shard_metas:
+        meta = dict(min(shard_metas, key=lambda m: m.get("started_at_epoch") or 0))
+        meta["concurrency"] = sum(s["concurrency"] or 0 for s in shard_summaries) or meta.get("concurrency")
+        meta["request_count"] = sum(s["request_count"] or 0 for s in shard_summaries) or meta.get("request_count")
+        meta["request_rate"] = sum(s["request_rate"] or 0 for s in shard_summaries) or None
+        meta["shards"] = len(shard_dirs)
+        write_run_meta(artifact_dir, meta)
+
+    return summary
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else default
+
+
+def _totals_from_env() -> Tuple[int, int]:
+    concurrency = _env_int("CONCURRENCY", 10)
+    return concurrency, _env_int("REQUEST_COUNT", concurrency * 3)
+
+
+def _parent_artifact_dir(mode: str, concurrency: int) -> Path:
+    override = os.getenv("ARTIFACT_DIR", "").strip()
+    if override:
+        return Path(override)
+    return default_artifact_dir(
+        mode, _env_int("INPUT_TOKENS_MEAN", 100), _env_int("OUTPUT_TOKENS_MEAN", 200), concurrency
+    )
+
+
+def _merge_and_report(artifact_dir: Path, missing_shards: Optional[List[int]] = None) -> None:
+    try:
+        summary = merge_shard_exports(artifact_dir, missing_shards)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"Merged {summary['records']} records from {summary['shards']} shards into {artifact_dir / MERGED_EXPORT_FILE_NAME}",
+        file=sys.stderr,
+    )
+    for shard in summary["shard_details"]:
+        print(
+            f"  shard {shard['index']}: {shard['records']} records, "
+            f"clock offset {shard['clock_offset_ns'] / 1e6:+.3f} ms, returncode={shard['returncode']}",
+            file=sys.stderr,
+        )
+    if summary["missing_shards"]:
+        print(
+            f"Warning: Shards {summary['missing_shards']} did not finish; the merged run is missing their requests",
+            file=sys.stderr,
+        )
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name, "").strip()
+    return float(value) if value else default
+
+
+def _resolve_request_rate(coordinator: Coordinator, artifact_dir: Path, adaptive_pacing: bool) -> None:
+    """ADAPTIVE_PACING=1 なら全体のレートを1回だけプローブして coordinator に渡す（登録済みのシャードはその後に開始）"""
+    if adaptive_pacing:
+        print("Probing sustainable request rate for all shards (ADAPTIVE_PACING=1)...", file=sys.stderr)
+        rate = probe_request_rate(artifact_dir)
+        if rate is None:
+            print("Warning: Adaptive pacing probe failed; running shards without --request-rate", file=sys.stderr)
+        coordinator.set_request_rate(rate)
+    if coordinator.request_rate:
+        print(f"Total REQUEST_RATE={coordinator.request_rate:g} "
+              f"({coordinator.request_rate / coordinator.shards:g} per shard)", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None):
+    if load_dotenv is not None:
+        load_dotenv()
+
+    parser = argparse.ArgumentParser(description="複数プロセス / ホストでの分散実行と export のマージ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="ローカルで N 個のシャードプロセスを起動して実行・マージ")
+    run_parser.add_argument("--shards", type=int, default=_env_int("DIST_SHARDS", 2), help="シャード数")
+    run_parser.add_argument("--mode", default="profile", help="実行モード（デフォルト: profile）")
+    run_parser.add_argument("--start-delay", type=float, default=DEFAULT_START_DELAY_SEC,
+                            help="全シャードが揃ってから開始するまでの秒数")
+    run_parser.add_argument("--done-timeout", type=float, default=_env_float("DIST_DONE_TIMEOUT", DEFAULT_DONE_TIMEOUT_SEC),
+                            help="全シャードの完了を待つ秒数。過ぎたら残りを停止し、完了した分だけマージ"
+                                 f"（デフォルト: {DEFAULT_DONE_TIMEOUT_SEC:.0f}）")
+
+    coordinator_parser = subparsers.add_parser("coordinator", help="開始バリアを提供し、全シャード完了後にマージ")
+    coordinator_parser.add_argument("--shards", type=int, default=_env_int("DIST_SHARDS", 2), help="シャード数")
+    coordinator_parser.add_argument("--mode", default="profile", help="実行モード（デフォルト: profile）")
+    coordinator_parser.add_argument("--host", default="0.0.0.0", help="待ち受けアドレス")
+    coordinator_parser.add_argument("--port", type=int, default=_env_int("DIST_COORDINATOR_PORT", DEFAULT_PORT),
+                                    help=f"待ち受けポート（デフォルト: {DEFAULT_PORT}）")
+    coordinator_parser.add_argument("--start-delay", type=float, default=DEFAULT_START_DELAY_SEC,
+                                    help="全シャードが揃ってから開始するまでの秒数")
+    coordinator_parser.add_argument("--done-timeout", type=float,
+                                    default=_env_float("DIST_DONE_TIMEOUT", DEFAULT_DONE_TIMEOUT_SEC),
+                                    help="全シャードの完了報告を待つ秒数。過ぎたら完了した分だけマージ"
+                                         f"（デフォルト: {DEFAULT_DONE_TIMEOUT_SEC:.0f}）")
+
+    shard_parser = subparsers.add_parser("shard", help="coordinator に登録して自分の分を実行")
+    shard_parser.add_argument("--coordinator", default=os.getenv("DIST_COORDINATOR_URL", ""),
+                              help="coordinator のURL（例: http://host:9500）")
+
+    merge_parser = subparsers.add_parser("merge", help="シャードの export をマージ")
+    merge_parser.add_argument("artifact_dir", help="親の artifactディレクトリ")
+
+    args = parser.parse_args(argv)
+    total_concurrency, total_request_count = _totals_from_env()
+
+    if args.command == "merge":
+        _merge_and_report(Path(args.artifact_dir))
+        return
+
+    if args.command == "shard":
+        if not args.coordinator:
+            print("Error: --coordinator (or DIST_COORDINATOR_URL) is required", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(run_shard(args.coordinator, total_concurrency, total_request_count))
+
+    error = validate_shards(args.shards, total_concurrency)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+
+    artifact_dir = _parent_artifact_dir(args.mode, total_concurrency)
+    adaptive_pacing = os.getenv("ADAPTIVE_PACING", "0").strip() == "1"
+    coordinator = Coordinator(
+        args.shards, artifact_dir, args.mode, args.start_delay,
+        request_rate=None if adaptive_pacing else _total_request_rate(),
+        rate_ready=not adaptive_pacing,
+    )
+
+    if args.command == "coordinator":
+        server = make_coordinator_server(coordinator, args.host, args.port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Coordinator listening on {args.host}:{args.port} for {args.shards} shards -> {artifact_dir}", file=sys.stderr)
+        _resolve_request_rate(coordinator, artifact_dir, adaptive_pacing)
+        if not coordinator.wait_done(args.done_timeout):
+            print(f"Warning: Timed out after {args.done_timeout:.0f}s waiting for shards to finish", file=sys.stderr)
+        server.shutdown()
+        if any(coordinator.done.values()):
+            print(f"Warning: Some shards failed: {coordinator.done}", file=sys.stderr)
+        missing = coordinator.missing_shards()
+        _merge_and_report(artifact_dir, missing)
+        # 1つでも失敗・未完了のシャードがあればマージ結果は不完全なので失敗扱い
+        if any(coordinator.done.values()) or missing:
+            sys.exit(1)
+        return
+
+    # run: coordinator をスレッドで起動し、シャードをローカルのプロセスとして実行
+    server = make_coordinator_server(coordinator, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    coordinator_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Running {args.shards} shards (CONCURRENCY={total_concurrency}) -> {artifact_dir}", file=sys.stderr)
+
+    processes = [
+        subprocess.Popen([sys.executable, __file__, "shard", "--coordinator", coordinator_url])
+        for _ in range(args.shards)
+    ]
+    _resolve_request_rate(coordinator, artifact_dir, adaptive_pacing)
+    deadline = time.time() + args.done_timeout
+    returncodes = []
+    for process in processes:
+        try:
+            returncodes.append(process.wait(timeout=max(deadline - time.time(), 0.0)))
+        except subprocess.TimeoutExpired:
+            print(f"Warning: Shard process {process.pid} did not finish within {args.done_timeout:.0f}s; terminating",
+                  file=sys.stderr)
+            process.terminate()
+            returncodes.append(process.wait())
+    server.shutdown()
+    if any(returncodes):
+        print(f"Warning: Some shards failed: returncodes={returncodes}", file=sys.stderr)
+    missing = coordinator.missing_shards()
+    _merge_and_report(artifact_dir, missing)
+    # 1つでも失敗・未完了のシャードがあればマージ結果は不完全なので失敗扱い
+    if any(returncodes) or missing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+AIPerfのexportレコードから値を取り出す共通関数
+
+summarize_export.py と各分析モジュール（session / phase / concurrency / timeseries / metrics export）が
+使うレコード単位の処理をまとめたモジュールです。分析モジュールは summarize_export ではなくここから
+importするため、summarize_export から分析モジュールを先頭で import しても循環しません。
+"""
+
+import re
+import statistics
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def get_record_value(record: Dict, field_names: Sequence[str]) -> Optional[Any]:
+    """レコードから候補フィールド名の値を探す（直接 / metrics / metadata の順）
+
+    AIPerfの辞書形式 {'value': ..., 'unit': ...} の場合は value を返す。
+    """
+    containers = [record]
+    for key in ("metrics", "metadata"):
+        if key in record and isinstance(record[key], dict):
+            containers.append(record[key])
+
+    for field in field_names:
+        for container in containers:
+            if field in container and container[field] is not None:
+                value = container[field]
+                if isinstance(value, dict):
+                    if "value" not in value:
+                        continue
+                    value = value["value"]
+                return value
+    return None
+
+
+def extract_request_span_ns(record: Dict) -> Optional[Tuple[int, int]]:
+    """リクエストの開始/終了時刻（エポックns）を抽出
+
+    AIPerfのexportでは metadata.request_start_ns / request_end_ns に記録される。
+    終了時刻が無い場合は開始時刻 + request_latency（ms）で補完する。
+    """
+    start = get_record_value(record, ["request_start_ns", "start_ns", "start_time_ns", "timestamp_ns"])
+    if not isinstance(start, (int, float)):
+        return None
+
+    end = get_record_value(record, ["request_end_ns", "end_ns", "end_time_ns"])
+    if not isinstance(end, (int, float)):
+        latency_ms = get_record_value(record, REQUEST_LATENCY_FIELDS)
+        if not isinstance(latency_ms, (int, float)):
+            return None
+        end = start + latency_ms * 1_000_000
+
+    if end < start:
+        return None
+    return int(start), int(end)
+
+
+def extract_request_spans(data: List[Dict]) -> List[Tuple[int, int]]:
+    """全レコードの (開始ns, 終了ns) を抽出（時刻が取れないレコードはスキップ）"""
+    spans = []
+    for record in data:
+        span = extract_request_span_ns(record)
+        if span is not None:
+            spans.append(span)
+    return spans
+
+
+def extract_metric_value(record: Dict, metric_name: str) -> Optional[float]:
+    """1レコードの指定されたメトリクスの値（ms単位に変換、無ければ None）"""
+    # 様々な可能性のあるフィールド名を試す
+    value = None
+    
+    # AIPerfのexport形式: metrics.time_to_first_token など
+    if "metrics" in record and isinstance(record["metrics"], dict):
+        metrics = record["metrics"]
+        if metric_name in metrics:
+            value = metrics[metric_name]
+    
+    # 直接フィールド
+    if value is None and metric_name in record:
+        value = record[metric_name]
+    
+    # 別名（例: ttft, latency）
+    if value is None and metric_name == "time_to_first_token":
+        for alt_name in ["ttft", "time_to_first_token_ms", "first_token_latency", "time_to_first_output_token"]:
+            if "metrics" in record and isinstance(record["metrics"], dict) and alt_name in record["metrics"]:
+                value = record["metrics"][alt_name]
+                break
+            elif alt_name in record:
+                value = record[alt_name]
+                break
+    elif value is None and metric_name == "request_latency":
+        for alt_name in REQUEST_LATENCY_FIELDS[1:]:
+            if "metrics" in record and isinstance(record["metrics"], dict) and alt_name in record["metrics"]:
+                value = record["metrics"][alt_name]
+                break
+            elif alt_name in record:
+                value = record[alt_name]
+                break
+    elif value is None and metric_name == "inter_token_latency":
+        for alt_name in ["itl", "inter_token_latency_ms", "token_latency", "inter_chunk_latency"]:
+            if "metrics" in record and isinstance(record["metrics"], dict) and alt_name in record["metrics"]:
+                value = record["metrics"][alt_name]
+                break
+            elif alt_name in record:
+                value = record[alt_name]
+                break
+    
+    if value is not None:
+        # AIPerfのexport形式: {'value': 458.1325, 'unit': 'ms'} のような辞書形式
+        if isinstance(value, dict):
+            if "value" in value:
+                value = value["value"]
+            else:
+                return None  # 辞書形式だがvalueキーがない場合はスキップ
+        
+        # 値の単位を変換（AIPerfのexportは既にms単位で出力される）
+        if isinstance(value, (int, float)):
+            # AIPerfのexportは通常ms単位なので、そのまま使用
+            # ただし、異常に大きい値（ナノ秒）や小さい値（秒）の場合は変換
+            # ナノ秒単位の可能性をチェック（非常に大きい値、例: 1秒 = 1,000,000,000ns）
+            if value > 1_000_000_000:
+                value = value / 1_000_000  # ナノ秒→ms
+            # 秒単位の可能性（1未満の値、例: 0.5秒）
+            elif value < 1:
+                value = value * 1000  # 秒→ms
+            # それ以外はms単位と仮定（1以上1,000,000,000未満）
+            return float(value)
+    return None
+
+
+def extract_metric_values(data: List[Dict], metric_name: str) -> List[float]:
+    """指定されたメトリクスの値を抽出（ms単位に変換、値の無いレコードは除く）"""
+    values = []
+    for record in data:
+        value = extract_metric_value(record, metric_name)
+        if value is not None:
+            values.append(value)
+    return values
+
+def calculate_percentiles(values: List[float]) -> Dict[str, float]:
+    """パーセンタイルを計算"""
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "avg": 0.0}
+    
+    sorted_values = sorted(values)
+    n = len(sorted_values)
+    
+    def percentile(p: float) -> float:
+        if n == 0:
+            return 0.0
+        k = (n - 1) * p
+        f = int(k)
+        c = k - f
+        if f + 1 < n:
+            return sorted_values[f] * (1 - c) + sorted_values[f + 1] * c
+        return sorted_values[f]
+    
+    return {
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "avg": statistics.mean(sorted_values) if sorted_values else 0.0,
+    }
+
+def is_error_record(record: Dict) -> bool:
+    """レコードがエラー（失敗したリクエスト）かどうか"""
+    # 様々なエラー判定方法
+    if "error" in record and record["error"]:
+        return True
+    if "status" in record and record["status"] != "success":
+        return True
+    if "success" in record and not record["success"]:
+        return True
+    return False
+
+
+def count_errors(data: List[Dict]) -> int:
+    """エラー数をカウント"""
+    return sum(1 for record in data if is_error_record(record))
+
+
+# エラー分類（表示順）
+ERROR_CATEGORIES = [
+    ("http_429", "HTTP 429 (Rate Limited)"),
+    ("http_5xx", "HTTP 5xx"),
+    ("http_4xx", "HTTP 4xx (other)"),
+    ("timeout", "Timeout"),
+    ("stream_truncated", "Stream Truncated"),
+    ("other", "Other"),
+]
+
+ERROR_STATUS_FIELDS = ["code", "status_code", "http_status", "status"]
+
+# メッセージ中のHTTPステータス（"HTTP 429", "HTTP/1.1 503", "status code 503" など）
+HTTP_STATUS_PATTERN = re.compile(
+    r"\b(?:http(?:/\d(?:\.\d)?)?|status(?:[ _]code)?|code)\D{0,3}([1-5]\d\d)\b", re.IGNORECASE
+)
+TIMEOUT_KEYWORDS = ("timeout", "timed out", "deadline exceeded")
+# ストリームの途中切断（HTTPステータスを持たないエラーのみ。"invalid payload" のような4xxの本文に当たらないよう具体的な語句にする）
+STREAM_TRUNCATED_KEYWORDS = (
+    "truncat", "premature", "connection closed", "connection reset", "disconnect",
+    "incompleteread", "incomplete read", "incomplete chunked", "payload is not completed",
+    "unexpected eof", "eof occurred", "stream ended",
+)
+
+
+def extract_error_status(record: Dict) -> Optional[int]:
+    """エラーレコードのHTTPステータスコード（取得できなければ None）"""
+    error = record.get("error")
+    candidates = []
+    if isinstance(error, dict):
+        candidates.extend(error.get(field) for field in ERROR_STATUS_FIELDS)
+    candidates.extend(record.get(field) for field in ("status_code", "http_status", "status"))
+    for value in candidates:
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, int) and 100 <= value <= 599:
+            return value
+
+    match = HTTP_STATUS_PATTERN.search(_error_text(record))
+    return int(match.group(1)) if match else None
+
+
+def _error_text(record: Dict) -> str:
+    """分類用にエラーの type / message を1つの文字列にまとめる（小文字）"""
+    error = record.get("error")
+    if isinstance(error, dict):
+        parts = [error.get("type"), error.get("message")]
+    else:
+        parts = [error]
+    parts.append(record.get("error_message"))
+    return " ".join(str(p) for p in parts if p and p is not True).lower()
+
+
+def classify_error(record: Dict) -> Optional[str]:
+    """エラーレコードを分類（成功レコードは None）
+
+    HTTPステータス（429 / 5xx / 408はtimeout / その他4xx）を優先し、
+    ステータスが無ければ type / message のキーワードで timeout・stream truncation を判定する。
+    """
+    if not is_error_record(record):
+        return None
+
+    status = extract_error_status(record)
+    if status == 429:
+        return "http_429"
+    if status == 408:
+        return "timeout"
+    if status is not None and 500 <= status <= 599:
+        return "http_5xx"
+    if status is not None and 400 <= status <= 499:
+        return "http_4xx"
+
+    text = _error_text(record)
+    if "rate limit" in text or "too many requests" in text:
+        return "http_429"
+    if any(keyword in text for keyword in TIMEOUT_KEYWORDS):
+        return "timeout"
+    if status is None and any(keyword in text for keyword in STREAM_TRUNCATED_KEYWORDS):
+        return "stream_truncated"
+    return "other"
+
+
+def summarize_errors(data: List[Dict]) -> Dict[str, Dict[str, Any]]:
+    """エラー分類ごとの件数・割合・request latency の分布（件数0の分類は含めない）"""
+    grouped: Dict[str, List[Dict]] = {}
+    for record in data:
+        category = classify_error(record)
+        if category is not None:
+            grouped.setdefault(category, []).append(record)
+
+    total = len(data)
+    result: Dict[str, Dict[str, Any]] = {}
+    for category, _ in ERROR_CATEGORIES:
+        records = grouped.get(category)
+        if not records:
+            continue
+        latencies = extract_metric_values(records, "request_latency")
+        result[category] = {
+            "count": len(records),
+            "rate": len(records) / total if total else 0.0,
+            "latency": calculate_percentiles(latencies) if latencies else None,
+            "latency_count": len(latencies),
+        }
+    return result
+
+
+# 入力 / 出力トークン数と request latency のフィールド名の候補（先に見つかったものを使う。
+# 各モジュールはここから import し、独自に定義しない）
+INPUT_TOKEN_FIELDS = ["input_sequence_length", "input_token_count", "input_tokens", "prompt_tokens"]
+OUTPUT_TOKEN_FIELDS = [
+    "token_count", "output_token_count", "output_tokens",
+    "completion_tokens", "generated_tokens", "output_sequence_length"
+]
+# 先頭は extract_metric_value の "request_latency" そのもの。残りはその別名として順に探す
+REQUEST_LATENCY_FIELDS = [
+    "request_latency", "request_latency_ms", "latency", "end_to_end_latency", "e2e_latency"
+]
+
+
+def extract_tokens_per_sec(data: List[Dict]) -> List[float]:
+    """各リクエストの output tokens/sec を計算"""
+    values = []
+
+    for record in data:
+        token_count = None
+        latency_ms = None
+
+        # token_count を探す（フィールド名の候補リスト）
+        for field in OUTPUT_TOKEN_FIELDS:
+            # 直接フィールド
+            if field in record and record[field] is not None:
+                token_count = record[field]
+                break
+            # metrics 辞書内
+            if "metrics" in record and isinstance(record["metrics"], dict):
+                if field in record["metrics"] and record["metrics"][field] is not None:
+                    token_count = record["metrics"][field]
+                    break
+
+        # request latency を探す（extract_metric_value と同じフィールド名の候補リスト）
+        for field in REQUEST_LATENCY_FIELDS:
+            # 直接フィールド
+            if field in record and record[field] is not None:
+                latency_ms = record[field]
+                break
+            # metrics 辞書内
+            if "metrics" in record and isinstance(record["metrics"], dict):
+                if field in record["metrics"] and record["metrics"][field] is not None:
+                    latency_ms = record["metrics"][field]
+                    break
+
+        # 両方の値が取得できた場合のみ計算
+        if token_count is not None and latency_ms is not None:
+            # 辞書形式の場合は value を取得
+            if isinstance(token_count, dict) and "value" in token_count:
+                token_count = token_count["value"]
+            if isinstance(latency_ms, dict) and "value" in latency_ms:
+                latency_ms = latency_ms["value"]
+
+            if isinstance(token_count, (int, float)) and isinstance(latency_ms, (int, float)):
+                if latency_ms > 0:
+                    # latency_ms を秒に変換して tokens/sec を計算
+                    latency_sec = latency_ms / 1000.0
+                    tokens_per_sec = token_count / latency_sec
+                    values.append(tokens_per_sec)
+
+    return values
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+ISL × OSL × concurrency のマトリクス実行（spec ファイル駆動・再開可能）
+
+TOML（または YAML）の spec を展開し、各点について INPUT_TOKENS_MEAN / OUTPUT_TOKENS_MEAN /
+CONCURRENCY / REQUEST_COUNT を環境変数で渡して run_aiperf_profile.sh を実行します。
+
+- 再開: `ISL*_OSL*_CON*` の artifactディレクトリに、REQUEST_COUNT 件以上のレコードを持つ
+  export が既にある点はスキップする（中断後にそのまま再実行すればよい）
+- 順序: サーバを温めたまま進めるため、concurrency を昇順→降順と折り返す serpentine 順で実行する
+  （点と点の間で負荷が急に落ちない・ISL/OSL の切り替わりが最小になる）
+- 集計: 最後に全点の TTFT / Latency / スループット / prefill 比率を matrix_summary.tsv / .md に出力
+
+使用例:
+    cp matrix.toml.example matrix.toml
+    python scripts/matrix_run.py matrix.toml
+    python scripts/matrix_run.py matrix.toml --dry-run      # 実行計画だけ表示
+    python scripts/matrix_run.py matrix.toml --summary-only # 集計だけやり直す
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import tomllib
+from itertools import product
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover
+    yaml = None  # type: ignore
+
+from run_meta import default_artifact_dir
+from summarize_export import (
+    calculate_percentiles,
+    count_errors,
+    extract_metric_values,
+    extract_request_spans,
+    extract_tokens_per_sec,
+    find_export_files,
+    is_error_record,
+    load_export_data,
+)
+
+SUMMARY_TSV_FILE_NAME = "matrix_summary.tsv"
+SUMMARY_MD_FILE_NAME = "matrix_summary.md"
+
+DEFAULT_REQUESTS_PER_CONCURRENCY = 3  # run_aiperf_profile.sh の REQUEST_COUNT の既定値と同じ
+ORDERS = ("serpentine", "grid")
+# make warmup と同じ軽い負荷
+WARMUP_CONCURRENCY = 3
+WARMUP_REQUEST_COUNT = 9
+
+SUMMARY_COLUMNS = [
+    ("isl", "ISL"),
+    ("osl", "OSL"),
+    ("concurrency", "CON"),
+    ("status", "Status"),
+    ("records", "Records"),
+    ("errors", "Errors"),
+    ("ttft_p50", "TTFT p50 (ms)"),
+    ("ttft_p95", "TTFT p95 (ms)"),
+    ("latency_p50", "Latency p50 (ms)"),
+    ("latency_p95", "Latency p95 (ms)"),
+    ("itl_p50", "ITL p50 (ms)"),
+    ("output_tps", "Output tok/s (per request)"),
+    ("request_throughput", "Requests/sec"),
+    ("prefill_share", "Prefill Share (%)"),
+]
+
+
+def _as_int_list(spec: Dict[str, Any], key: str) -> List[int]:
+    value = spec.get(key)
+    values = value if isinstance(value, list) else [value]
+    if value is None or not values or not all(isinstance(v, int) and not isinstance(v, bool) and v > 0 for v in values):
+        raise ValueError(f"'{key}' must be a positive integer or a non-empty list of positive integers")
+    return sorted(set(values))
+
+
+def load_spec(path: Path) -> Dict[str, Any]:
+    """spec ファイル（.toml / .yaml / .yml）を読み込み、検証して正規化する"""
+    if path.suffix in (".yaml", ".yml"):
+        if yaml is None:
+            raise ValueError("PyYAML is required for YAML specs (pip install pyyaml); or use a TOML spec")
+        with open(path, "r", encoding="utf-8") as f:
+            raw = yaml.safe_load(f) or {}
+    else:
+        with open(path, "rb") as f:
+            raw = tomllib.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError("spec must be a table / mapping")
+
+    order = raw.get("order", "serpentine")
+    if order not in ORDERS:
+        raise ValueError(f"'order' must be one of {', '.join(ORDERS)}")
+    request_count = raw.get("request_count")
+    if request_count is not None and (not isinstance(request_count, int) or request_count <= 0):
+        raise ValueError("'request_count' must be a positive integer")
+    env = raw.get("env") or {}
+    if not isinstance(env, dict):
+        raise ValueError("'env' must be a table of environment variables")
+
+    return {
+        "mode": str(raw.get("mode", "profile")),
+        "isl": _as_int_list(raw, "isl"),
+        "osl": _as_int_list(raw, "osl"),
+        "concurrency": _as_int_list(raw, "concurrency"),
+        "request_count": request_count,
+        "requests_per_concurrency": int(raw.get("requests_per_concurrency", DEFAULT_REQUESTS_PER_CONCURRENCY)),
+        "order": order,
+        "warmup": bool(raw.get("warmup", False)),
+        "env": {str(k): str(v) for k, v in env.items()},
+    }
+
+
+def serpentine_order(isls: List[int], osls: List[int], concurrencies: List[int]) -> List[Dict[str, int]]:
+    """ISL 昇順、その中で OSL・concurrency を交互に折り返す順で点を並べる
+
+    例: CON=[1, 8, 32] なら 1→8→32 の次の (ISL, OSL) は 32→8→1 と進むため、
+    点の切り替わりで並行度が急に下がってサーバが冷えることがない。
+    """
+    points = []
+    reverse_osl = reverse_con = False
+    for isl in isls:
+        for osl in (reversed(osls) if reverse_osl else osls):
+            for concurrency in (reversed(concurrencies) if reverse_con else concurrencies):
+                points.append({"isl": isl, "osl": osl, "concurrency": concurrency})
+            reverse_con = not reverse_con
+        reverse_osl = not reverse_osl
+    return points
+
+
+def expand_points(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """spec を実行順の点のリストに展開する（各点に REQUEST_COUNT と artifactディレクトリを付ける）"""
+    if spec["order"] == "serpentine":
+        points = serpentine_order(spec["isl"], spec["osl"], spec["concurrency"])
+    else:
+        points = [
+            {"isl": isl, "osl": osl, "concurrency": con}
+            for isl, osl, con in product(spec["isl"], spec["osl"], spec["concurrency"])
+        ]
+    for point in points:
+        point["request_count"] = spec["request_count"] or point["concurrency"] * spec["requests_per_concurrency"]
+        point["artifact_dir"] = default_artifact_dir(spec["mode"], point["isl"], point["osl"], point["concurrency"])
+    return points
+
+
+def count_export_records(artifact_dir: Path) -> int:
+    """artifactディレクトリの export のレコード数（無ければ 0）"""
+    export_files = find_export_files(artifact_dir) if artifact_dir.is_dir() else []
+    if not export_files:
+        return 0
+    if export_files[0].name == "profile_export.jsonl":
+        # 大きな export でも全体をパースしないよう、空でない行を数える
+        with open(export_files[0], "rb") as f:
+            return sum(1 for line in f if line.strip())
+    return len(load_export_data(export_files))
+
+
+def is_point_complete(point: Dict[str, Any]) -> bool:
+    """REQUEST_COUNT 件以上のレコードを持つ export があれば実行済みとみなす"""
+    return count_export_records(point["artifact_dir"]) >= point["request_count"]
+
+
+def run_point(mode: str, point: Dict[str, Any], extra_env: Dict[str, str]) -> int:
+    """1点分の run_aiperf_profile.sh を実行"""
+    env = dict(os.environ)
+    env.update(extra_env)
+    env.update({
+        "INPUT_TOKENS_MEAN": str(point["isl"]),
+        "OUTPUT_TOKENS_MEAN": str(point["osl"]),
+        "CONCURRENCY": str(point["concurrency"]),
+        "REQUEST_COUNT": str(point["request_count"]),
+        "ARTIFACT_DIR": str(point["artifact_dir"]),
+        # [env] の変数も .env より優先させる
+        "ENV_OVERRIDES": " ".join(extra_env),
+    })
+    return subprocess.run(["bash", "scripts/run_aiperf_profile.sh", mode], env=env).returncode
+
+
+def run_matrix(
+    spec: Dict[str, Any],
+    points: List[Dict[str, Any]],
+    runner: Callable[[str, Dict[str, Any], Dict[str, str]], int] = run_point,
+    force: bool = False,
+) -> Dict[str, str]:
+    """未完了の点を順に実行する（戻り値: artifactディレクトリ → completed / skipped / failed）"""
+    statuses: Dict[str, str] = {}
+    pending = []
+    for point in points:
+        if force or not is_point_complete(point):
+            pending.append(point)
+        else:
+            statuses[str(point["artifact_dir"])] = "skipped"
+    print(f"Matrix: {len(points)} points, {len(pending)} to run, {len(points) - len(pending)} already complete",
+          file=sys.stderr)
+
+    if pending and spec["warmup"]:
+        first = pending[0]
+        warmup = dict(first, concurrency=WARMUP_CONCURRENCY, request_count=WARMUP_REQUEST_COUNT,
+                      artifact_dir=default_artifact_dir("warmup", first["isl"], first["osl"], WARMUP_CONCURRENCY))
+        print(f"Warmup: ISL={first['isl']} OSL={first['osl']} CON={WARMUP_CONCURRENCY}", file=sys.stderr)
+        if runner("warmup", warmup, spec["env"]) != 0:
+            print("Warning: Warmup failed; continuing with the matrix", file=sys.stderr)
+
+    for i, point in enumerate(pending, start=1):
+        print(
+            f"[{i}/{len(pending)}] ISL={point['isl']} OSL={point['osl']} CON={point['concurrency']} "
+            f"REQUEST_COUNT={point['request_count']} -> {point['artifact_dir']}",
+            file=sys.stderr,
+        )
+        started = time.time()
+        returncode = runner(spec["mode"], point, spec["env"])
+        ok = returncode == 0 and is_point_complete(point)
+        statuses[str(point["artifact_dir"])] = "completed" if ok else "failed"
+        if not ok:
+            print(f"Warning: Point failed (returncode={returncode}): {point['artifact_dir']}", file=sys.stderr)
+        else:
+            print(f"  done in {time.time() - started:.1f}s", file=sys.stderr)
+    return statuses
+
+
+def summarize_point(point: Dict[str, Any]) -> Dict[str, Any]:
+    """1点の export から主要な値を集計（export が無ければ値は None）"""
+    from phase_analysis import analyze_phases
+
+    row: Dict[str, Any] = {key: None for key, _ in SUMMARY_COLUMNS}
+    row.update({"isl": point["isl"], "osl": point["osl"], "concurrency": point["concurrency"]})
+    export_files = find_export_files(point["artifact_dir"]) if point["artifact_dir"].is_dir() else []
+    data = load_export_data(export_files) if export_files else []
+    row["records"] = len(data)
+    if not data:
+        return row
+
+    success = [r for r in data if not is_error_record(r)]
+    row["errors"] = count_errors(data)
+    for key, metric in [("ttft", "time_to_first_token"), ("latency", "request_latency"), ("itl", "inter_token_latency")]:
+        values = extract_metric_values(success, metric)
+        if values:
+            stats = calculate_percentiles(values)
+            row[f"{key}_p50"] = stats["p50"]
+            row[f"{key}_p95"] = stats["p95"]
+    tps = extract_tokens_per_sec(success)
+    if tps:
+        row["output_tps"] = sum(tps) / len(tps)
+
+    spans = extract_request_spans(data)
+    if spans:
+        duration_sec = (max(e for _, e in spans) - min(s for s, _ in spans)) / 1e9
+        if duration_sec > 0:
+            row["request_throughput"] = len(spans) / duration_sec
+    phases = analyze_phases(success, point["concurrency"])
+    if phases:
+        row["prefill_share"] = phases["prefill_share"] * 100
+    return row
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def write_matrix_summary(rows: List[Dict[str, Any]], output_dir: Path = Path(".")) -> List[Path]:
+    """matrix_summary.tsv / matrix_summary.md を書き出す（行は ISL, OSL, CON の順に並べる）"""
+    rows = sorted(rows, key=lambda r: (r["isl"], r["osl"], r["concurrency"]))
+    tsv_lines = ["\t".join(key for key, _ in SUMMARY_COLUMNS)]
+    for row in rows:
+        tsv_lines.append("\t".join("N/A" if row[key] is None else _format_value(row[key]) for key, _ in SUMMARY_COLUMNS))
+
+    md_lines = ["# Matrix Summary"]
+    current = None
+    for row in rows:
+        if (row["isl"], row["osl"]) != current:
+            current = (row["isl"], row["osl"])
+            columns = [label for key, label in SUMMARY_COLUMNS if key not in ("isl", "osl")]
+            md_lines.extend([
+                "",
+                f"## ISL {row['isl']} / OSL {row['osl']}",
+                "",
+                "| " + " | ".join(columns) + " |",
+                "|" + "|".join("-" * (len(c) + 2) for c in columns) + "|",
+            ])
+        md_lines.append(
+            "| " + " | ".join(_format_value(row[key]) for key, _ in SUMMARY_COLUMNS if key not in ("isl", "osl")) + " |"
+        )
+
+    tsv_path = output_dir / SUMMARY_TSV_FILE_NAME
+    md_path = output_dir / SUMMARY_MD_FILE_NAME
+    tsv_path.write_text("\n".join(tsv_lines) + "\n", encoding="utf-8")
+    md_path.write_text("\n".join(md_lines) + "\n", encoding="utf-8")
+    return [tsv_path, md_path]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="ISL × OSL × concurrency のマトリクスを spec ファイルから実行")
+    parser.add_argument("spec", help="spec ファイル（.toml / .yaml）")
+    parser.add_argument("--dry-run", action="store_true", help="実行順と実行済みかどうかを表示するだけ")
+    parser.add_argument("--force", action="store_true", help="実行済みの点も再実行する")
+    parser.add_argument("--summary-only", action="store_true", help="実行せずに matrix_summary を作り直す")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_spec(Path(args.spec))
+    except (OSError, ValueError, tomllib.TOMLDecodeError) as e:
+        print(f"Error: Failed to load spec {args.spec}: {e}", file=sys.stderr)
+        sys.exit(1)
+    points = expand_points(spec)
+
+    if args.dry_run:
+        for i, point in enumerate(points, start=1):
+            state = "complete" if is_point_complete(point) else "pending"
+            print(f"{i:3d}. ISL={point['isl']} OSL={point['osl']} CON={point['concurrency']} "
+                  f"REQUEST_COUNT={point['request_count']} [{state}] {point['artifact_dir']}")
+        return
+
+    statuses: Dict[str, str] = {}
+    if not args.summary_only:
+        statuses = run_matrix(spec, points, force=args.force)
+
+    rows = []
+    for point in points:
+        row = summarize_point(point)
+        row["status"] = statuses.get(str(point["artifact_dir"])) or ("complete" if is_point_complete(point) else "missing")
+        rows.append(row)
+    for path in write_matrix_summary(rows):
+        print(f"Matrix summary saved to: {path}", file=sys.stderr)
+
+    failed = [d for d, s in statuses.items() if s == "failed"]
+    if failed:
+        print(f"Error: {len(failed)} point(s) failed; re-run to resume: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+実行ごとのサマリを OpenMetrics テキスト形式（summary.prom）とコンパクトな JSON（summary.json）で出力
+
+summarize_export.py から呼ばれ、ダッシュボードや監視基盤に取り込むための機械可読なサマリを書き出します。
+
+- レイテンシ / tokens/s: 固定境界のヒストグラム（_bucket / _count / _sum）と p50 / p95 / p99。
+  境界を全実行で共通にしているため、実行やホストをまたいで bucket を合算してから分位点を求められる
+- スループット: 実行区間（最初のリクエスト開始〜最後の終了）あたりの成功リクエスト数・出力トークン数
+- リクエスト数・エラー分類ごとの件数（件数0の分類も出力し、系列が途切れないようにする）
+- ラベル: model / isl / osl / con / mode（run_meta.json とディレクトリ名から）
+
+値は実行ごとのスナップショットのため counter ではなく gauge として出力します（node_exporter の
+textfile collector が読む Prometheus テキスト形式としても有効な範囲に留め、# UNIT 行はコメントとして無視される）。
+PROMETHEUS_TEXTFILE_DIR（または --textfile-dir）を指定すると、そのディレクトリにも
+実行条件（ラベル）ごとに固定の名前 aiperf_<mode>_ISL<isl>_OSL<osl>_CON<con>_<model>.prom で、
+一時ファイル経由のリネームで書き出します。同じ条件の実行は同じファイルを上書きするため、
+同じラベルの系列が複数のファイルに重複せず、実行のたびにファイルが増えることもありません
+（どの実行の値かは aiperf_run_start_timestamp_seconds で分かる）。
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from export_records import (
+    ERROR_CATEGORIES,
+    OUTPUT_TOKEN_FIELDS,
+    calculate_percentiles,
+    extract_request_spans,
+    get_record_value,
+)
+
+METRIC_PREFIX = "aiperf"
+PROM_FILE_NAME = "summary.prom"
+JSON_FILE_NAME = "summary.json"
+SUMMARY_FORMAT_VERSION = 1
+
+# ヒストグラムの境界（実行間で合算できるよう固定）
+LATENCY_BUCKETS_SECONDS = [
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 0.75,
+    1.0, 1.5, 2.5, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0,
+]
+TOKENS_PER_SECOND_BUCKETS = [
+    1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000, 2000, 5000, 10000, 20000, 50000,
+]
+
+# summarize_export の metric_results の表示名 → (ラベル metric の値, 単位, ms から秒への変換の有無, 境界)
+HISTOGRAM_METRICS = [
+    ("TTFT", "time_to_first_token", "seconds", True, LATENCY_BUCKETS_SECONDS),
+    ("Request Latency", "request_latency", "seconds", True, LATENCY_BUCKETS_SECONDS),
+    ("Inter-Token Latency", "inter_token_latency", "seconds", True, LATENCY_BUCKETS_SECONDS),
+    ("Output Tokens/sec", "output", "tokens_per_second", False, TOKENS_PER_SECOND_BUCKETS),
+    ("Prefill Tokens/sec", "prefill", "tokens_per_second", False, TOKENS_PER_SECOND_BUCKETS),
+    ("Decode Tokens/sec", "decode", "tokens_per_second", False, TOKENS_PER_SECOND_BUCKETS),
+]
+
+PERCENTILES = ["p50", "p95", "p99"]
+LABEL_KEYS = [("model", "model"), ("isl", "isl"), ("osl", "osl"), ("con", "concurrency"), ("mode", "mode")]
+
+
+def run_labels(entry: Dict[str, Any]) -> Dict[str, str]:
+    """build_history_entry の実行条件から model / isl / osl / con / mode のラベルを作る（不明なら空文字）"""
+    return {label: "" if entry.get(key) is None else str(entry[key]) for label, key in LABEL_KEYS}
+
+
+def textfile_name(labels: Dict[str, str]) -> str:
+    """textfile collector 用のファイル名（ラベルが同じ実行は同じ名前になり、上書きされる）"""
+    parts = [
+        labels.get("mode") or "run",
+        f"ISL{labels['isl']}" if labels.get("isl") else "",
+        f"OSL{labels['osl']}" if labels.get("osl") else "",
+        f"CON{labels['con']}" if labels.get("con") else "",
+        labels.get("model") or "",
+    ]
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", "_".join(p for p in parts if p)).strip("_.")
+    return f"{METRIC_PREFIX}_{slug}.prom"
+
+
+def histogram(values: Sequence[float], edges: Sequence[float]) -> Dict[str, Any]:
+    """境界ごとの累積件数（le 以下の件数。+Inf は count）と合計"""
+    array = np.sort(np.asarray(values, dtype=np.float64))
+    return {
+        "le": list(edges),
+        "counts": np.searchsorted(array, edges, side="right").tolist(),
+        "count": int(array.size),
+        "sum": float(array.sum()),
+    }
+
+
+def compute_throughput(data: List[Dict], success_data: List[Dict]) -> Optional[Dict[str, float]]:
+    """実行区間（全リクエストの最初の開始〜最後の終了）あたりの成功リクエスト数と出力トークン数"""
+    spans = extract_request_spans(data)
+    if not spans:
+        return None
+    duration = (max(end for _, end in spans) - min(start for start, _ in spans)) / 1e9
+    if duration <= 0:
+        return None
+    output_tokens = 0.0
+    for record in success_data:
+        tokens = get_record_value(record, OUTPUT_TOKEN_FIELDS)
+        if isinstance(tokens, (int, float)) and not isinstance(tokens, bool):
+            output_tokens += tokens
+    return {
+        "duration_seconds": duration,
+        "requests_per_second": len(success_data) / duration,
+        "output_tokens_per_second": output_tokens / duration,
+    }
+
+
+def build_run_summary(
+    entry: Dict[str, Any],
+    data: List[Dict],
+    success_data: List[Dict],
+    metric_results: Dict[str, Tuple[List[float], str]],
+    error_summary: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """summary.json の内容（summary.prom もこれから作る）"""
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for display_name, metric, unit, from_ms, edges in HISTOGRAM_METRICS:
+        if display_name not in metric_results:
+            continue
+        values = metric_results[display_name][0]
+        if from_ms:
+            values = [v / 1000.0 for v in values]
+        stats = calculate_percentiles(values)
+        metrics[metric] = dict(histogram(values, edges), unit=unit, **{p: stats[p] for p in PERCENTILES})
+
+    return {
+        "format_version": SUMMARY_FORMAT_VERSION,
+        "labels": run_labels(entry),
+        "artifact_dir": entry.get("artifact_dir"),
+        "run_at": entry.get("run_at"),
+        "requests": {
+            "total": len(data),
+            "success": len(success_data),
+            "errors": len(data) - len(success_data),
+            "errors_by_category": {
+                category: error_summary.get(category, {}).get("count", 0) for category, _ in ERROR_CATEGORIES
+            },
+        },
+        "throughput": compute_throughput(data, success_data),
+        "metrics": metrics,
+    }
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str], **extra: str) -> str:
+    merged = dict(labels, **extra)
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in merged.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _family(lines: List[str], name: str, metric_type: str, help_text: str, unit: Optional[str] = None) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    if unit:
+        lines.append(f"# UNIT {name} {unit}")
+
+
+def format_openmetrics(summary: Dict[str, Any]) -> str:
+    """summary.json の内容を OpenMetrics テキスト形式に変換（# EOF で終わる）"""
+    labels = summary["labels"]
+    lines: List[str] = []
+
+    name = f"{METRIC_PREFIX}_run_info"
+    _family(lines, name, "gauge", "Benchmark run labels (always 1).")
+    lines.append(f"{name}{_labels(labels)} 1")
+
+    if summary.get("run_at") is not None:
+        name = f"{METRIC_PREFIX}_run_start_timestamp_seconds"
+        _family(lines, name, "gauge", "Start time of the benchmark run.", "seconds")
+        lines.append(f"{name}{_labels(labels)} {_number(summary['run_at'])}")
+
+    requests = summary["requests"]
+    name = f"{METRIC_PREFIX}_requests"
+    _family(lines, name, "gauge", "Requests in the run by outcome.")
+    for outcome in ("total", "success", "errors"):
+        lines.append(f"{name}{_labels(labels, outcome=outcome)} {requests[outcome]}")
+
+    name = f"{METRIC_PREFIX}_request_errors"
+    _family(lines, name, "gauge", "Failed requests in the run by error category.")
+    for category, count in requests["errors_by_category"].items():
+        lines.append(f"{name}{_labels(labels, category=category)} {count}")
+
+    throughput = summary.get("throughput")
+    if throughput:
+        for key, unit, help_text in [
+            ("duration_seconds", "seconds", "Run window from the first request start to the last request end."),
+            ("requests_per_second", "requests_per_second", "Successful requests per second over the run window."),
+            ("output_tokens_per_second", "tokens_per_second", "Output tokens per second over the run window."),
+        ]:
+            name = f"{METRIC_PREFIX}_run_{key}"
+            _family(lines, name, "gauge", help_text, unit)
+            lines.append(f"{name}{_labels(labels)} {_number(throughput[key])}")
+
+    for unit in ("seconds", "tokens_per_second"):
+        entries = [(metric, stats) for metric, stats in summary["metrics"].items() if stats["unit"] == unit]
+        if not entries:
+            continue
+        kind = "latency" if unit == "seconds" else "throughput"
+        name = f"{METRIC_PREFIX}_{kind}_percentile_{unit}"
+        _family(lines, name, "gauge", f"Per-request {kind} percentiles (successful requests).", unit)
+        for metric, stats in entries:
+            for p in PERCENTILES:
+                lines.append(f"{name}{_labels(labels, metric=metric, percentile=p)} {_number(stats[p])}")
+
+    for metric, stats in summary["metrics"].items():
+        name = f"{METRIC_PREFIX}_{metric}_{stats['unit']}"
+        _family(lines, name, "histogram", f"Per-request {metric.replace('_', ' ')} of successful requests.",
+                stats["unit"])
+        for le, count in zip(stats["le"], stats["counts"]):
+            lines.append(f"{name}_bucket{_labels(labels, le=repr(float(le)))} {count}")
+        lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {stats['count']}")
+        lines.append(f"{name}_count{_labels(labels)} {stats['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(stats['sum'])}")
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: Path, content: str) -> Path:
+    """一時ファイルに書いてからリネーム（textfile collector が書きかけのファイルを読まないように）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_metrics_exports(
+    summary: Dict[str, Any],
+    output_format: str = "all",
+    output_dir: Path = Path("."),
+    textfile_dir: Optional[str] = None,
+) -> List[Path]:
+    """summary.prom / summary.json を書き出し、textfile_dir があればそこにも実行条件ごとの .prom を置く"""
+    written = []
+    if output_format in ("all", "openmetrics"):
+        content = format_openmetrics(summary)
+        written.append(_write_atomic(output_dir / PROM_FILE_NAME, content))
+        if textfile_dir:
+            written.append(_write_atomic(Path(textfile_dir) / textfile_name(summary["labels"]), content))
+    if output_format in ("all", "json"):
+        content = json.dumps(summary, ensure_ascii=False, separators=(",", ":")) + "\n"
+        written.append(_write_atomic(output_dir / JSON_FILE_NAME, content))
+    return written
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+prefill / decode の分解と入出力トークン長ごとの分析
+
+summarize_export.py から呼ばれ、成功したリクエストごとに
+- prefill スループット: input tokens / TTFT
+- decode スループット: (output tokens - 1) / (request latency - TTFT)
+を算出します。入力 / 出力トークン長のバケットごとのパーセンタイルと、
+TTFT を入力トークン数に対して最小二乗法で当てはめた直線（固定分 + トークンあたりの時間）から、
+その並行度でサーバが prefill 律速か decode 律速かを判定します。
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from export_records import INPUT_TOKEN_FIELDS, OUTPUT_TOKEN_FIELDS, extract_metric_value, get_record_value
+
+# トークン長のバケット境界（下限を含む）。実行間で比較できるよう固定にする
+TOKEN_BUCKET_EDGES = [128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768]
+
+# TTFT が request latency に占める割合がこれ以上なら prefill 律速とみなす
+PREFILL_BOUND_SHARE = 0.5
+
+# 回帰に必要な入力トークン数の種類数（ISL が一定だと傾きが求まらない）
+MIN_FIT_DISTINCT_ISL = 3
+
+
+def _single_metric(record: Dict, metric_name: str) -> float:
+    """1レコードのlatency系メトリクス（ms、無ければ NaN）"""
+    value = extract_metric_value(record, metric_name)
+    return np.nan if value is None else value
+
+
+def _token_count(record: Dict, fields: List[str]) -> float:
+    value = get_record_value(record, fields)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def extract_phase_arrays(data: List[Dict]) -> Dict[str, np.ndarray]:
+    """レコードを列（input/output tokens, TTFT, latency、欠損は NaN）に変換し、スループットを一括で計算"""
+    isl = np.array([_token_count(r, INPUT_TOKEN_FIELDS) for r in data], dtype=np.float64)
+    osl = np.array([_token_count(r, OUTPUT_TOKEN_FIELDS) for r in data], dtype=np.float64)
+    ttft = np.array([_single_metric(r, "time_to_first_token") for r in data], dtype=np.float64)
+    latency = np.array([_single_metric(r, "request_latency") for r in data], dtype=np.float64)
+
+    decode_ms = latency - ttft
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prefill_tps = np.where((isl > 0) & (ttft > 0), isl / (ttft / 1000.0), np.nan)
+        decode_tps = np.where((osl > 1) & (decode_ms > 0), (osl - 1) / (decode_ms / 1000.0), np.nan)
+    return {
+        "isl": isl,
+        "osl": osl,
+        "ttft": ttft,
+        "latency": latency,
+        "prefill_tps": prefill_tps,
+        "decode_tps": decode_tps,
+    }
+
+
+def percentile_stats(values: np.ndarray) -> Optional[Dict[str, float]]:
+    """NaN を除いた p50/p95/p99/平均（calculate_percentiles と同じ線形補間）"""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "avg": float(values.mean()), "count": int(values.size)}
+
+
+def bucket_label(index: int) -> str:
+    """TOKEN_BUCKET_EDGES の index 番目のバケットの表示名"""
+    if index == 0:
+        return f"<{TOKEN_BUCKET_EDGES[0]}"
+    if index >= len(TOKEN_BUCKET_EDGES):
+        return f">={TOKEN_BUCKET_EDGES[-1]}"
+    return f"{TOKEN_BUCKET_EDGES[index - 1]}-{TOKEN_BUCKET_EDGES[index] - 1}"
+
+
+def bucket_stats(tokens: np.ndarray, arrays: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """トークン長のバケットごとの TTFT / latency / スループットのパーセンタイル（空のバケットは除く）"""
+    valid = ~np.isnan(tokens)
+    indices = np.digitize(tokens[valid], TOKEN_BUCKET_EDGES)
+    buckets = []
+    for index in np.unique(indices):
+        mask = indices == index
+        row: Dict[str, Any] = {"bucket": bucket_label(int(index)), "count": int(mask.sum())}
+        for key in ("ttft", "latency", "prefill_tps", "decode_tps"):
+            row[key] = percentile_stats(arrays[key][valid][mask])
+        buckets.append(row)
+    return buckets
+
+
+def fit_ttft_vs_isl(isl: np.ndarray, ttft: np.ndarray) -> Optional[Dict[str, float]]:
+    """TTFT（ms）= 切片 + 傾き × input tokens を最小二乗法で当てはめる
+
+    切片はキュー待ち・ネットワーク・最初のトークンの生成など入力長に依らない時間、
+    傾きは入力1トークンあたりの prefill 時間（1000 / 傾き が限界 prefill スループット）。
+    """
+    mask = (isl > 0) & ~np.isnan(ttft)
+    x, y = isl[mask], ttft[mask]
+    if np.unique(x).size < MIN_FIT_DISTINCT_ISL:
+        return None
+
+    design = np.column_stack([np.ones_like(x), x])
+    (intercept, slope), *_ = np.linalg.lstsq(design, y, rcond=None)
+    residual = y - (intercept + slope * x)
+    total = np.sum((y - y.mean()) ** 2)
+    return {
+        "intercept_ms": float(intercept),
+        "slope_ms_per_token": float(slope),
+        "prefill_tokens_per_sec": float(1000.0 / slope) if slope > 0 else None,
+        "r_squared": float(1 - np.sum(residual ** 2) / total) if total > 0 else None,
+        "count": int(x.size),
+    }
+
+
+def analyze_phases(data: List[Dict], concurrency: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """prefill / decode の分解（data は成功したリクエストのみを渡す）"""
+    if not data:
+        return None
+    arrays = extract_phase_arrays(data)
+    both = ~np.isnan(arrays["ttft"]) & ~np.isnan(arrays["latency"]) & (arrays["latency"] > 0)
+    if not both.any():
+        return None
+
+    # 全リクエストの合計時間のうち TTFT（prefill + キュー待ち）が占める割合
+    prefill_share = float(arrays["ttft"][both].sum() / arrays["latency"][both].sum())
+    return {
+        "concurrency": concurrency,
+        "request_count": int(both.sum()),
+        "prefill_share": prefill_share,
+        "verdict": "prefill-bound" if prefill_share >= PREFILL_BOUND_SHARE else "decode-bound",
+        "prefill_tps": percentile_stats(arrays["prefill_tps"]),
+        "decode_tps": percentile_stats(arrays["decode_tps"]),
+        "ttft_fit": fit_ttft_vs_isl(arrays["isl"], arrays["ttft"]),
+        "by_input_length": bucket_stats(arrays["isl"], arrays),
+        "by_output_length": bucket_stats(arrays["osl"], arrays),
+        "prefill_tps_values": arrays["prefill_tps"][~np.isnan(arrays["prefill_tps"])].tolist(),
+        "decode_tps_values": arrays["decode_tps"][~np.isnan(arrays["decode_tps"])].tolist(),
+    }
+
+
+def _cell(stats: Optional[Dict[str, float]], key: str, digits: int = 2) -> str:
+    return f"{stats[key]:.{digits}f}" if stats else "-"
+
+
+def format_phase_markdown(analysis: Dict[str, Any]) -> List[str]:
+    """summary.md 用の prefill / decode セクション"""
+    at = f"（CON={analysis['concurrency']}）" if analysis["concurrency"] else ""
+    lines = [
+        "",
+        "## Prefill / Decode",
+        "",
+        f"**Prefill Share of Latency:** {analysis['prefill_share'] * 100:.1f}% → **{analysis['verdict']}**{at}",
+        "",
+        "TTFT（prefill + キュー待ち）の合計が request latency の合計に占める割合です。"
+        f"{PREFILL_BOUND_SHARE * 100:.0f}%以上なら prefill 律速、未満なら decode 律速と判定しています。",
+        "",
+        "| Metric | p50 | p95 | p99 | Avg | Unit | Count |",
+        "|--------|-----|-----|-----|-----|------|-------|",
+    ]
+    for label, key in [("Prefill Tokens/sec (ISL / TTFT)", "prefill_tps"),
+                       ("Decode Tokens/sec ((OSL - 1) / (Latency - TTFT))", "decode_tps")]:
+        stats = analysis[key]
+        if stats:
+            lines.append(
+                f"| {label} | {stats['p50']:.2f} | {stats['p95']:.2f} | {stats['p99']:.2f} | "
+                f"{stats['avg']:.2f} | tokens/s | {stats['count']} |"
+            )
+
+    fit = analysis["ttft_fit"]
+    lines.append("")
+    if fit:
+        r_squared = f"{fit['r_squared']:.3f}" if fit["r_squared"] is not None else "N/A"
+        lines.append(
+            f"**TTFT vs ISL:** TTFT ≈ {fit['intercept_ms']:.2f} ms + {fit['slope_ms_per_token'] * 1000:.2f} ms / 1k tokens"
+            f" × ISL（R² = {r_squared}, n = {fit['count']}）"
+        )
+        if fit["prefill_tokens_per_sec"]:
+            lines.append(f"（限界 prefill スループット ≈ {fit['prefill_tokens_per_sec']:.0f} tokens/s）")
+    else:
+        lines.append(
+            f"**TTFT vs ISL:** 入力トークン数が{MIN_FIT_DISTINCT_ISL}種類未満のため回帰なし"
+            "（INPUT_TOKENS_STDDEV を大きくすると入力長ごとの傾きを測れます）"
+        )
+
+    if analysis["by_input_length"]:
+        lines.extend([
+            "",
+            "### By Input Length (ISL)",
+            "",
+            "| ISL | Count | TTFT p50 | TTFT p95 | TTFT p99 | Prefill tok/s p50 | Latency p50 | Latency p95 |",
+            "|-----|-------|----------|----------|----------|-------------------|-------------|-------------|",
+        ])
+        for row in analysis["by_input_length"]:
+            lines.append(
+                f"| {row['bucket']} | {row['count']} | {_cell(row['ttft'], 'p50')} | {_cell(row['ttft'], 'p95')} | "
+                f"{_cell(row['ttft'], 'p99')} | {_cell(row['prefill_tps'], 'p50')} | "
+                f"{_cell(row['latency'], 'p50')} | {_cell(row['latency'], 'p95')} |"
+            )
+
+    if analysis["by_output_length"]:
+        lines.extend([
+            "",
+            "### By Output Length (OSL)",
+            "",
+            "| OSL | Count | Latency p50 | Latency p95 | Latency p99 | Decode tok/s p50 | Decode tok/s p95 |",
+            "|-----|-------|-------------|-------------|-------------|------------------|------------------|",
+        ])
+        for row in analysis["by_output_length"]:
+            lines.append(
+                f"| {row['bucket']} | {row['count']} | {_cell(row['latency'], 'p50')} | "
+                f"{_cell(row['latency'], 'p95')} | {_cell(row['latency'], 'p99')} | "
+                f"{_cell(row['decode_tps'], 'p50')} | {_cell(row['decode_tps'], 'p95')} |"
+            )
+    return lines
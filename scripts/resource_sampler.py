@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク実行中のクライアント側リソース使用量のサンプリング
+
+run_aiperf_profile.sh からバックグラウンドで起動され、指定したプロセス（実行スクリプト自身）
+以下のプロセスツリー（AIPerf の各サービス・worker）について、一定間隔で /proc から
+
+- CPU使用率（%、1コア = 100%）・RSS・コンテキストスイッチ数/秒
+- 開いているファイルディスクリプタ数・TCP接続数（ESTABLISHED とそれ以外）
+- ホスト全体: 空きメモリ・スワップ使用量・TIME_WAIT のTCP接続数・ロードアベレージ
+
+を読み取り、artifactディレクトリの client_resources.jsonl に1行1サンプルで書き出します
+（先頭行は {"host": {...}} で、実行したホストのCPUコア数などを記録）。
+summarize_export.py はこのファイルから平均とピークを summary.md に出力します。
+/proc が無い環境（macOS など）では何もせずに終了します。
+
+使用例:
+    python scripts/resource_sampler.py --pid <PID> --output artifacts/.../client_resources.jsonl
+
+    # 同じプロセスツリーにいる他のサンプラー（server_metrics.py など）を除外
+    python scripts/resource_sampler.py --pid <PID> --exclude-pid <PID2> --output ...
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+RESOURCE_FILE_NAME = "client_resources.jsonl"
+DEFAULT_INTERVAL_SEC = 1.0
+PROC_ROOT = Path("/proc")
+
+# /proc/net/tcp の st 列
+TCP_STATE_ESTABLISHED = "01"
+TCP_STATE_TIME_WAIT = "06"
+
+# summary.md に出す項目（キー, 表示名, 単位）
+RESOURCE_METRICS = [
+    ("cpu_percent", "CPU", "%"),
+    ("max_process_cpu_percent", "CPU (busiest process)", "%"),
+    ("rss_mb", "RSS", "MB"),
+    ("ctx_switches_voluntary_per_sec", "Voluntary Context Switches", "/s"),
+    ("ctx_switches_involuntary_per_sec", "Involuntary Context Switches", "/s"),
+    ("open_fds", "Open File Descriptors", "count"),
+    ("tcp_connections", "TCP Connections", "count"),
+    ("tcp_established", "TCP Established", "count"),
+    ("system_tcp_time_wait", "TCP TIME_WAIT (host)", "count"),
+    ("swap_used_mb", "Swap Used (host)", "MB"),
+    ("mem_available_mb", "Memory Available (host)", "MB"),
+    ("processes", "Processes", "count"),
+]
+
+# クライアントのCPU飽和とみなす平均使用率。ツリー全体はホストの全コアに対する割合、
+# 最も忙しいプロセスは1コア（100%）に対する割合で判定する（AIPerf の worker は1プロセスで1コアが上限）
+CPU_BOUND_RATIO = 0.9
+# 実行中のスワップ使用量の増加がこれ以上なら警告（MB）
+SWAP_GROWTH_WARNING_MB = 1.0
+
+
+def read_stat(pid: int, proc_root: Path = PROC_ROOT) -> Optional[Tuple[int, int]]:
+    """/proc/<pid>/stat から (親PID, utime + stime のtick数) を読む（プロセスが無ければ None）"""
+    try:
+        text = (proc_root / str(pid) / "stat").read_text()
+    except OSError:
+        return None
+    # comm（2列目）は括弧で囲まれ空白を含み得るため、最後の ')' 以降を分割する
+    fields = text[text.rfind(")") + 2:].split()
+    # fields[0] = state（3列目）, fields[1] = ppid, fields[11] = utime（14列目）, fields[12] = stime
+    return int(fields[1]), int(fields[11]) + int(fields[12])
+
+
+def list_process_tree(root_pid: int, proc_root: Path = PROC_ROOT, exclude: Optional[Set[int]] = None) -> Set[int]:
+    """root_pid とその子孫のPID（exclude のプロセスとその子孫は含めない）"""
+    exclude = exclude or set()
+    children: Dict[int, List[int]] = {}
+    for entry in proc_root.iterdir():
+        if not entry.name.isdigit():
+            continue
+        stat = read_stat(int(entry.name), proc_root)
+        if stat is not None:
+            children.setdefault(stat[0], []).append(int(entry.name))
+
+    tree = {root_pid}
+    stack = [root_pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if child not in tree and child not in exclude:
+                tree.add(child)
+                stack.append(child)
+    return tree
+
+
+def read_status(pid: int, proc_root: Path = PROC_ROOT) -> Dict[str, int]:
+    """/proc/<pid>/status から RSS（kB）とコンテキストスイッチ数を読む"""
+    result = {"rss_kb": 0, "voluntary": 0, "involuntary": 0}
+    keys = {"VmRSS": "rss_kb", "voluntary_ctxt_switches": "voluntary", "nonvoluntary_ctxt_switches": "involuntary"}
+    try:
+        lines = (proc_root / str(pid) / "status").read_text().splitlines()
+    except OSError:
+        return result
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name in keys:
+            result[keys[name]] = int(value.split()[0])
+    return result
+
+
+def read_socket_inodes(pid: int, proc_root: Path = PROC_ROOT) -> Tuple[int, Set[str]]:
+    """開いているfd数と、そのうちソケットの inode 一覧"""
+    fd_dir = proc_root / str(pid) / "fd"
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:
+        return 0, set()
+    inodes = set()
+    for fd in fds:
+        try:
+            target = os.readlink(fd_dir / fd)
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(target[len("socket:["):-1])
+    return len(fds), inodes
+
+
+def read_tcp_table(proc_root: Path = PROC_ROOT) -> Tuple[Dict[str, str], int]:
+    """/proc/net/tcp, tcp6 から (inode → 状態, ホスト全体の TIME_WAIT 数) を読む
+
+    TIME_WAIT の接続はプロセスから切り離されている（inode が 0）ため、ホスト全体で数える。
+    """
+    table: Dict[str, str] = {}
+    time_wait = 0
+    for name in ("tcp", "tcp6"):
+        try:
+            lines = (proc_root / "net" / name).read_text().splitlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10:
+                continue
+            state, inode = fields[3], fields[9]
+            if state == TCP_STATE_TIME_WAIT:
+                time_wait += 1
+            elif inode != "0":
+                table[inode] = state
+    return table, time_wait
+
+
+def read_meminfo(proc_root: Path = PROC_ROOT) -> Dict[str, int]:
+    """/proc/meminfo（kB）"""
+    result: Dict[str, int] = {}
+    try:
+        lines = (proc_root / "meminfo").read_text().splitlines()
+    except OSError:
+        return result
+    for line in lines:
+        name, _, value = line.partition(":")
+        parts = value.split()
+        if parts:
+            result[name] = int(parts[0])
+    return result
+
+
+def read_loadavg(proc_root: Path = PROC_ROOT) -> Optional[float]:
+    try:
+        return float((proc_root / "loadavg").read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ResourceSampler:
+    """プロセスツリーの累積値を保持し、前回サンプルとの差分から率を計算する"""
+
+    def __init__(self, root_pid: int, proc_root: Path = PROC_ROOT, exclude: Optional[Set[int]] = None):
+        self.root_pid = root_pid
+        self.proc_root = proc_root
+        self.exclude = exclude or set()
+        self.clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._previous: Optional[Dict[int, Tuple[int, int, int]]] = None
+        self._previous_time: Optional[float] = None
+
+    def sample(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        pids = list_process_tree(self.root_pid, self.proc_root, self.exclude)
+        tcp_table, time_wait = read_tcp_table(self.proc_root)
+
+        counters: Dict[int, Tuple[int, int, int]] = {}
+        rss_kb = 0
+        open_fds = 0
+        socket_inodes: Set[str] = set()
+        for pid in pids:
+            stat = read_stat(pid, self.proc_root)
+            if stat is None:
+                continue
+            status = read_status(pid, self.proc_root)
+            fd_count, inodes = read_socket_inodes(pid, self.proc_root)
+            counters[pid] = (stat[1], status["voluntary"], status["involuntary"])
+            rss_kb += status["rss_kb"]
+            open_fds += fd_count
+            socket_inodes |= inodes
+
+        tcp_states = [tcp_table[inode] for inode in socket_inodes if inode in tcp_table]
+        meminfo = read_meminfo(self.proc_root)
+        swap_used_kb = meminfo.get("SwapTotal", 0) - meminfo.get("SwapFree", 0)
+
+        record: Dict[str, Any] = {
+            "timestamp": round(now, 3),
+            "processes": len(counters),
+            "cpu_percent": None,
+            "max_process_cpu_percent": None,
+            "rss_mb": round(rss_kb / 1024, 2),
+            "ctx_switches_voluntary_per_sec": None,
+            "ctx_switches_involuntary_per_sec": None,
+            "open_fds": open_fds,
+            "tcp_connections": len(tcp_states),
+            "tcp_established": sum(1 for s in tcp_states if s == TCP_STATE_ESTABLISHED),
+            "system_tcp_time_wait": time_wait,
+            "mem_available_mb": round(meminfo["MemAvailable"] / 1024, 2) if "MemAvailable" in meminfo else None,
+            "swap_used_mb": round(swap_used_kb / 1024, 2),
+            "load_1m": read_loadavg(self.proc_root),
+        }
+
+        if self._previous is not None and now > self._previous_time:
+            elapsed = now - self._previous_time
+            # 前回も存在したプロセスは差分、新しく現れたプロセスは累積値全体を今回の区間に計上する
+            deltas = [0, 0, 0]
+            max_process_ticks = 0
+            for pid, values in counters.items():
+                previous = self._previous.get(pid, (0, 0, 0))
+                for i in range(3):
+                    deltas[i] += max(0, values[i] - previous[i])
+                max_process_ticks = max(max_process_ticks, values[0] - previous[0])
+            record["cpu_percent"] = round(deltas[0] / self.clock_ticks / elapsed * 100, 2)
+            record["max_process_cpu_percent"] = round(max_process_ticks / self.clock_ticks / elapsed * 100, 2)
+            record["ctx_switches_voluntary_per_sec"] = round(deltas[1] / elapsed, 2)
+            record["ctx_switches_involuntary_per_sec"] = round(deltas[2] / elapsed, 2)
+
+        self._previous = counters
+        self._previous_time = now
+        return record
+
+
+def summarize_resource_samples(samples: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """各項目の平均・ピーク・最小値（値が無い項目は含めない）"""
+    result: Dict[str, Dict[str, float]] = {}
+    for key, _, _ in RESOURCE_METRICS:
+        values = [s[key] for s in samples if isinstance(s.get(key), (int, float))]
+        if values:
+            result[key] = {
+                "mean": sum(values) / len(values),
+                "peak": max(values),
+                "min": min(values),
+                "count": len(values),
+            }
+    return result
+
+
+def host_info() -> Dict[str, Any]:
+    """client_resources.jsonl の先頭行に記録するホストの情報"""
+    return {"hostname": socket.gethostname(), "cpu_count": os.cpu_count()}
+
+
+def load_resource_host(artifact_dir: Path) -> Dict[str, Any]:
+    """client_resources.jsonl の先頭行のホスト情報（無い・古い形式なら空）"""
+    path = artifact_dir / RESOURCE_FILE_NAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            first = json.loads(f.readline())
+        except json.JSONDecodeError:
+            return {}
+    host = first.get("host") if isinstance(first, dict) else None
+    return host if isinstance(host, dict) else {}
+
+
+def load_resource_samples(artifact_dir: Path) -> List[Dict[str, Any]]:
+    """artifactディレクトリの client_resources.jsonl のサンプルを読み込む（無ければ空。ホスト情報の行は除く）"""
+    path = artifact_dir / RESOURCE_FILE_NAME
+    samples: List[Dict[str, Any]] = []
+    if not path.exists():
+        return samples
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sample = json.loads(line)
+            except json.JSONDecodeError:
+                # 実行スクリプトの終了時に書きかけの行が残ることがある
+                continue
+            if "host" not in sample:
+                samples.append(sample)
+    return samples
+
+
+def format_resource_markdown(
+    summary: Dict[str, Dict[str, float]], sample_count: int, cpu_count: Optional[int] = None
+) -> List[str]:
+    """summary.md 用のクライアントリソースセクション
+
+    cpu_count はサンプルを取ったホストのコア数（client_resources.jsonl の先頭行）。
+    記録が無い古いファイルでは、集計しているマシンのコア数で代用する。
+    """
+    lines = [
+        "",
+        "## Client Resources",
+        "",
+        f"AIPerf のプロセスツリー（{sample_count} samples）。host の行はホスト全体の値です。",
+        "",
+        "| Metric | Mean | Peak | Unit |",
+        "|--------|------|------|------|",
+    ]
+    for key, label, unit in RESOURCE_METRICS:
+        if key in summary:
+            lines.append(f"| {label} | {summary[key]['mean']:.2f} | {summary[key]['peak']:.2f} | {unit} |")
+
+    cpu_count = cpu_count or os.cpu_count() or 1
+    cpu = summary.get("cpu_percent")
+    busiest = summary.get("max_process_cpu_percent")
+    if cpu and cpu["mean"] >= CPU_BOUND_RATIO * 100 * cpu_count:
+        lines.extend([
+            "",
+            f"⚠️ クライアントのCPU使用率が平均 {cpu['mean']:.0f}%（{cpu_count}コア）に達しています。"
+            "測定値はクライアント側の飽和の影響を受けている可能性があります。",
+        ])
+    elif busiest and busiest["mean"] >= CPU_BOUND_RATIO * 100:
+        lines.extend([
+            "",
+            f"⚠️ 最も忙しいプロセスのCPU使用率が平均 {busiest['mean']:.0f}%（1コアの上限付近）です。"
+            "ホスト全体に余裕があっても、AIPerf の worker が1コアで飽和している可能性があります。",
+        ])
+    swap = summary.get("swap_used_mb")
+    if swap and swap["peak"] - swap["min"] >= SWAP_GROWTH_WARNING_MB:
+        lines.extend([
+            "",
+            f"⚠️ 実行中にホストのスワップ使用量が {swap['peak'] - swap['min']:.0f}MB 増加しています。",
+        ])
+    return lines
+
+
+def run_sampler(
+    root_pid: int,
+    output: Path,
+    interval_sec: float = DEFAULT_INTERVAL_SEC,
+    exclude: Optional[Set[int]] = None,
+) -> int:
+    """root_pid が終了するか SIGTERM / SIGINT を受けるまでサンプルを書き続ける（戻り値: サンプル数）
+
+    自分自身と exclude のプロセス（同時に動かしている他のサンプラーなど）はツリーから除く。
+    """
+    stop = {"requested": False}
+
+    def handle_signal(signum, frame):
+        stop["requested"] = True
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    sampler = ResourceSampler(root_pid, exclude={os.getpid()} | set(exclude or ()))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    next_sample = time.monotonic()
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"host": host_info()}) + "\n")
+        while not stop["requested"] and (PROC_ROOT / str(root_pid)).exists():
+            f.write(json.dumps(sampler.sample()) + "\n")
+            f.flush()
+            count += 1
+            next_sample += interval_sec
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="プロセスツリーのCPU / RSS / fd / TCP接続数を /proc から定期的に記録")
+    parser.add_argument("--pid", type=int, required=True, help="対象のプロセス（その子孫も含む）")
+    parser.add_argument("--output", default=RESOURCE_FILE_NAME, help=f"出力先（デフォルト: {RESOURCE_FILE_NAME}）")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_SEC,
+                        help=f"サンプリング間隔（秒、デフォルト: {DEFAULT_INTERVAL_SEC}）")
+    parser.add_argument("--exclude-pid", type=int, action="append", default=[],
+                        help="除外するプロセス（その子孫も除外。複数指定可）")
+    args = parser.parse_args(argv)
+
+    if not PROC_ROOT.is_dir():
+        print("Warning: /proc is not available; client resource sampling is disabled", file=sys.stderr)
+        return
+    run_sampler(args.pid, Path(args.output), args.interval, set(args.exclude_pid))
+
+
+if __name__ == "__main__":
+    main()
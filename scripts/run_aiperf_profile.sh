@@ -5,10 +5,29 @@ set -euo pipefail
 # 環境変数から設定を読み込んで aiperf profile を実行
 
 # .envファイルの読み込み
+# 呼び出し側で明示的に渡された実行条件（例: CONCURRENCY=5 bash scripts/run_aiperf_profile.sh）は
+# .env の値より優先する。対象は OVERRIDE_VARS と、呼び出し側が ENV_OVERRIDES（空白区切り）に
+# 列挙した変数だけ（シェルのプロファイルで export 済みの API_KEY や MODEL などは .env が優先）
+OVERRIDE_VARS="CONCURRENCY REQUEST_COUNT ARTIFACT_DIR INPUT_TOKENS_MEAN OUTPUT_TOKENS_MEAN ${ENV_OVERRIDES:-}"
+OVERRIDE_NAMES=()
+OVERRIDE_VALUES=()
+for name in ${OVERRIDE_VARS}; do
+    if [[ ! "${name}" =~ ^[A-Za-z_][A-Za-z0-9_]*$ ]]; then
+        echo "Error: invalid variable name in ENV_OVERRIDES: ${name}" >&2
+        exit 1
+    fi
+    if [ -n "${!name+x}" ]; then
+        OVERRIDE_NAMES+=("${name}")
+        OVERRIDE_VALUES+=("${!name}")
+    fi
+done
 if [ -f .env ]; then
     set -a
     source .env
     set +a
+    for i in "${!OVERRIDE_NAMES[@]}"; do
+        export "${OVERRIDE_NAMES[$i]}=${OVERRIDE_VALUES[$i]}"
+    done
 else
     echo "Error: .env file not found. Copy .env.example to .env and configure it." >&2
     exit 1
@@ -43,8 +62,10 @@ CUSTOM_DATASET_TYPE=${CUSTOM_DATASET_TYPE:-single_turn}
 # 実行モード（引数から取得、デフォルトはprofile）
 MODE=${1:-profile}
 
-# Artifactディレクトリの決定
-if [ "$MODE" = "warmup" ]; then
+# Artifactディレクトリの決定（ARTIFACT_DIR が指定されていればそれを使う。distributed_run.py のシャードなど）
+if [ -n "${ARTIFACT_DIR:-}" ]; then
+    :
+elif [ "$MODE" = "warmup" ]; then
     ARTIFACT_DIR="artifacts/warmup_ISL${INPUT_TOKENS_MEAN}_OSL${OUTPUT_TOKENS_MEAN}_CON${CONCURRENCY}"
 elif [ "$MODE" = "profile" ]; then
     ARTIFACT_DIR="artifacts/ISL${INPUT_TOKENS_MEAN}_OSL${OUTPUT_TOKENS_MEAN}_CON${CONCURRENCY}"
@@ -87,6 +108,17 @@ fi
 
 # INPUT_FILEが指定されている場合はファイル入力モード
 if [ -n "${INPUT_FILE:-}" ] && [ -f "${INPUT_FILE}" ]; then
+    # INPUT_SAMPLE_COUNT が指定されていれば、入力トークン長の分布を保った部分集合に絞ってから渡す
+    # （同じ元ファイル・条件の抽出結果があれば再利用）
+    if [ -n "${INPUT_SAMPLE_COUNT:-}" ]; then
+        SAMPLE_FILE="${INPUT_FILE%.jsonl}.sample${INPUT_SAMPLE_COUNT}.jsonl"
+        if ${PYTHON_BIN} scripts/sample_trace.py "${INPUT_FILE}" --count "${INPUT_SAMPLE_COUNT}" \
+            --output "${SAMPLE_FILE}" --seed "${INPUT_SAMPLE_SEED:-42}" --reuse; then
+            INPUT_FILE="${SAMPLE_FILE}"
+        else
+            echo "Warning: Sampling ${INPUT_FILE} failed; using the full input file" >&2
+        fi
+    fi
     echo "Using input file: ${INPUT_FILE}"
     CMD="${CMD} --input-file ${INPUT_FILE} --custom-dataset-type ${CUSTOM_DATASET_TYPE}"
 else
@@ -128,6 +160,24 @@ elif [ -z "${AIPERF_URL:-}" ] || [ "${AIPERF_URL}" = "https://api.openai.com/v1"
     CMD="${CMD} --tokenizer gpt2"
 fi
 
+# リクエストレート（任意）
+# ADAPTIVE_PACING=1 の場合は、429 / レート制限ヘッダを見ながら AIMD で探した持続可能なレートを使う
+# （結果は ${ARTIFACT_DIR}/pacing.json に保存）
+if [ "${ADAPTIVE_PACING:-0}" = "1" ]; then
+    echo "Probing sustainable request rate (ADAPTIVE_PACING=1)..."
+    # プローブは本番と同じ ISL / OSL で送る（トークン数の制限も検出するため）
+    if PACED_RATE=$(AIPERF_URL="${AIPERF_URL}" ${PYTHON_BIN} scripts/adaptive_pacing.py \
+        --output "${ARTIFACT_DIR}/pacing.json" \
+        --input-tokens "${INPUT_TOKENS_MEAN}" --output-tokens "${OUTPUT_TOKENS_MEAN}"); then
+        REQUEST_RATE="${PACED_RATE}"
+    else
+        echo "Warning: Adaptive pacing probe failed; running without --request-rate" >&2
+    fi
+fi
+if [ -n "${REQUEST_RATE:-}" ]; then
+    CMD="${CMD} --request-rate ${REQUEST_RATE}"
+fi
+
 echo "=========================================="
 echo "Running AIPerf Profile"
 echo "Mode: ${MODE}"
@@ -135,6 +185,7 @@ echo "URL: ${AIPERF_URL}"
 echo "Model: ${MODEL}"
 echo "Concurrency: ${CONCURRENCY}"
 echo "Request Count: ${REQUEST_COUNT}"
+echo "Request Rate: ${REQUEST_RATE:-unlimited}"
 echo "Artifact Dir: ${ARTIFACT_DIR}"
 if [ -n "${AIPERF_PROFILE_API_KEY:-}" ]; then
     echo "API Key: Using AIPERF_PROFILE_API_KEY environment variable"
@@ -145,8 +196,58 @@ echo "=========================================="
 echo "Command: ${CMD}"
 echo "=========================================="
 
+# 実行条件を記録（summarize_export.py / run_history.py が実行履歴のインデックスに使う）
+AIPERF_URL="${AIPERF_URL}" CONCURRENCY="${CONCURRENCY}" REQUEST_COUNT="${REQUEST_COUNT}" \
+    INPUT_TOKENS_MEAN="${INPUT_TOKENS_MEAN}" INPUT_TOKENS_STDDEV="${INPUT_TOKENS_STDDEV}" \
+    OUTPUT_TOKENS_MEAN="${OUTPUT_TOKENS_MEAN}" REQUEST_RATE="${REQUEST_RATE:-}" \
+    ${PYTHON_BIN} scripts/run_meta.py "${ARTIFACT_DIR}" "${MODE}" \
+    || echo "Warning: Failed to write run metadata" >&2
+
+# 実行中にバックグラウンドで動かすサンプラー（AIPerfが失敗して途中で終了した場合も止める）
+BACKGROUND_PIDS=""
+stop_background() {
+    for pid in ${BACKGROUND_PIDS}; do
+        kill "${pid}" 2>/dev/null || true
+        wait "${pid}" 2>/dev/null || true
+    done
+    BACKGROUND_PIDS=""
+}
+trap stop_background EXIT
+mkdir -p "${ARTIFACT_DIR}"
+
+# 推論サーバの Prometheus メトリクス（SERVER_METRICS_URL 指定時のみ）
+if [ -n "${SERVER_METRICS_URL:-}" ]; then
+    echo "Scraping server metrics: ${SERVER_METRICS_URL}"
+    ${PYTHON_BIN} scripts/server_metrics.py --url "${SERVER_METRICS_URL}" --pid $$ \
+        --output "${ARTIFACT_DIR}/server_metrics.jsonl" \
+        --interval "${SERVER_METRICS_INTERVAL:-1}" &
+    BACKGROUND_PIDS="${BACKGROUND_PIDS} $!"
+fi
+
+# クライアント側リソース（AIPerfのプロセスツリーのCPU / RSS / fd / TCP接続数）のサンプリング
+# /proc がある環境（Linux）のみ。RESOURCE_SAMPLING=0 で無効化
+# 先に起動したバックグラウンドのプロセス（server_metrics.py）はクライアントの負荷に含めない
+if [ "${RESOURCE_SAMPLING:-1}" = "1" ] && [ -d /proc ]; then
+    EXCLUDE_PID_ARGS=""
+    for pid in ${BACKGROUND_PIDS}; do
+        EXCLUDE_PID_ARGS="${EXCLUDE_PID_ARGS} --exclude-pid ${pid}"
+    done
+    ${PYTHON_BIN} scripts/resource_sampler.py --pid $$ ${EXCLUDE_PID_ARGS} \
+        --output "${ARTIFACT_DIR}/client_resources.jsonl" \
+        --interval "${RESOURCE_SAMPLE_INTERVAL:-1}" &
+    BACKGROUND_PIDS="${BACKGROUND_PIDS} $!"
+fi
+
 # コマンド実行
 eval ${CMD}
 
+stop_background
+if [ -f "${ARTIFACT_DIR}/client_resources.jsonl" ]; then
+    echo "Client resource samples saved to: ${ARTIFACT_DIR}/client_resources.jsonl"
+fi
+if [ -f "${ARTIFACT_DIR}/server_metrics.jsonl" ]; then
+    echo "Server metrics saved to: ${ARTIFACT_DIR}/server_metrics.jsonl"
+fi
+
 echo ""
 echo "Profile completed. Artifacts saved to: ${ARTIFACT_DIR}"
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク実行履歴のSQLiteストアとクエリCLI
+
+summarize_export.py がサマリ生成のたびに、実行条件（モデル / URL / ISL・OSL・CON /
+データセットハッシュ / gitリビジョン / 実行時刻）と算出済みの統計値・スケッチを
+artifacts/run_history.sqlite に追記します。生のexportを読み直さずに傾向を確認できます。
+
+使用例:
+    python scripts/run_history.py trend --metric TTFT --stat p99 --con 20 --since 30d
+    python scripts/run_history.py trend --metric TTFT --con 20 --since 30d --merge
+    python scripts/run_history.py list --limit 20
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_DB_PATH = "artifacts/run_history.sqlite"
+
+# スケッチの相対誤差（DDSketch方式の対数バケット。1%以内の誤差でquantileを復元できる）
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+STATS = ("p50", "p95", "p99", "avg", "count")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    artifact_dir TEXT NOT NULL,
+    mode TEXT,
+    model TEXT,
+    url TEXT,
+    isl INTEGER,
+    osl INTEGER,
+    concurrency INTEGER,
+    dataset_hash TEXT,
+    git_revision TEXT,
+    run_at REAL NOT NULL,
+    recorded_at REAL NOT NULL,
+    record_count INTEGER,
+    error_count INTEGER,
+    UNIQUE (artifact_dir, run_at)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_params ON runs (model, url, isl, osl, concurrency, run_at);
+CREATE INDEX IF NOT EXISTS idx_runs_run_at ON runs (run_at);
+CREATE INDEX IF NOT EXISTS idx_runs_dataset ON runs (dataset_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_git ON runs (git_revision);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    unit TEXT,
+    p50 REAL,
+    p95 REAL,
+    p99 REAL,
+    avg REAL,
+    count INTEGER,
+    sketch TEXT,
+    PRIMARY KEY (run_id, metric)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_metric ON metrics (metric);
+"""
+
+
+def build_sketch(values: Iterable[float], relative_accuracy: float = SKETCH_RELATIVE_ACCURACY) -> Dict[str, Any]:
+    """値の分布を対数バケットのヒストグラム（スケッチ）にまとめる
+
+    バケット i は (gamma^(i-1), gamma^i] の範囲。複数実行のスケッチはバケットごとの
+    カウントを足し合わせるだけでマージでき、相対誤差 relative_accuracy 以内でquantileを復元できる。
+    """
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    log_gamma = math.log(gamma)
+    counts: Dict[int, int] = {}
+    zero_count = 0
+    for value in values:
+        if value <= 0:
+            zero_count += 1
+            continue
+        index = math.ceil(math.log(value) / log_gamma)
+        counts[index] = counts.get(index, 0) + 1
+    return {
+        "relative_accuracy": relative_accuracy,
+        "zero_count": zero_count,
+        "counts": {str(k): v for k, v in sorted(counts.items())},
+    }
+
+
+def merge_sketches(sketches: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """同じ精度のスケッチをマージ"""
+    if not sketches:
+        return None
+    accuracy = sketches[0]["relative_accuracy"]
+    counts: Dict[int, int] = {}
+    zero_count = 0
+    for sketch in sketches:
+        if sketch["relative_accuracy"] != accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        zero_count += sketch.get("zero_count", 0)
+        for index, count in sketch["counts"].items():
+            counts[int(index)] = counts.get(int(index), 0) + count
+    return {
+        "relative_accuracy": accuracy,
+        "zero_count": zero_count,
+        "counts": {str(k): v for k, v in sorted(counts.items())},
+    }
+
+
+def sketch_quantile(sketch: Dict[str, Any], q: float) -> float:
+    """スケッチから quantile q（0〜1）の近似値を求める"""
+    buckets = sorted((int(k), v) for k, v in sketch["counts"].items())
+    total = sketch.get("zero_count", 0) + sum(v for _, v in buckets)
+    if total == 0:
+        return 0.0
+
+    rank = q * (total - 1)
+    seen = sketch.get("zero_count", 0)
+    if rank < seen:
+        return 0.0
+
+    gamma = (1 + sketch["relative_accuracy"]) / (1 - sketch["relative_accuracy"])
+    for index, count in buckets:
+        seen += count
+        if rank < seen:
+            # バケットの代表値（相対誤差が最小になる点）
+            return 2 * gamma ** index / (gamma + 1)
+    index = buckets[-1][0]
+    return 2 * gamma ** index / (gamma + 1)
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """履歴DBに接続（無ければ作成）"""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_run(conn: sqlite3.Connection, run: Dict[str, Any], metrics: Dict[str, Dict[str, Any]]) -> int:
+    """1回分の実行を記録（同じ artifact_dir / run_at の記録は置き換える）"""
+    with conn:
+        conn.execute(
+            "DELETE FROM runs WHERE artifact_dir = ? AND run_at = ?",
+            (run["artifact_dir"], run["run_at"]),
+        )
+        cursor = conn.execute(
+            """
+            INSERT INTO runs (artifact_dir, mode, model, url, isl, osl, concurrency, dataset_hash,
+                              git_revision, run_at, recorded_at, record_count, error_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run["artifact_dir"], run.get("mode"), run.get("model"), run.get("url"),
+                run.get("isl"), run.get("osl"), run.get("concurrency"), run.get("dataset_hash"),
+                run.get("git_revision"), run["run_at"], time.time(),
+                run.get("record_count"), run.get("error_count"),
+            ),
+        )
+        run_id = cursor.lastrowid
+        for metric, stats in metrics.items():
+            sketch = stats.get("sketch")
+            conn.execute(
+                """
+                INSERT INTO metrics (run_id, metric, unit, p50, p95, p99, avg, count, sketch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    run_id, metric, stats.get("unit"), stats.get("p50"), stats.get("p95"),
+                    stats.get("p99"), stats.get("avg"), stats.get("count"),
+                    json.dumps(sketch) if sketch else None,
+                ),
+            )
+    return run_id
+
+
+def query_trend(
+    conn: sqlite3.Connection,
+    metric: str,
+    filters: Optional[Dict[str, Any]] = None,
+    since: Optional[float] = None,
+) -> List[sqlite3.Row]:
+    """条件に合う実行の指定メトリクスを実行時刻順に返す"""
+    clauses = ["m.metric = ?"]
+    params: List[Any] = [metric]
+    for column, value in (filters or {}).items():
+        if value is not None:
+            clauses.append(f"r.{column} = ?")
+            params.append(value)
+    if since is not None:
+        clauses.append("r.run_at >= ?")
+        params.append(since)
+
+    sql = f"""
+        SELECT r.*, m.metric, m.unit, m.p50, m.p95, m.p99, m.avg, m.count, m.sketch
+        FROM runs r JOIN metrics m ON m.run_id = r.id
+        WHERE {" AND ".join(clauses)}
+        ORDER BY r.run_at
+    """
+    return conn.execute(sql, params).fetchall()
+
+
+def parse_since(value: Optional[str]) -> Optional[float]:
+    """--since の値（例: 30d, 12h, 2026-09-01）をエポック秒に変換"""
+    if not value:
+        return None
+    match = re.fullmatch(r"(\d+)([dh])", value.strip())
+    if match:
+        amount = int(match.group(1))
+        seconds = amount * (86400 if match.group(2) == "d" else 3600)
+        return time.time() - seconds
+    try:
+        return time.mktime(time.strptime(value.strip(), "%Y-%m-%d"))
+    except ValueError:
+        raise ValueError(f"Invalid --since value: {value} (use e.g. 30d, 12h or YYYY-MM-DD)")
+
+
+def format_run_at(epoch: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch))
+
+
+def _text(value: Any) -> str:
+    """TSV表示用（未記録の値は "-"）"""
+    return "-" if value is None else str(value)
+
+
+def cmd_trend(conn: sqlite3.Connection, args: argparse.Namespace) -> int:
+    filters = {
+        "model": args.model, "url": args.url, "isl": args.isl, "osl": args.osl,
+        "concurrency": args.con, "mode": args.mode, "dataset_hash": args.dataset_hash,
+    }
+    rows = query_trend(conn, args.metric, filters, parse_since(args.since))
+    if not rows:
+        print("No matching runs found", file=sys.stderr)
+        return 1
+
+    print(f"run_at\tmodel\tisl\tosl\tcon\tgit\tdataset\t{args.stat}\tunit\tcount")
+    for row in rows:
+        value = row[args.stat]
+        value_text = f"{value:.2f}" if isinstance(value, float) else str(value)
+        print(
+            f"{format_run_at(row['run_at'])}\t{_text(row['model'])}\t{_text(row['isl'])}\t{_text(row['osl'])}\t"
+            f"{_text(row['concurrency'])}\t{_text(row['git_revision'])}\t{(row['dataset_hash'] or '-')[:12]}\t"
+            f"{value_text}\t{row['unit']}\t{row['count']}"
+        )
+
+    if args.merge:
+        merged = merge_sketches([json.loads(row["sketch"]) for row in rows if row["sketch"]])
+        if merged:
+            quantiles = "\t".join(
+                f"p{int(q * 100)}={sketch_quantile(merged, q):.2f}" for q in (0.50, 0.95, 0.99)
+            )
+            print(f"# merged over {len(rows)} runs:\t{quantiles}")
+    return 0
+
+
+def cmd_list(conn: sqlite3.Connection, args: argparse.Namespace) -> int:
+    rows = conn.execute("SELECT * FROM runs ORDER BY run_at DESC LIMIT ?", (args.limit,)).fetchall()
+    print("run_at\tmode\tmodel\turl\tisl\tosl\tcon\tgit\trecords\terrors\tartifact_dir")
+    for row in rows:
+        print(
+            f"{format_run_at(row['run_at'])}\t{_text(row['mode'])}\t{_text(row['model'])}\t{_text(row['url'])}\t"
+            f"{_text(row['isl'])}\t{_text(row['osl'])}\t{_text(row['concurrency'])}\t{_text(row['git_revision'])}\t"
+            f"{_text(row['record_count'])}\t{_text(row['error_count'])}\t{row['artifact_dir']}"
+        )
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ベンチマーク実行履歴（SQLite）のクエリ")
+    parser.add_argument(
+        "--db",
+        default=os.getenv("RUN_HISTORY_DB", DEFAULT_DB_PATH),
+        help=f"履歴DBのパス（デフォルト: {DEFAULT_DB_PATH}）",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    trend = subparsers.add_parser("trend", help="メトリクスの推移を表示")
+    trend.add_argument("--metric", default="TTFT", help="メトリクス名（例: TTFT, Request Latency）")
+    trend.add_argument("--stat", default="p99", choices=STATS, help="表示する統計値（デフォルト: p99）")
+    trend.add_argument("--model")
+    trend.add_argument("--url")
+    trend.add_argument("--isl", type=int)
+    trend.add_argument("--osl", type=int)
+    trend.add_argument("--con", type=int, help="concurrency")
+    trend.add_argument("--mode", help="実行モード（例: profile）")
+    trend.add_argument("--dataset-hash")
+    trend.add_argument("--since", help="期間（例: 30d, 12h, 2026-09-01）")
+    trend.add_argument("--merge", action="store_true", help="該当実行のスケッチをマージしたp50/p95/p99も表示")
+
+    listing = subparsers.add_parser("list", help="記録済みの実行を新しい順に表示")
+    listing.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    if not Path(args.db).exists():
+        print(f"Error: {args.db} not found. Run 'make summary' first.", file=sys.stderr)
+        return 1
+
+    conn = connect(args.db)
+    try:
+        if args.command == "trend":
+            return cmd_trend(conn, args)
+        return cmd_list(conn, args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
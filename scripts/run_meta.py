@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+実行条件（run_meta.json）の記録と読み込み
+
+run_aiperf_profile.sh から実行直前に呼ばれ、モデル・URL・ISL/OSL/CON・
+データセットのハッシュ・gitリビジョンなどを artifact ディレクトリに保存します。
+summarize_export.py / run_history.py が実行履歴のインデックスとして使用します。
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+RUN_META_FILE_NAME = "run_meta.json"
+
+
+def _int_env(name: str) -> Optional[int]:
+    value = os.getenv(name, "").strip()
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _float_env(name: str) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def compute_dataset_hash(input_file: Optional[str], env: Dict[str, str]) -> str:
+    """データセットを識別するハッシュ
+
+    INPUT_FILE を使う場合はファイル内容の SHA-256、synthetic mode の場合は
+    トークン長パラメータから作った SHA-256 を返す（同じ条件なら同じ値になる）。
+    """
+    digest = hashlib.sha256()
+    if input_file and Path(input_file).is_file():
+        with open(input_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    synthetic = "synthetic:isl={}:stddev={}:osl={}".format(
+        env.get("INPUT_TOKENS_MEAN", ""),
+        env.get("INPUT_TOKENS_STDDEV", ""),
+        env.get("OUTPUT_TOKENS_MEAN", ""),
+    )
+    digest.update(synthetic.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_git_revision() -> str:
+    """ベンチマークハーネス（このリポジトリ）のgitリビジョン"""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    return result.stdout.strip() if result.returncode == 0 and result.stdout.strip() else "unknown"
+
+
+def build_run_meta(mode: str) -> Dict[str, Any]:
+    """環境変数（run_aiperf_profile.sh で確定した値）から実行条件を組み立てる"""
+    input_file = os.getenv("INPUT_FILE", "").strip()
+    if input_file and not Path(input_file).is_file():
+        input_file = ""
+
+    now = time.time()
+    return {
+        "mode": mode,
+        "model": os.getenv("MODEL", ""),
+        "url": os.getenv("AIPERF_URL", ""),
+        "isl": _int_env("INPUT_TOKENS_MEAN"),
+        "osl": _int_env("OUTPUT_TOKENS_MEAN"),
+        "concurrency": _int_env("CONCURRENCY"),
+        "request_count": _int_env("REQUEST_COUNT"),
+        "request_rate": _float_env("REQUEST_RATE"),
+        "input_file": input_file or None,
+        "dataset_hash": compute_dataset_hash(input_file, dict(os.environ)),
+        "git_revision": get_git_revision(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(now)),
+        "started_at_epoch": now,
+    }
+
+
+def default_artifact_dir(mode: str, isl: int, osl: int, concurrency: int) -> Path:
+    """run_aiperf_profile.sh と同じ規則で artifactディレクトリ名を決める"""
+    name = f"ISL{isl}_OSL{osl}_CON{concurrency}"
+    if mode == "profile":
+        return Path("artifacts") / name
+    return Path("artifacts") / f"{mode}_{name}"
+
+
+def write_run_meta(artifact_dir: Path, meta: Dict[str, Any]) -> Path:
+    """artifactディレクトリに run_meta.json を書き込む"""
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    path = artifact_dir / RUN_META_FILE_NAME
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load_run_meta(artifact_dir: Path) -> Optional[Dict[str, Any]]:
+    """run_meta.json を読み込む（無い・壊れている場合は None）"""
+    path = artifact_dir / RUN_META_FILE_NAME
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Failed to read {path}: {e}", file=sys.stderr)
+        return None
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: run_meta.py <artifact_dir> [mode]", file=sys.stderr)
+        sys.exit(1)
+
+    artifact_dir = Path(sys.argv[1])
+    mode = sys.argv[2] if len(sys.argv) > 2 else "profile"
+    path = write_run_meta(artifact_dir, build_run_meta(mode))
+    print(f"Run metadata saved to: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+巨大な trace.jsonl から、入力トークン長の分布を保ったサブセットを抽出
+
+本番のプロンプトログ（数千万行）を INPUT_FILE にそのまま渡すと、REQUEST_COUNT が数百でも
+AIPerf が全行を読み込みます。このスクリプトはファイルを1回だけストリーミングで読み、
+入力トークン長のバケット（phase_analysis.TOKEN_BUCKET_EDGES と同じ境界）ごとに
+reservoir sampling を行い、元の長さの分布に比例した件数を抽出します。
+メモリ使用量は入力の行数に依らず「抽出件数 × バケット数（最大10）」行分で一定です
+（最終的な各バケットの件数は全行を読むまで分からないため、各バケットで抽出件数分を保持する）。
+
+- トークン数: TOKENIZER（または --tokenizer）の HuggingFace tokenizer を transformers で読み込み、
+  バッチ単位でプロセスプールに分けて数える。transformers が無い / 読み込めない場合は
+  文字数 / 4 の近似で数える
+- multi_turn: 1行＝1セッションとして、全 turn のテキストを連結した長さでバケットに分ける。
+  後の turn ほど前の turn を文脈に含めて送られるため、最後の turn の入力長（応答分を除く）に近い値になる。
+  1 turn 目の長さの分布は保たれない
+- 出力: 抽出した行を元の順序のまま書き出す（1行＝1 turn / 1セッションの形式はそのまま）
+- インデックス: 元データセットのバケットごとの件数・割合・トークン数と抽出件数を
+  <output>.index.json に保存（--reuse では元ファイルと条件が同じなら抽出をスキップ）
+
+使用例:
+    python scripts/sample_trace.py prompts/production.jsonl --count 300
+    python scripts/sample_trace.py prompts/production.jsonl --count 300 --tokenizer gpt2 --workers 8
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import random
+import sys
+from collections import deque
+import multiprocessing
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from phase_analysis import TOKEN_BUCKET_EDGES, bucket_label
+
+try:
+    from transformers import AutoTokenizer
+except ImportError:  # pragma: no cover
+    AutoTokenizer = None  # type: ignore
+
+INDEX_SUFFIX = ".index.json"
+INDEX_FORMAT_VERSION = 1
+DEFAULT_SEED = 42
+DEFAULT_BATCH_SIZE = 512
+# tokenizer が無い場合の近似（英語で1トークンあたりおよそ4文字）
+CHARS_PER_TOKEN = 4
+HEURISTIC_TOKENIZER = f"heuristic:chars/{CHARS_PER_TOKEN}"
+
+# プロセスプールの worker が読み込んだ tokenizer（worker ごとに1回だけ読み込む）
+_worker_tokenizer = None
+
+
+def extract_text(entry: Dict[str, Any]) -> str:
+    """1行（single_turn の1 turn、または multi_turn の1セッション）のテキストを連結
+
+    multi_turn では全 turn を連結するため、セッション全体の長さでバケットに分けることになる。
+    """
+    parts: List[str] = []
+    for turn in entry.get("turns") or []:
+        if isinstance(turn, dict):
+            parts.append(extract_text(turn))
+    if isinstance(entry.get("text"), str):
+        parts.append(entry["text"])
+    for item in entry.get("texts") or []:
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, dict):
+            contents = item.get("contents")
+            if isinstance(contents, str):
+                parts.append(contents)
+            elif isinstance(contents, list):
+                parts.extend(c for c in contents if isinstance(c, str))
+    return "\n".join(p for p in parts if p)
+
+
+def heuristic_token_count(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def load_tokenizer(name: Optional[str]):
+    """HuggingFace tokenizer を読み込む（name が空なら None = 近似）"""
+    if not name:
+        return None
+    if AutoTokenizer is None:
+        raise RuntimeError("transformers is not installed")
+    return AutoTokenizer.from_pretrained(name)
+
+
+def count_tokens(texts: List[str], tokenizer=None) -> List[int]:
+    """テキストのバッチのトークン数（特殊トークンは含めない）"""
+    if tokenizer is None:
+        return [heuristic_token_count(t) for t in texts]
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+
+def _init_worker(tokenizer_name: Optional[str]) -> None:
+    global _worker_tokenizer
+    _worker_tokenizer = load_tokenizer(tokenizer_name)
+
+
+def _count_batch(texts: List[str]) -> List[int]:
+    return count_tokens(texts, _worker_tokenizer)
+
+
+def iter_batches(path: Path, batch_size: int, stats: Dict[str, int]) -> Iterator[Tuple[List[Tuple[int, str]], List[str]]]:
+    """(行番号, 行) のリストとテキストのリストをバッチ単位で返す（不正な JSON の行は数えて飛ばす）"""
+    lines: List[Tuple[int, str]] = []
+    texts: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                stats["invalid_lines"] += 1
+                continue
+            if not isinstance(entry, dict):
+                stats["invalid_lines"] += 1
+                continue
+            lines.append((line_no, line))
+            texts.append(extract_text(entry))
+            if len(lines) >= batch_size:
+                yield lines, texts
+                lines, texts = [], []
+    if lines:
+        yield lines, texts
+
+
+def iter_token_counts(
+    batches: Iterator[Tuple[List[Tuple[int, str]], List[str]]],
+    tokenizer_name: Optional[str],
+    workers: int,
+) -> Iterator[Tuple[List[Tuple[int, str]], List[int]]]:
+    """バッチごとのトークン数を (行, トークン数) の順で返す
+
+    workers > 1 ならプロセスプールで数える。Pool.imap は入力を先読みし続けてメモリが
+    一定にならないため、処理中のバッチを workers × 2 個までに制限して投入する。
+    HuggingFace tokenizers は fork 後の子プロセスでデッドロックしうるため spawn で起動する。
+    """
+    if workers <= 1:
+        tokenizer = load_tokenizer(tokenizer_name)
+        for lines, texts in batches:
+            yield lines, count_tokens(texts, tokenizer)
+        return
+
+    pending: deque = deque()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(tokenizer_name,)) as pool:
+        for lines, texts in batches:
+            pending.append((lines, pool.apply_async(_count_batch, (texts,))))
+            if len(pending) >= workers * 2:
+                done_lines, result = pending.popleft()
+                yield done_lines, result.get()
+        while pending:
+            done_lines, result = pending.popleft()
+            yield done_lines, result.get()
+
+
+class StratifiedReservoir:
+    """バケットごとの reservoir sampling（Algorithm R）とトークン数の集計
+
+    最終的な各バケットの件数は全行を読むまで分からないため、各バケットで capacity 件
+    （= 抽出件数）まで一様に保持し、最後に allocate_counts の件数だけ取り出す。
+    """
+
+    def __init__(self, capacity: int, rng: random.Random):
+        self.capacity = capacity
+        self.rng = rng
+        self.reservoirs: Dict[int, List[Tuple[int, str]]] = {}
+        self.histogram: Dict[int, Dict[str, int]] = {}
+
+    def add(self, item: Tuple[int, str], tokens: int) -> None:
+        bucket = bisect.bisect_right(TOKEN_BUCKET_EDGES, tokens)
+        stats = self.histogram.setdefault(bucket, {"count": 0, "tokens": 0, "min": tokens, "max": tokens})
+        stats["count"] += 1
+        stats["tokens"] += tokens
+        stats["min"] = min(stats["min"], tokens)
+        stats["max"] = max(stats["max"], tokens)
+
+        reservoir = self.reservoirs.setdefault(bucket, [])
+        if len(reservoir) < self.capacity:
+            reservoir.append(item)
+        else:
+            j = self.rng.randrange(stats["count"])
+            if j < self.capacity:
+                reservoir[j] = item
+
+    def sample(self) -> Tuple[List[Tuple[int, str]], Dict[int, int]]:
+        """元の分布に比例した件数を各バケットから取り出し、元の行順で返す"""
+        quotas = allocate_counts({b: s["count"] for b, s in self.histogram.items()}, self.capacity)
+        selected: List[Tuple[int, str]] = []
+        for bucket, quota in sorted(quotas.items()):
+            # 一様な reservoir からの一様な部分集合は、元のバケット全体からの一様な抽出になる
+            selected.extend(self.rng.sample(self.reservoirs[bucket], quota))
+        selected.sort()
+        return selected, quotas
+
+
+def allocate_counts(counts: Dict[int, int], total: int) -> Dict[int, int]:
+    """total 件をバケットの件数に比例して割り当てる（最大剰余方式、合計はちょうど total）"""
+    population = sum(counts.values())
+    if population <= total:
+        return dict(counts)
+    exact = {bucket: count * total / population for bucket, count in counts.items()}
+    quotas = {bucket: int(value) for bucket, value in exact.items()}
+    remainder = total - sum(quotas.values())
+    for bucket in sorted(exact, key=lambda b: (quotas[b] - exact[b], b))[:remainder]:
+        quotas[bucket] += 1
+    return quotas
+
+
+def build_index(
+    source: Path,
+    reservoir: StratifiedReservoir,
+    quotas: Dict[int, int],
+    stats: Dict[str, int],
+    tokenizer_name: str,
+    requested_tokenizer: Optional[str],
+    seed: int,
+) -> Dict[str, Any]:
+    """元データセットのトークン長ヒストグラムと抽出条件（インデックス）"""
+    stat = source.stat()
+    lines = sum(s["count"] for s in reservoir.histogram.values())
+    buckets = []
+    for bucket in sorted(reservoir.histogram):
+        s = reservoir.histogram[bucket]
+        buckets.append({
+            "bucket": bucket_label(bucket),
+            "count": s["count"],
+            "fraction": s["count"] / lines,
+            "tokens_min": s["min"],
+            "tokens_max": s["max"],
+            "tokens_mean": s["tokens"] / s["count"],
+            "sampled": quotas.get(bucket, 0),
+        })
+    return {
+        "format_version": INDEX_FORMAT_VERSION,
+        "source": str(source),
+        "source_size_bytes": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "tokenizer": tokenizer_name,
+        "tokenizer_requested": requested_tokenizer or "",
+        "seed": seed,
+        "sample_count": reservoir.capacity,
+        "sampled": sum(quotas.values()),
+        "lines": lines,
+        "invalid_lines": stats["invalid_lines"],
+        "total_tokens": sum(s["tokens"] for s in reservoir.histogram.values()),
+        "bucket_edges": TOKEN_BUCKET_EDGES,
+        "buckets": buckets,
+    }
+
+
+def sample_trace(
+    source: Path,
+    output: Path,
+    count: int,
+    tokenizer_name: Optional[str] = None,
+    workers: int = 1,
+    seed: int = DEFAULT_SEED,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """source から count 件を抽出して output に書き、インデックスを返す（保存もする）"""
+    requested_tokenizer = tokenizer_name
+    if tokenizer_name:
+        try:
+            load_tokenizer(tokenizer_name)
+        except Exception as e:
+            print(f"Warning: Failed to load tokenizer {tokenizer_name} ({e}); using {HEURISTIC_TOKENIZER}",
+                  file=sys.stderr)
+            tokenizer_name = None
+
+    stats = {"invalid_lines": 0}
+    reservoir = StratifiedReservoir(count, random.Random(seed))
+    batches = iter_batches(source, batch_size, stats)
+    for lines, tokens in iter_token_counts(batches, tokenizer_name, workers):
+        for item, n in zip(lines, tokens):
+            reservoir.add(item, n)
+
+    selected, quotas = reservoir.sample()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        for _, line in selected:
+            f.write(line + "\n")
+
+    index = build_index(source, reservoir, quotas, stats, tokenizer_name or HEURISTIC_TOKENIZER,
+                        requested_tokenizer, seed)
+    with open(index_path(output), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return index
+
+
+def index_path(output: Path) -> Path:
+    return output.with_name(output.stem + INDEX_SUFFIX)
+
+
+def default_output_path(source: Path, count: int) -> Path:
+    return source.with_name(f"{source.stem}.sample{count}.jsonl")
+
+
+def is_sample_current(source: Path, output: Path, count: int, tokenizer_name: Optional[str], seed: int) -> bool:
+    """既存の抽出結果が同じ元ファイル（サイズ・更新時刻）と条件で作られたものか"""
+    path = index_path(output)
+    if not output.exists() or not path.exists():
+        return False
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    stat = source.stat()
+    # tokenizer を読み込めずに近似で数えた場合も、同じ指定なら再利用する
+    return (
+        index.get("format_version") == INDEX_FORMAT_VERSION
+        and index.get("source_size_bytes") == stat.st_size
+        and index.get("source_mtime_ns") == stat.st_mtime_ns
+        and index.get("sample_count") == count
+        and index.get("seed") == seed
+        and index.get("tokenizer_requested") == (tokenizer_name or "")
+    )
+
+
+def format_index_report(index: Dict[str, Any]) -> List[str]:
+    """元データセットと抽出結果のバケットごとの割合"""
+    lines = [
+        f"Source: {index['source']} ({index['lines']} lines, {index['total_tokens']} tokens, "
+        f"tokenizer: {index['tokenizer']})",
+        f"{'ISL bucket':<14}{'source':>10}{'share':>9}{'sampled':>10}{'share':>9}",
+    ]
+    sampled_total = index["sampled"] or 1
+    for row in index["buckets"]:
+        lines.append(
+            f"{row['bucket']:<14}{row['count']:>10}{row['fraction'] * 100:>8.1f}%"
+            f"{row['sampled']:>10}{row['sampled'] / sampled_total * 100:>8.1f}%"
+        )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="trace.jsonl から入力トークン長の分布を保ったサブセットを抽出")
+    parser.add_argument("source", help="元の trace.jsonl")
+    parser.add_argument("--count", type=int, required=True, help="抽出する行数")
+    parser.add_argument("--output", default=None,
+                        help="出力先（デフォルト: <source>.sample<count>.jsonl。インデックスは <output>.index.json）")
+    parser.add_argument("--tokenizer", default=os.getenv("TOKENIZER", ""),
+                        help=f"HuggingFace tokenizer 名（デフォルト: TOKENIZER。空なら {HEURISTIC_TOKENIZER}）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="トークン数を数えるプロセス数（デフォルト: tokenizer 使用時は CPU 数、近似なら1）")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"乱数シード（デフォルト: {DEFAULT_SEED}）")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"1回に tokenizer に渡す行数（デフォルト: {DEFAULT_BATCH_SIZE}）")
+    parser.add_argument("--reuse", action="store_true", help="同じ元ファイル・条件の抽出結果があればそのまま使う")
+    args = parser.parse_args(argv)
+
+    source = Path(args.source)
+    if not source.is_file():
+        print(f"Error: Input file not found: {source}", file=sys.stderr)
+        sys.exit(1)
+    if args.count <= 0:
+        print("Error: --count must be positive", file=sys.stderr)
+        sys.exit(1)
+    output = Path(args.output) if args.output else default_output_path(source, args.count)
+    tokenizer_name = args.tokenizer.strip() or None
+
+    if args.reuse and is_sample_current(source, output, args.count, tokenizer_name, args.seed):
+        print(f"Reusing sample: {output}", file=sys.stderr)
+        return
+
+    workers = args.workers if args.workers is not None else ((os.cpu_count() or 1) if tokenizer_name else 1)
+    print(f"Sampling {args.count} lines from {source} (workers: {workers})...", file=sys.stderr)
+    index = sample_trace(source, output, args.count, tokenizer_name, workers, args.seed, args.batch_size)
+
+    for line in format_index_report(index):
+        print(line, file=sys.stderr)
+    if index["invalid_lines"]:
+        print(f"Warning: Skipped {index['invalid_lines']} invalid JSON line(s)", file=sys.stderr)
+    if index["sampled"] < args.count:
+        print(f"Warning: Source has only {index['sampled']} lines (requested {args.count})", file=sys.stderr)
+    print(f"Sample written to: {output}", file=sys.stderr)
+    print(f"Index written to: {index_path(output)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
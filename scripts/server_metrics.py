@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+推論サーバの Prometheus メトリクス（/metrics）のスクレイプとベンチマークの時間軸への対応付け
+
+vLLM / TGI / SGLang などの OpenAI互換サーバが公開する /metrics を、profile 実行中に
+一定間隔で取得して artifactディレクトリの server_metrics.jsonl に保存します
+（run_aiperf_profile.sh が SERVER_METRICS_URL 指定時にバックグラウンドで起動）。
+
+summarize_export.py は、リクエストの開始/終了時刻から求めた実行区間のサンプルだけを使い、
+キュー長・実行中リクエスト数・KV cache 使用率・prefix cache ヒット率を summary.md に出力します。
+TTFT から推測するしかなかった prefix cache の有無を、サーバ側の値で確認できます。
+
+使用例:
+    python scripts/server_metrics.py --url http://localhost:8000/metrics --pid <PID> \\
+        --output artifacts/.../server_metrics.jsonl
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import signal
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+SERVER_METRICS_FILE_NAME = "server_metrics.jsonl"
+DEFAULT_INTERVAL_SEC = 1.0
+DEFAULT_TIMEOUT_SEC = 5.0
+# summary.md の時間軸の表の最大行数
+TIMELINE_MAX_ROWS = 12
+
+# 既知のサーバごとのメトリクス名（先に見つかったものを使う。同名で複数ラベルがあれば合計）
+GAUGE_METRICS: Dict[str, List[str]] = {
+    "requests_running": ["vllm:num_requests_running", "tgi_batch_current_size", "sglang:num_running_reqs"],
+    "requests_waiting": ["vllm:num_requests_waiting", "tgi_queue_size", "sglang:num_queue_reqs"],
+    "kv_cache_usage": ["vllm:kv_cache_usage_perc", "vllm:gpu_cache_usage_perc", "sglang:token_usage"],
+    "prefix_cache_hit_rate": ["vllm:gpu_prefix_cache_hit_rate", "sglang:cache_hit_rate"],
+}
+# prefix cache のヒット率を実行区間の差分から求めるカウンタ（ヒット数, 問い合わせ数）
+PREFIX_CACHE_COUNTERS: List[Tuple[str, str]] = [
+    ("vllm:prefix_cache_hits_total", "vllm:prefix_cache_queries_total"),
+    ("vllm:gpu_prefix_cache_hits_total", "vllm:gpu_prefix_cache_queries_total"),
+]
+
+GAUGE_LABELS = {
+    "requests_running": ("Running Requests", "count"),
+    "requests_waiting": ("Waiting Requests (queue)", "count"),
+    "kv_cache_usage": ("KV Cache Usage", "%"),
+    "prefix_cache_hit_rate": ("Prefix Cache Hit Rate", "%"),
+}
+# 0〜1 の比率で公開されるため、表示時に % に直すもの
+RATIO_METRICS = {"kv_cache_usage", "prefix_cache_hit_rate"}
+
+SAMPLE_PATTERN = re.compile(
+    r"^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)"
+    r"(?:\{(?P<labels>.*)\})?"
+    r"\s+(?P<value>\S+)"
+    r"(?:\s+(?P<timestamp>-?\d+))?\s*$"
+)
+LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _parse_value(text: str) -> Optional[float]:
+    try:
+        return float(text)  # "NaN", "+Inf", "-Inf" もそのまま解釈できる
+    except ValueError:
+        return None
+
+
+def _unescape(value: str) -> str:
+    return value.replace(r"\\", "\\").replace(r"\"", '"').replace(r"\n", "\n")
+
+
+def parse_prometheus_text(text: str) -> List[Tuple[str, Dict[str, str], float]]:
+    """Prometheus テキスト形式を (メトリクス名, ラベル, 値) のリストにする（コメント行は無視）"""
+    samples = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        if not match:
+            continue
+        value = _parse_value(match.group("value"))
+        if value is None:
+            continue
+        labels = {k: _unescape(v) for k, v in LABEL_PATTERN.findall(match.group("labels") or "")}
+        samples.append((match.group("name"), labels, value))
+    return samples
+
+
+def series_key(name: str, labels: Dict[str, str]) -> str:
+    """サンプルを保存するときのキー（name{k="v",...}、ラベルはキー順）"""
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{labels[k]}"' for k in sorted(labels))
+    return f"{name}{{{inner}}}"
+
+
+def select_samples(samples: List[Tuple[str, Dict[str, str], float]], pattern: Optional[str] = None) -> Dict[str, float]:
+    """保存するサンプルを選ぶ
+
+    ヒストグラムの _bucket は行数が多いため既定では保存しない（_sum / _count は残す）。
+    pattern（正規表現）を指定した場合は、名前が一致するものだけを保存する。
+    """
+    regex = re.compile(pattern) if pattern else None
+    selected: Dict[str, float] = {}
+    for name, labels, value in samples:
+        if regex is not None:
+            if not regex.search(name):
+                continue
+        elif name.endswith("_bucket"):
+            continue
+        if math.isnan(value) or math.isinf(value):
+            continue
+        selected[series_key(name, labels)] = value
+    return selected
+
+
+def scrape(url: str, timeout: float = DEFAULT_TIMEOUT_SEC, pattern: Optional[str] = None) -> Dict[str, float]:
+    """1回スクレイプしてサンプルを返す（失敗時は例外）"""
+    request = urllib.request.Request(url, headers={"Accept": "text/plain"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        text = response.read().decode("utf-8", errors="replace")
+    return select_samples(parse_prometheus_text(text), pattern)
+
+
+def run_scraper(
+    url: str,
+    output: Path,
+    interval_sec: float = DEFAULT_INTERVAL_SEC,
+    stop_pid: Optional[int] = None,
+    pattern: Optional[str] = None,
+) -> int:
+    """stop_pid が終了するか SIGTERM / SIGINT を受けるまでスクレイプを続ける（戻り値: 成功したサンプル数）"""
+    stop = {"requested": False}
+
+    def handle_signal(signum, frame):
+        stop["requested"] = True
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    def alive() -> bool:
+        if stop_pid is None:
+            return True
+        try:
+            os.kill(stop_pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    next_scrape = time.monotonic()
+    with open(output, "w", encoding="utf-8") as f:
+        while not stop["requested"] and alive():
+            timestamp = time.time()
+            try:
+                record: Dict[str, Any] = {"timestamp": round(timestamp, 3), "metrics": scrape(url, pattern=pattern)}
+                count += 1
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                record = {"timestamp": round(timestamp, 3), "error": str(e)}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            next_scrape += interval_sec
+            time.sleep(max(0.0, next_scrape - time.monotonic()))
+    return count
+
+
+def load_server_metrics(artifact_dir: Path) -> List[Dict[str, Any]]:
+    """artifactディレクトリの server_metrics.jsonl を読み込む（エラー行・壊れた行は除く）"""
+    path = artifact_dir / SERVER_METRICS_FILE_NAME
+    samples: List[Dict[str, Any]] = []
+    if not path.exists():
+        return samples
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "metrics" in record:
+                samples.append(record)
+    return samples
+
+
+def metric_total(metrics: Dict[str, float], names: Sequence[str]) -> Optional[float]:
+    """names のうち最初に見つかったメトリクス名について、全ラベルの値を合計する"""
+    for name in names:
+        values = [v for key, v in metrics.items() if key == name or key.startswith(name + "{")]
+        if values:
+            return sum(values)
+    return None
+
+
+def find_prefix_cache_counters(samples: List[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+    """サンプルに含まれる prefix cache のカウンタ名の組（ヒット数, 問い合わせ数）"""
+    for hits_name, queries_name in PREFIX_CACHE_COUNTERS:
+        metrics = samples[0]["metrics"]
+        if metric_total(metrics, [hits_name]) is not None and metric_total(metrics, [queries_name]) is not None:
+            return hits_name, queries_name
+    return None
+
+
+def prefix_cache_delta(before: Dict[str, float], after: Dict[str, float], counters: Tuple[str, str]) -> Dict[str, Any]:
+    """2つのサンプル間のカウンタの増分から prefix cache ヒット率（%）を求める"""
+    hits_name, queries_name = counters
+    hits = (metric_total(after, [hits_name]) or 0.0) - (metric_total(before, [hits_name]) or 0.0)
+    queries = (metric_total(after, [queries_name]) or 0.0) - (metric_total(before, [queries_name]) or 0.0)
+    return {"hits": hits, "queries": queries, "hit_rate": hits / queries * 100 if queries > 0 else None}
+
+
+def in_flight_at(spans: Sequence[Tuple[int, int]], timestamp_ns: int) -> int:
+    return sum(1 for start, end in spans if start <= timestamp_ns < end)
+
+
+def analyze_server_metrics(samples: List[Dict[str, Any]], spans: Sequence[Tuple[int, int]]) -> Optional[Dict[str, Any]]:
+    """実行区間（最初の開始〜最後の終了）のサンプルから各メトリクスの平均・最大と時間軸を作る
+
+    spans はリクエストの (開始ns, 終了ns)。無ければ全サンプルを使う。
+    """
+    if spans:
+        window_start = min(s for s, _ in spans) / 1e9
+        window_end = max(e for _, e in spans) / 1e9
+        in_window = [s for s in samples if window_start <= s["timestamp"] <= window_end]
+    else:
+        window_start = window_end = None
+        in_window = list(samples)
+    if not in_window:
+        return None
+
+    gauges: Dict[str, Dict[str, float]] = {}
+    for key, names in GAUGE_METRICS.items():
+        values = [v for v in (metric_total(s["metrics"], names) for s in in_window) if v is not None]
+        if values:
+            scale = 100.0 if key in RATIO_METRICS else 1.0
+            gauges[key] = {
+                "mean": sum(values) / len(values) * scale,
+                "max": max(values) * scale,
+                "count": len(values),
+            }
+
+    # カウンタがあれば、実行区間の増分から prefix cache ヒット率を求める（ゲージより優先）
+    prefix_cache: Optional[Dict[str, float]] = None
+    counters = find_prefix_cache_counters(in_window)
+    if counters:
+        prefix_cache = prefix_cache_delta(in_window[0]["metrics"], in_window[-1]["metrics"], counters)
+
+    # 時間軸: 実行開始からの経過秒ごとに、クライアント側の in-flight 数とサーバ側の値を並べる
+    step = max(1, math.ceil(len(in_window) / TIMELINE_MAX_ROWS))
+    origin = window_start if window_start is not None else in_window[0]["timestamp"]
+    timeline = []
+    previous: Optional[Dict[str, float]] = None
+    for sample in in_window[::step]:
+        row: Dict[str, Any] = {
+            "elapsed_sec": sample["timestamp"] - origin,
+            "client_in_flight": in_flight_at(spans, int(sample["timestamp"] * 1e9)) if spans else None,
+        }
+        for key, names in GAUGE_METRICS.items():
+            value = metric_total(sample["metrics"], names)
+            row[key] = value * 100.0 if value is not None and key in RATIO_METRICS else value
+        # カウンタの場合は前の行からの増分でヒット率を出す
+        if counters and previous is not None:
+            row["prefix_cache_hit_rate"] = prefix_cache_delta(previous, sample["metrics"], counters)["hit_rate"]
+        previous = sample["metrics"]
+        timeline.append(row)
+
+    return {
+        "sample_count": len(in_window),
+        "total_samples": len(samples),
+        "window_start": window_start,
+        "window_end": window_end,
+        "gauges": gauges,
+        "prefix_cache": prefix_cache,
+        "timeline": timeline,
+    }
+
+
+def _fmt(value: Optional[float], digits: int = 1) -> str:
+    return f"{value:.{digits}f}" if value is not None else "-"
+
+
+def format_server_metrics_markdown(analysis: Dict[str, Any]) -> List[str]:
+    """summary.md 用のサーバメトリクスセクション"""
+    lines = [
+        "",
+        "## Server Metrics (Prometheus)",
+        "",
+        f"実行区間（最初の開始〜最後の終了）の {analysis['sample_count']} samples"
+        f"（全 {analysis['total_samples']} samples）。",
+        "",
+    ]
+    if analysis["gauges"]:
+        lines.extend(["| Metric | Mean | Max | Unit |", "|--------|------|-----|------|"])
+        for key, stats in analysis["gauges"].items():
+            label, unit = GAUGE_LABELS[key]
+            lines.append(f"| {label} | {stats['mean']:.2f} | {stats['max']:.2f} | {unit} |")
+    else:
+        lines.append("既知のメトリクス（vLLM / TGI / SGLang のキュー長・KV cache 等）は見つかりませんでした。")
+
+    prefix_cache = analysis["prefix_cache"]
+    if prefix_cache:
+        lines.extend([
+            "",
+            f"**Prefix Cache (run window):** {prefix_cache['hits']:.0f} hits / {prefix_cache['queries']:.0f} queries"
+            f" = {_fmt(prefix_cache['hit_rate'])}%",
+        ])
+    hit_rate = prefix_cache["hit_rate"] if prefix_cache else analysis["gauges"].get("prefix_cache_hit_rate", {}).get("mean")
+    if hit_rate is not None and hit_rate > 0:
+        lines.extend([
+            "",
+            "⚠️ prefix cache がヒットしています。キャッシュ無しの性能を測る場合は PROMPT_CACHE_AVOIDANCE.md を参照してください。",
+        ])
+
+    timeline = analysis["timeline"]
+    if timeline:
+        lines.extend([
+            "",
+            "### Timeline",
+            "",
+            "| Elapsed (s) | Client In-Flight | Running | Waiting | KV Cache (%) | Prefix Hit (%) |",
+            "|-------------|------------------|---------|---------|--------------|----------------|",
+        ])
+        for row in timeline:
+            lines.append(
+                f"| {row['elapsed_sec']:.1f} | {_fmt(row['client_in_flight'], 0)} | "
+                f"{_fmt(row['requests_running'], 0)} | {_fmt(row['requests_waiting'], 0)} | "
+                f"{_fmt(row['kv_cache_usage'])} | {_fmt(row['prefix_cache_hit_rate'])} |"
+            )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="推論サーバの Prometheus /metrics を定期的にスクレイプ")
+    parser.add_argument("--url", default=os.getenv("SERVER_METRICS_URL", ""), help="メトリクスのURL（例: http://host:8000/metrics）")
+    parser.add_argument("--output", default=SERVER_METRICS_FILE_NAME, help=f"出力先（デフォルト: {SERVER_METRICS_FILE_NAME}）")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_SEC,
+                        help=f"スクレイプ間隔（秒、デフォルト: {DEFAULT_INTERVAL_SEC}）")
+    parser.add_argument("--pid", type=int, default=None, help="このプロセスが終了したらスクレイプを止める")
+    parser.add_argument("--filter", default=os.getenv("SERVER_METRICS_FILTER", "") or None,
+                        help="保存するメトリクス名の正規表現（デフォルト: _bucket 以外すべて）")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        print("Error: --url (or SERVER_METRICS_URL) is required", file=sys.stderr)
+        sys.exit(1)
+    count = run_scraper(args.url, Path(args.output), args.interval, args.pid, args.filter)
+    print(f"Scraped {count} samples from {args.url}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Multi-turn（trace_multi_turn 形式）実行結果のセッション単位の分析
+
+summarize_export.py から呼ばれ、レコードをセッション / turn 単位にまとめて
+turn index 別の TTFT / Request Latency、セッション完了時間、
+累積文脈長ごとの TTFT を算出します。
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+from export_records import (
+    INPUT_TOKEN_FIELDS,
+    OUTPUT_TOKEN_FIELDS,
+    calculate_percentiles,
+    extract_metric_value,
+    extract_request_span_ns,
+    get_record_value,
+)
+
+# セッションを識別するフィールド（AIPerfでは metadata.x_correlation_id がセッション実行ごとに一意）
+SESSION_ID_FIELDS = ["session_id", "x_correlation_id", "conversation_id"]
+TURN_INDEX_FIELDS = ["turn_index", "turn", "turn_id"]
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def extract_turns(data: List[Dict]) -> List[Dict[str, Any]]:
+    """セッションIDを持つレコードを turn 情報に変換（セッションIDが無いレコードは除外）"""
+    turns = []
+    for position, record in enumerate(data):
+        session_id = get_record_value(record, SESSION_ID_FIELDS)
+        if session_id is None:
+            continue
+
+        turn_index = _number(get_record_value(record, TURN_INDEX_FIELDS))
+        span = extract_request_span_ns(record)
+        turns.append({
+            "session_id": str(session_id),
+            "turn_index": int(turn_index) if turn_index is not None else None,
+            "position": position,
+            "ttft": extract_metric_value(record, "time_to_first_token"),
+            "latency": extract_metric_value(record, "request_latency"),
+            "input_tokens": _number(get_record_value(record, INPUT_TOKEN_FIELDS)),
+            "output_tokens": _number(get_record_value(record, OUTPUT_TOKEN_FIELDS)),
+            "start_ns": span[0] if span else None,
+            "end_ns": span[1] if span else None,
+        })
+    return turns
+
+
+def group_sessions(turns: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """turn をセッションごとにまとめ、turn index（無ければ開始時刻 / 出現順）で並べる
+
+    turn index が無いレコードには並び順から turn index を振り直す。
+    """
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    for turn in turns:
+        sessions.setdefault(turn["session_id"], []).append(turn)
+
+    for session_turns in sessions.values():
+        session_turns.sort(key=lambda t: (
+            t["turn_index"] if t["turn_index"] is not None else math.inf,
+            t["start_ns"] if t["start_ns"] is not None else math.inf,
+            t["position"],
+        ))
+        for index, turn in enumerate(session_turns):
+            if turn["turn_index"] is None:
+                turn["turn_index"] = index
+    return sessions
+
+
+def is_multi_turn(sessions: Dict[str, List[Dict[str, Any]]]) -> bool:
+    """2 turn 以上のセッションが存在するか"""
+    return any(len(session_turns) > 1 for session_turns in sessions.values())
+
+
+def compute_turn_stats(sessions: Dict[str, List[Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+    """turn index ごとの TTFT / Request Latency のパーセンタイル"""
+    by_turn: Dict[int, Dict[str, List[float]]] = {}
+    for session_turns in sessions.values():
+        for turn in session_turns:
+            bucket = by_turn.setdefault(turn["turn_index"], {"ttft": [], "latency": []})
+            if turn["ttft"] is not None:
+                bucket["ttft"].append(turn["ttft"])
+            if turn["latency"] is not None:
+                bucket["latency"].append(turn["latency"])
+
+    return {
+        turn_index: {
+            "count": max(len(values["ttft"]), len(values["latency"])),
+            "ttft": calculate_percentiles(values["ttft"]),
+            "latency": calculate_percentiles(values["latency"]),
+        }
+        for turn_index, values in sorted(by_turn.items())
+    }
+
+
+def compute_session_completion(sessions: Dict[str, List[Dict[str, Any]]]) -> List[float]:
+    """セッション完了時間（ms）の一覧
+
+    全turnのタイムスタンプがあれば「最後の終了 - 最初の開始」（turn間の待ち時間を含む）、
+    無ければ各turnの Request Latency の合計を使う。
+    """
+    durations = []
+    for session_turns in sessions.values():
+        starts = [t["start_ns"] for t in session_turns if t["start_ns"] is not None]
+        ends = [t["end_ns"] for t in session_turns if t["end_ns"] is not None]
+        if len(starts) == len(session_turns) and len(ends) == len(session_turns):
+            durations.append((max(ends) - min(starts)) / 1_000_000)
+        else:
+            latencies = [t["latency"] for t in session_turns if t["latency"] is not None]
+            if len(latencies) == len(session_turns):
+                durations.append(sum(latencies))
+    return durations
+
+
+def compute_context_ttft(sessions: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """累積文脈長（tokens）ごとの TTFT
+
+    AIPerfのmulti_turnは過去のturnを履歴としてmessagesに含めるが、
+    input_sequence_length が履歴を含むかはバージョンに依存するため、
+    ここでは「それまでのturnの入力+出力 + 現在のturnの入力」を文脈長とする。
+    文脈長は2のべき乗で区切ったバケットに集計し、最小二乗法で傾き（ms / 1k tokens）も求める。
+    """
+    points = []
+    for session_turns in sessions.values():
+        accumulated = 0.0
+        for turn in session_turns:
+            if turn["input_tokens"] is None:
+                break
+            context = accumulated + turn["input_tokens"]
+            if turn["ttft"] is not None:
+                points.append((context, turn["ttft"]))
+            accumulated = context + (turn["output_tokens"] or 0.0)
+
+    buckets: Dict[int, List[float]] = {}
+    for context, ttft in points:
+        lower = 2 ** int(math.log2(context)) if context >= 1 else 0
+        buckets.setdefault(lower, []).append(ttft)
+
+    result: Dict[str, Any] = {
+        "buckets": [
+            {"lower": lower, "upper": lower * 2 if lower else 1, "count": len(values),
+             "ttft": calculate_percentiles(values)}
+            for lower, values in sorted(buckets.items())
+        ],
+        "slope_ms_per_1k_tokens": None,
+    }
+
+    # TTFT = a + b * context の最小二乗フィット
+    if len(points) >= 2:
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_y = sum(y for _, y in points) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        if var_x > 0:
+            cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+            result["slope_ms_per_1k_tokens"] = cov / var_x * 1000
+    return result
+
+
+def analyze_sessions(data: List[Dict]) -> Optional[Dict[str, Any]]:
+    """セッション分析のまとめ（multi-turn でなければ None）"""
+    sessions = group_sessions(extract_turns(data))
+    if not is_multi_turn(sessions):
+        return None
+
+    completion = compute_session_completion(sessions)
+    return {
+        "session_count": len(sessions),
+        "turn_count": sum(len(t) for t in sessions.values()),
+        "turn_stats": compute_turn_stats(sessions),
+        "session_completion": calculate_percentiles(completion),
+        "session_completion_count": len(completion),
+        "context_ttft": compute_context_ttft(sessions),
+    }
+
+
+def format_session_markdown(analysis: Dict[str, Any]) -> List[str]:
+    """summary.md 用のセッション分析セクション"""
+    lines = [
+        "",
+        "## Multi-turn Sessions",
+        "",
+        f"**Sessions:** {analysis['session_count']} / **Turns:** {analysis['turn_count']}",
+        "",
+        "### Per-turn Latency",
+        "",
+        "| Turn | Count | TTFT p50 | TTFT p95 | TTFT p99 | Latency p50 | Latency p95 | Latency p99 |",
+        "|------|-------|----------|----------|----------|-------------|-------------|-------------|",
+    ]
+    for turn_index, stats in analysis["turn_stats"].items():
+        ttft, latency = stats["ttft"], stats["latency"]
+        lines.append(
+            f"| {turn_index} | {stats['count']} | {ttft['p50']:.2f} | {ttft['p95']:.2f} | {ttft['p99']:.2f} | "
+            f"{latency['p50']:.2f} | {latency['p95']:.2f} | {latency['p99']:.2f} |"
+        )
+
+    completion = analysis["session_completion"]
+    if analysis["session_completion_count"]:
+        lines.extend([
+            "",
+            "### Session Completion Time",
+            "",
+            "| p50 | p95 | p99 | Avg | Unit | Count |",
+            "|-----|-----|-----|-----|------|-------|",
+            f"| {completion['p50']:.2f} | {completion['p95']:.2f} | {completion['p99']:.2f} | "
+            f"{completion['avg']:.2f} | ms | {analysis['session_completion_count']} |",
+        ])
+
+    context = analysis["context_ttft"]
+    if context["buckets"]:
+        lines.extend([
+            "",
+            "### TTFT vs Accumulated Context",
+            "",
+            "| Context Tokens | Count | TTFT p50 | TTFT p95 | TTFT p99 |",
+            "|----------------|-------|----------|----------|----------|",
+        ])
+        for bucket in context["buckets"]:
+            ttft = bucket["ttft"]
+            lines.append(
+                f"| {bucket['lower']}-{bucket['upper'] - 1} | {bucket['count']} | "
+                f"{ttft['p50']:.2f} | {ttft['p95']:.2f} | {ttft['p99']:.2f} |"
+            )
+        if context["slope_ms_per_1k_tokens"] is not None:
+            lines.extend([
+                "",
+                f"TTFTの傾き: {context['slope_ms_per_1k_tokens']:.2f} ms / 1k context tokens"
+                "（KV/prefixの再利用が効いていれば、turnが進んでもTTFTの伸びは小さくなります）",
+            ])
+    return lines
@@ -2,15 +2,211 @@
 """
 Smoke test: OpenAI互換APIのストリーミング疎通確認
 1リクエストを送信して接続とストリーミング応答を確認する
+
+続けて、接続のフェーズ（DNS / TCP接続 / TLSハンドシェイク / レスポンスヘッダ / 最初のトークン）を
+個別に計測するプローブを SMOKE_PROBES 回ずつ、毎回新しい接続（cold）と keep-alive で再利用した接続で
+送信し、中央値を比較する。TTFT の悪化がネットワーク / プロキシ層によるものか、
+モデルサーバによるものかの切り分けに使う（SMOKE_PROBES=0 で無効化）。
+プローブは標準ライブラリのソケットで直接接続するため、HTTP(S)_PROXY は使わない。
 """
 
+import http.client
+import json
 import os
+import socket
+import ssl
+import statistics
 import sys
+import time
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
 from dotenv import load_dotenv
 
 # .envファイルの読み込み
 load_dotenv()
 
+DEFAULT_PROBES = 3
+PROBE_TIMEOUT_SEC = 30.0
+PROBE_MAX_TOKENS = 8
+
+# 表示するフェーズ（キー, 表示名）。connect 系は cold のみ
+PHASES = [
+    ("dns_ms", "DNS"),
+    ("tcp_ms", "TCP connect"),
+    ("tls_ms", "TLS handshake"),
+    ("headers_ms", "Response headers"),
+    ("first_token_ms", "First content token"),
+    ("ttft_ms", "TTFT (incl. connect)"),
+    ("total_ms", "Total"),
+]
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000.0
+
+
+def open_connection(endpoint: str, timeout: float = PROBE_TIMEOUT_SEC) -> Tuple[http.client.HTTPConnection, Dict[str, float]]:
+    """DNS → TCP → TLS を個別に計測しながら接続を確立する"""
+    parsed = urllib.parse.urlsplit(endpoint)
+    https = parsed.scheme == "https"
+    host = parsed.hostname or "localhost"
+    port = parsed.port or (443 if https else 80)
+    timings: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    family, socktype, proto, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+    timings["dns_ms"] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    sock = socket.socket(family, socktype, proto)
+    sock.settimeout(timeout)
+    # http.client はヘッダとボディを別々に送るため、Nagle と遅延ACKで再利用時に数十ms待たされないようにする
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    timings["tcp_ms"] = _elapsed_ms(start)
+
+    if https:
+        start = time.perf_counter()
+        sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        timings["tls_ms"] = _elapsed_ms(start)
+        conn: http.client.HTTPConnection = http.client.HTTPSConnection(host, port, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    # 確立済みのソケットを渡す（http.client は sock があれば connect しない）
+    conn.sock = sock
+    return conn, timings
+
+
+def stream_request(conn: http.client.HTTPConnection, endpoint: str, body: bytes, headers: Dict[str, str]) -> Dict[str, float]:
+    """ストリーミングリクエストを送り、ヘッダ受信・最初のトークン・完了までの時間を計測する
+
+    keep-alive で再利用できるよう、応答は最後まで読み切る。
+    """
+    path = urllib.parse.urlsplit(endpoint).path or "/"
+    start = time.perf_counter()
+    conn.request("POST", path, body=body, headers=headers)
+    response = conn.getresponse()
+    timings = {"headers_ms": _elapsed_ms(start)}
+    if response.status != 200:
+        detail = response.read()[:200].decode("utf-8", errors="replace")
+        raise RuntimeError(f"HTTP {response.status}: {detail}")
+
+    while True:
+        line = response.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
+        if "first_token_ms" in timings:
+            continue
+        try:
+            choices = json.loads(data).get("choices") or []
+        except json.JSONDecodeError:
+            continue
+        if choices and (choices[0].get("delta") or {}).get("content"):
+            timings["first_token_ms"] = _elapsed_ms(start)
+    response.read()
+    timings["total_ms"] = _elapsed_ms(start)
+    return timings
+
+
+def run_phase_probes(endpoint: str, model: str, api_key: str, probes: int) -> Dict[str, List[Dict[str, float]]]:
+    """cold（毎回新しい接続）と keep-alive（1本の接続を再利用）でそれぞれ probes 回計測する"""
+    body = json.dumps({
+        "model": model,
+        "messages": [{"role": "user", "content": "Hello! Please respond with a short message."}],
+        "stream": True,
+        "max_tokens": PROBE_MAX_TOKENS,
+    }).encode("utf-8")
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+
+    results: Dict[str, List[Dict[str, float]]] = {"cold": [], "keepalive": []}
+    for _ in range(probes):
+        conn, timings = open_connection(endpoint)
+        try:
+            timings.update(stream_request(conn, endpoint, body, headers))
+        finally:
+            conn.close()
+        # cold の TTFT / Total は接続確立の時間を含める（切断の時間は含めない）
+        connect_ms = timings["dns_ms"] + timings["tcp_ms"] + timings.get("tls_ms", 0.0)
+        timings["total_ms"] += connect_ms
+        if "first_token_ms" in timings:
+            timings["ttft_ms"] = connect_ms + timings["first_token_ms"]
+        results["cold"].append(timings)
+
+    # 1回目は接続確立を含むため計測に含めない
+    conn, _ = open_connection(endpoint)
+    try:
+        stream_request(conn, endpoint, body, headers)
+        for _ in range(probes):
+            sock = conn.sock
+            timings = stream_request(conn, endpoint, body, headers)
+            # サーバが接続を閉じた場合は http.client が張り直すため、再利用できたかを記録する
+            timings["reused"] = 1.0 if sock is not None and conn.sock is sock else 0.0
+            if "first_token_ms" in timings:
+                timings["ttft_ms"] = timings["first_token_ms"]
+            results["keepalive"].append(timings)
+    finally:
+        conn.close()
+    return results
+
+
+def median_phase(samples: List[Dict[str, float]], key: str) -> Optional[float]:
+    values = [s[key] for s in samples if key in s]
+    return statistics.median(values) if values else None
+
+
+def format_phase_report(results: Dict[str, List[Dict[str, float]]]) -> List[str]:
+    """フェーズごとの中央値の表と、接続確立のコスト・サーバ側の時間の内訳"""
+    def cell(value: Optional[float]) -> str:
+        return f"{value:10.2f}" if value is not None else f"{'-':>10}"
+
+    cold, keepalive = results["cold"], results["keepalive"]
+    lines = [
+        f"Connection phases (median of {len(cold)} probes, ms):",
+        f"  {'Phase':<22}{'Cold':>10}{'Keep-alive':>12}",
+    ]
+    for key, label in PHASES:
+        lines.append(f"  {label:<22}{cell(median_phase(cold, key))}  {cell(median_phase(keepalive, key))}")
+
+    reused = sum(1 for s in keepalive if s.get("reused"))
+    if keepalive and reused < len(keepalive):
+        lines.append(f"  ⚠ Keep-alive connection was reused for only {reused}/{len(keepalive)} probes (server closed it)")
+
+    cold_ttft, warm_ttft = median_phase(cold, "ttft_ms"), median_phase(keepalive, "ttft_ms")
+    if cold_ttft is not None and warm_ttft is not None:
+        lines.append(f"  Connection setup cost (cold TTFT - keep-alive TTFT): {cold_ttft - warm_ttft:.2f} ms")
+    headers, first = median_phase(keepalive, "headers_ms"), median_phase(keepalive, "first_token_ms")
+    if headers is not None and first is not None:
+        lines.append(
+            f"  Server side (keep-alive): {headers:.2f} ms until headers (network / proxy / queue), "
+            f"{first - headers:.2f} ms from headers to first token (model)"
+        )
+    return lines
+
+
+def parse_probe_count(value: str) -> int:
+    """SMOKE_PROBES の値（空なら0）。0以上の整数でなければ ValueError"""
+    value = value.strip()
+    if not value:
+        return 0
+    probes = int(value)
+    if probes < 0:
+        raise ValueError(f"negative probe count: {probes}")
+    return probes
+
+
 def main():
     # 環境変数の取得
     url = os.getenv("AIPERF_URL", "").strip().rstrip("/")
@@ -20,6 +216,14 @@ def main():
     if not model:
         print("Error: MODEL is not set in .env", file=sys.stderr)
         sys.exit(1)
+
+    # 設定の誤りは疎通確認の前に検出する（接続エラーのトラブルシューティングと混同しないように）
+    probes_env = os.getenv("SMOKE_PROBES", str(DEFAULT_PROBES))
+    try:
+        probes = parse_probe_count(probes_env)
+    except ValueError:
+        print(f"Error: SMOKE_PROBES must be a non-negative integer (got {probes_env!r})", file=sys.stderr)
+        sys.exit(1)
     
     # OpenAI APIを使用する場合（AIPERF_URLが空またはOpenAIのURLの場合）
     use_openai_api = not url or url == "https://api.openai.com/v1" or url == "https://api.openai.com"
@@ -94,6 +298,15 @@ def main():
         print(f"✓ Streaming completed successfully")
         print(f"  Tokens received: {token_count}")
         print(f"  Response length: {len(full_response)} chars")
+
+        # 接続フェーズごとの計測（失敗しても疎通確認自体は成功扱い）
+        if probes > 0:
+            print("-" * 60)
+            try:
+                for line in format_phase_report(run_phase_probes(endpoint, model, api_key, probes)):
+                    print(line)
+            except (OSError, http.client.HTTPException, RuntimeError) as e:
+                print(f"Warning: Connection phase probes failed: {type(e).__name__}: {e}", file=sys.stderr)
         print("\n✓ Smoke test passed!")
         return 0
         
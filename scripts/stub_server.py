@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+OpenAI互換 chat completions のローカルスタブサーバ（ゼロレイテンシ）
+
+推論を一切行わず、受け取ったリクエストに即座に固定トークンを返します。
+ベンチマーククライアント（AIPerf worker / SSEパース等）自身のオーバーヘッドを
+測定するキャリブレーション用途や、テスト用のローカルエンドポイントとして使用します。
+
+--rate-limit（件/秒）/ --token-rate-limit（トークン/秒）を指定すると、トークンバケットでレート制限を
+模擬し、超過したリクエストに OpenAI API と同様の 429（Retry-After / x-ratelimit-* ヘッダ付き）を返します。
+トークン数は入力（メッセージの単語数）+ max_tokens で数えます（OpenAI API も max_tokens を先に差し引く）。
+GET /metrics では vLLM と同じ名前の Prometheus メトリクス（実行中リクエスト数、
+同じプロンプトの再送を prefix cache ヒットとみなしたカウンタなど）を返します。
+prefix cache は最初のメッセージのハッシュを直近 PREFIX_CACHE_MAX_ENTRIES 件だけ LRU で覚えるため、
+長時間の実行でもメモリは増え続けません。
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+DEFAULT_OUTPUT_TOKENS = 16
+STUB_TOKEN_TEXT = " hi"
+
+
+class TokenBucket:
+    """レート制限の模擬（rate 件/秒で補充、最大 burst 件）
+
+    kind はヘッダ名（x-ratelimit-*-requests / x-ratelimit-*-tokens）と 429 の type に使う。
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, kind: str = "requests"):
+        self.rate = rate
+        self.kind = kind
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> Tuple[bool, float]:
+        """amount 件分を取得（戻り値: 取得できたか, amount 件が使えるまでの秒数）"""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True, 0.0
+            return False, (min(amount, self.burst) - self.tokens) / self.rate
+
+    def release(self, amount: float = 1.0):
+        """取得した分を戻す（後続の制限で拒否されたリクエストの分）"""
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + amount)
+
+    def headers(self, wait_sec: float = 0.0) -> Dict[str, str]:
+        """OpenAI API 形式のレート制限ヘッダ（limit は1分あたりの件数）"""
+        return {
+            f"x-ratelimit-limit-{self.kind}": str(int(self.rate * 60)),
+            f"x-ratelimit-remaining-{self.kind}": str(int(self.tokens)),
+            f"x-ratelimit-reset-{self.kind}": f"{max(1, int(wait_sec * 1000))}ms",
+        }
+
+
+class StubMetrics:
+    """/metrics で返す値（vLLM の名前に合わせる）"""
+
+    # KV cache 使用率の計算に使う、同時に処理できるとみなすリクエスト数
+    KV_CACHE_CAPACITY = 64
+    # prefix cache として覚えるプロンプト（最初のメッセージのハッシュ）の数。超えたら古いものから忘れる
+    PREFIX_CACHE_MAX_ENTRIES = 10_000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.requests_total = 0
+        self.prefix_cache_queries = 0
+        self.prefix_cache_hits = 0
+        self.seen_prompts: "OrderedDict[bytes, None]" = OrderedDict()
+
+    def start(self, payload: Dict):
+        messages = payload.get("messages") or []
+        # 受け取った JSON のキー順のまま比べる（同じクライアントの再送ならキー順も同じ）
+        prompt = json.dumps(messages[0], ensure_ascii=False) if messages else ""
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+        with self.lock:
+            self.running += 1
+            self.requests_total += 1
+            self.prefix_cache_queries += 1
+            if digest in self.seen_prompts:
+                self.prefix_cache_hits += 1
+                self.seen_prompts.move_to_end(digest)
+            else:
+                self.seen_prompts[digest] = None
+                if len(self.seen_prompts) > self.PREFIX_CACHE_MAX_ENTRIES:
+                    self.seen_prompts.popitem(last=False)
+
+    def finish(self):
+        with self.lock:
+            self.running -= 1
+
+    def render(self, model_name: str) -> str:
+        """Prometheus テキスト形式"""
+        with self.lock:
+            values = [
+                ("vllm:num_requests_running", "gauge", self.running),
+                ("vllm:num_requests_waiting", "gauge", 0),
+                ("vllm:kv_cache_usage_perc", "gauge", min(1.0, self.running / self.KV_CACHE_CAPACITY)),
+                ("vllm:prefix_cache_queries_total", "counter", self.prefix_cache_queries),
+                ("vllm:prefix_cache_hits_total", "counter", self.prefix_cache_hits),
+                ("vllm:request_success_total", "counter", self.requests_total - self.running),
+            ]
+        lines = []
+        for name, kind, value in values:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f'{name}{{model_name="{model_name}"}} {float(value)}')
+        return "\n".join(lines) + "\n"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """chat completions（ストリーミング / 非ストリーミング）と /v1/models を返すハンドラ"""
+
+    # keep-alive を有効にするため HTTP/1.1 で応答する（ストリーミングは chunked）
+    protocol_version = "HTTP/1.1"
+    # ヘッダとSSEのチャンクを別々に書くため、再利用した接続で Nagle と遅延ACKによる待ちが入らないようにする
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # noqa: A002
+        # リクエストごとのアクセスログは負荷測定のノイズになるため出力しない
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            body = {"object": "list", "data": [{"id": self.server.model_name, "object": "model"}]}
+            self._send_json(200, body)
+            return
+        if self.path.rstrip("/") == "/metrics":
+            data = self.server.metrics.render(self.server.model_name).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+            return
+
+        try:
+            payload = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        output_tokens = resolve_output_tokens(payload, self.server.default_output_tokens)
+
+        # リクエスト数 → トークン数の順に制限を確認（後の制限で拒否したら先に取得した分は戻す）
+        headers: Dict[str, str] = {}
+        acquired = []
+        for limiter, amount in [
+            (self.server.rate_limiter, 1.0),
+            (self.server.token_rate_limiter, float(count_prompt_tokens(payload) + output_tokens)),
+        ]:
+            if limiter is None:
+                continue
+            allowed, wait_sec = limiter.try_acquire(amount)
+            headers.update(limiter.headers(wait_sec))
+            if not allowed:
+                for acquired_limiter, acquired_amount in acquired:
+                    acquired_limiter.release(acquired_amount)
+                headers["Retry-After"] = str(max(1, math.ceil(wait_sec)))
+                headers["retry-after-ms"] = str(max(1, int(wait_sec * 1000)))
+                body = {"error": {"message": f"Rate limit reached for {limiter.kind}", "type": limiter.kind,
+                                  "code": "rate_limit_exceeded"}}
+                self._send_json(429, body, headers)
+                return
+            acquired.append((limiter, amount))
+
+        model = payload.get("model") or self.server.model_name
+
+        self.server.metrics.start(payload)
+        try:
+            if payload.get("stream"):
+                self._send_stream(model, output_tokens, headers)
+            else:
+                self._send_json(200, build_completion(model, output_tokens), headers)
+        finally:
+            self.server.metrics.finish()
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, output_tokens: int, headers: Optional[Dict[str, str]] = None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        for event in iter_stream_events(model, output_tokens):
+            data = f"data: {event}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def resolve_output_tokens(payload: Dict, default: int) -> int:
+    """リクエストの max_completion_tokens / max_tokens から返すトークン数を決める"""
+    for key in ("max_completion_tokens", "max_tokens"):
+        value = payload.get(key)
+        if isinstance(value, int) and value > 0:
+            return value
+    return default
+
+
+def count_prompt_tokens(payload: Dict) -> int:
+    """メッセージの入力トークン数の近似（空白区切りの単語数）"""
+    count = 0
+    for message in payload.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            count += len(content.split())
+    return count
+
+
+def build_completion(model: str, output_tokens: int) -> Dict:
+    """非ストリーミング応答を生成"""
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_TOKEN_TEXT * output_tokens},
+                "finish_reason": "length",
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": output_tokens, "total_tokens": output_tokens},
+    }
+
+
+def iter_stream_events(model: str, output_tokens: int):
+    """SSEの data 行に載せるJSON文字列を順に返す（最後は [DONE]）"""
+    created = int(time.time())
+    base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model}
+
+    first = dict(base, choices=[{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+    yield json.dumps(first)
+    for _ in range(output_tokens):
+        chunk = dict(base, choices=[{"index": 0, "delta": {"content": STUB_TOKEN_TEXT}, "finish_reason": None}])
+        yield json.dumps(chunk)
+    last = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "length"}])
+    yield json.dumps(last)
+    yield "[DONE]"
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    output_tokens: int = DEFAULT_OUTPUT_TOKENS,
+    model_name: str = "stub-model",
+    rate_limit: Optional[float] = None,
+    rate_limit_burst: Optional[float] = None,
+    token_rate_limit: Optional[float] = None,
+    token_rate_limit_burst: Optional[float] = None,
+) -> ThreadingHTTPServer:
+    """スタブサーバを生成（port=0 の場合は空きポートを自動割り当て）
+
+    rate_limit（件/秒）/ token_rate_limit（トークン/秒）を指定すると、超過したリクエストに 429 を返す。
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.default_output_tokens = output_tokens
+    server.model_name = model_name
+    server.rate_limiter = TokenBucket(rate_limit, rate_limit_burst) if rate_limit else None
+    server.token_rate_limiter = (
+        TokenBucket(token_rate_limit, token_rate_limit_burst, kind="tokens") if token_rate_limit else None
+    )
+    server.metrics = StubMetrics()
+    return server
+
+
+def start_in_thread(server: ThreadingHTTPServer) -> Tuple[threading.Thread, str]:
+    """バックグラウンドスレッドでサーバを起動し、ベースURLを返す"""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return thread, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI互換のゼロレイテンシ・スタブサーバ")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けアドレス（デフォルト: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8000, help="待ち受けポート（デフォルト: 8000）")
+    parser.add_argument(
+        "--output-tokens",
+        type=int,
+        default=DEFAULT_OUTPUT_TOKENS,
+        help=f"max_tokens 未指定時に返すトークン数（デフォルト: {DEFAULT_OUTPUT_TOKENS}）",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="レート制限（件/秒）。超過したリクエストに 429 を返す（デフォルト: 無効）",
+    )
+    parser.add_argument("--rate-limit-burst", type=float, default=None, help="レート制限のバースト（デフォルト: rate と同じ）")
+    parser.add_argument(
+        "--token-rate-limit",
+        type=float,
+        default=None,
+        help="トークン数のレート制限（トークン/秒、入力の単語数 + max_tokens で数える）（デフォルト: 無効）",
+    )
+    parser.add_argument("--token-rate-limit-burst", type=float, default=None,
+                        help="トークン数のレート制限のバースト（デフォルト: rate と同じ）")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port, args.output_tokens,
+        rate_limit=args.rate_limit, rate_limit_burst=args.rate_limit_burst,
+        token_rate_limit=args.token_rate_limit, token_rate_limit_burst=args.token_rate_limit_burst,
+    )
+    host, port = server.server_address[:2]
+    print(f"Stub server listening on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
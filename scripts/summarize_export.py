@@ -3,13 +3,50 @@
 AIPerfのexport結果からp50/p95/p99を算出してTSVサマリを生成
 """
 
+import argparse
 import json
 import os
+import re
 import sys
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
 import statistics
 
+from adaptive_pacing import load_pacing_result
+from concurrency_analysis import analyze_concurrency, format_concurrency_markdown
+from export_records import (
+    ERROR_CATEGORIES,
+    calculate_percentiles,
+    classify_error,
+    count_errors,
+    extract_metric_values,
+    extract_request_span_ns,
+    extract_request_spans,
+    extract_tokens_per_sec,
+    get_record_value,
+    is_error_record,
+    summarize_errors,
+)
+from metrics_export import build_run_summary, write_metrics_exports
+from phase_analysis import analyze_phases, format_phase_markdown
+from resource_sampler import (
+    format_resource_markdown,
+    load_resource_host,
+    load_resource_samples,
+    summarize_resource_samples,
+)
+from run_history import DEFAULT_DB_PATH, build_sketch, connect, record_run
+from run_meta import load_run_meta
+from server_metrics import analyze_server_metrics, format_server_metrics_markdown, load_server_metrics
+from session_analysis import analyze_sessions, format_session_markdown
+from timeseries_export import export_timeseries
+
+# キャリブレーション結果（calibrate_client.py が生成）のファイル名
+CALIBRATION_FILE_NAME = "client_calibration.json"
+
+# archive_export.py が作成する列指向アーカイブ（優先順）
+ARCHIVE_FILE_NAMES = ["profile_export.parquet", "profile_export.npz"]
+
 def find_latest_artifact_dir() -> Optional[Path]:
     """最新のartifactディレクトリを探す"""
     artifacts_dir = Path("artifacts")
@@ -18,7 +55,11 @@ def find_latest_artifact_dir() -> Optional[Path]:
         return None
     
     # サブディレクトリを取得して最新のものを選択
-    subdirs = [d for d in artifacts_dir.iterdir() if d.is_dir()]
+    # （キャリブレーション実行の結果はサーバの測定結果ではないため対象外）
+    subdirs = [
+        d for d in artifacts_dir.iterdir()
+        if d.is_dir() and not d.name.startswith("calibration_")
+    ]
     if not subdirs:
         print("Error: No artifact subdirectories found", file=sys.stderr)
         return None
@@ -27,10 +68,15 @@ def find_latest_artifact_dir() -> Optional[Path]:
     subdirs.sort(key=lambda x: x.stat().st_mtime, reverse=True)
     return subdirs[0]
 
-def find_export_files(artifact_dir: Path) -> List[Path]:
-    """exportファイルを探す（profile_export.jsonl または profile_export*.json）"""
+def find_export_files(artifact_dir: Path, include_archives: bool = True) -> List[Path]:
+    """exportファイルを探す（profile_export.jsonl または profile_export*.json）
+
+    archive_export.py で作成した列指向アーカイブ（profile_export.parquet / .npz）は、
+    元のexportが無いか、元のexportより新しい（更新時刻が同じかそれ以降）場合だけアーカイブのみを返す。
+    アーカイブ作成後に同じディレクトリへ再実行した場合は、古いアーカイブを警告して元のexportを読む。
+    """
     export_files = []
-    
+
     # profile_export.jsonl を探す
     jsonl_file = artifact_dir / "profile_export.jsonl"
     if jsonl_file.exists():
@@ -39,6 +85,21 @@ def find_export_files(artifact_dir: Path) -> List[Path]:
     # profile_export*.json を探す
     for json_file in artifact_dir.glob("profile_export*.json"):
         export_files.append(json_file)
+
+    if include_archives:
+        for archive_name in ARCHIVE_FILE_NAMES:
+            archive_file = artifact_dir / archive_name
+            if not archive_file.exists():
+                continue
+            newest_source = max((f.stat().st_mtime for f in export_files), default=None)
+            if newest_source is None or archive_file.stat().st_mtime >= newest_source:
+                return [archive_file]
+            print(
+                f"Warning: {archive_file} is older than the exports in {artifact_dir}; "
+                "reading the exports instead (re-run archive_export.py to refresh it)",
+                file=sys.stderr,
+            )
+            break
     
     return export_files
 
@@ -49,7 +110,12 @@ def load_export_data(export_files: List[Path]) -> List[Dict]:
     for export_file in export_files:
         print(f"Loading: {export_file}", file=sys.stderr)
         
-        if export_file.suffix == ".jsonl":
+        if export_file.suffix in (".parquet", ".npz"):
+            # 列指向アーカイブ（archive_export.py）
+            from archive_export import read_archive
+
+            all_data.extend(read_archive(export_file))
+        elif export_file.suffix == ".jsonl":
             # JSONL形式（1行1JSON）
             with open(export_file, "r", encoding="utf-8") as f:
                 for line in f:
@@ -75,171 +141,181 @@ def load_export_data(export_files: List[Path]) -> List[Dict]:
     
     return all_data
 
-def extract_metric_values(data: List[Dict], metric_name: str) -> List[float]:
-    """指定されたメトリクスの値を抽出（ms単位に変換）"""
-    values = []
-    
-    for record in data:
-        # 様々な可能性のあるフィールド名を試す
-        value = None
-        
-        # AIPerfのexport形式: metrics.time_to_first_token など
-        if "metrics" in record and isinstance(record["metrics"], dict):
-            metrics = record["metrics"]
-            if metric_name in metrics:
-                value = metrics[metric_name]
-        
-        # 直接フィールド
-        if value is None and metric_name in record:
-            value = record[metric_name]
-        
-        # 別名（例: ttft, latency）
-        if value is None and metric_name == "time_to_first_token":
-            for alt_name in ["ttft", "time_to_first_token_ms", "first_token_latency", "time_to_first_output_token"]:
-                if "metrics" in record and isinstance(record["metrics"], dict) and alt_name in record["metrics"]:
-                    value = record["metrics"][alt_name]
-                    break
-                elif alt_name in record:
-                    value = record[alt_name]
-                    break
-        elif value is None and metric_name == "request_latency":
-            for alt_name in ["latency", "request_latency_ms", "end_to_end_latency", "e2e_latency"]:
-                if "metrics" in record and isinstance(record["metrics"], dict) and alt_name in record["metrics"]:
-                    value = record["metrics"][alt_name]
-                    break
-                elif alt_name in record:
-                    value = record[alt_name]
-                    break
-        elif value is None and metric_name == "inter_token_latency":
-            for alt_name in ["itl", "inter_token_latency_ms", "token_latency", "inter_chunk_latency"]:
-                if "metrics" in record and isinstance(record["metrics"], dict) and alt_name in record["metrics"]:
-                    value = record["metrics"][alt_name]
-                    break
-                elif alt_name in record:
-                    value = record[alt_name]
-                    break
-        
-        if value is not None:
-            # AIPerfのexport形式: {'value': 458.1325, 'unit': 'ms'} のような辞書形式
-            if isinstance(value, dict):
-                if "value" in value:
-                    value = value["value"]
-                else:
-                    continue  # 辞書形式だがvalueキーがない場合はスキップ
-            
-            # 値の単位を変換（AIPerfのexportは既にms単位で出力される）
-            if isinstance(value, (int, float)):
-                # AIPerfのexportは通常ms単位なので、そのまま使用
-                # ただし、異常に大きい値（ナノ秒）や小さい値（秒）の場合は変換
-                # ナノ秒単位の可能性をチェック（非常に大きい値、例: 1秒 = 1,000,000,000ns）
-                if value > 1_000_000_000:
-                    value = value / 1_000_000  # ナノ秒→ms
-                # 秒単位の可能性（1未満の値、例: 0.5秒）
-                elif value < 1:
-                    value = value * 1000  # 秒→ms
-                # それ以外はms単位と仮定（1以上1,000,000,000未満）
-                values.append(float(value))
-    
-    return values
+def parse_run_params(artifact_dir: Path) -> Dict[str, Any]:
+    """artifactディレクトリ名（例: sweep_10_ISL100_OSL200_CON10）から実行条件を読み取る"""
+    name = artifact_dir.name
+    match = re.search(r"ISL(\d+)_OSL(\d+)_CON(\d+)$", name)
+    if not match:
+        return {"mode": name}
 
-def calculate_percentiles(values: List[float]) -> Dict[str, float]:
-    """パーセンタイルを計算"""
-    if not values:
-        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "avg": 0.0}
-    
-    sorted_values = sorted(values)
-    n = len(sorted_values)
-    
-    def percentile(p: float) -> float:
-        if n == 0:
-            return 0.0
-        k = (n - 1) * p
-        f = int(k)
-        c = k - f
-        if f + 1 < n:
-            return sorted_values[f] * (1 - c) + sorted_values[f + 1] * c
-        return sorted_values[f]
-    
+    prefix = name[: match.start()].rstrip("_")
     return {
-        "p50": percentile(0.50),
-        "p95": percentile(0.95),
-        "p99": percentile(0.99),
-        "avg": statistics.mean(sorted_values) if sorted_values else 0.0,
+        "mode": prefix or "profile",
+        "isl": int(match.group(1)),
+        "osl": int(match.group(2)),
+        "concurrency": int(match.group(3)),
     }
 
-def count_errors(data: List[Dict]) -> int:
-    """エラー数をカウント"""
-    error_count = 0
-    for record in data:
-        # 様々なエラー判定方法
-        if "error" in record and record["error"]:
-            error_count += 1
-        elif "status" in record and record["status"] != "success":
-            error_count += 1
-        elif "success" in record and not record["success"]:
-            error_count += 1
-    return error_count
-
-
-def extract_tokens_per_sec(data: List[Dict]) -> List[float]:
-    """各リクエストの output tokens/sec を計算"""
-    values = []
-
-    for record in data:
-        token_count = None
-        latency_ms = None
-
-        # token_count を探す（フィールド名の候補リスト）
-        token_fields = [
-            "token_count", "output_token_count", "output_tokens",
-            "completion_tokens", "generated_tokens", "output_sequence_length"
-        ]
-        for field in token_fields:
-            # 直接フィールド
-            if field in record and record[field] is not None:
-                token_count = record[field]
-                break
-            # metrics 辞書内
-            if "metrics" in record and isinstance(record["metrics"], dict):
-                if field in record["metrics"] and record["metrics"][field] is not None:
-                    token_count = record["metrics"][field]
-                    break
-
-        # request_latency_ms を探す（フィールド名の候補リスト）
-        latency_fields = [
-            "request_latency_ms", "request_latency", "latency", "e2e_latency"
-        ]
-        for field in latency_fields:
-            # 直接フィールド
-            if field in record and record[field] is not None:
-                latency_ms = record[field]
-                break
-            # metrics 辞書内
-            if "metrics" in record and isinstance(record["metrics"], dict):
-                if field in record["metrics"] and record["metrics"][field] is not None:
-                    latency_ms = record["metrics"][field]
-                    break
-
-        # 両方の値が取得できた場合のみ計算
-        if token_count is not None and latency_ms is not None:
-            # 辞書形式の場合は value を取得
-            if isinstance(token_count, dict) and "value" in token_count:
-                token_count = token_count["value"]
-            if isinstance(latency_ms, dict) and "value" in latency_ms:
-                latency_ms = latency_ms["value"]
-
-            if isinstance(token_count, (int, float)) and isinstance(latency_ms, (int, float)):
-                if latency_ms > 0:
-                    # latency_ms を秒に変換して tokens/sec を計算
-                    latency_sec = latency_ms / 1000.0
-                    tokens_per_sec = token_count / latency_sec
-                    values.append(tokens_per_sec)
-
-    return values
-
-def main():
-    # 最新のartifactディレクトリを探す
-    artifact_dir = find_latest_artifact_dir()
+
+def load_client_calibration(artifact_dir: Path) -> Optional[Dict[str, Any]]:
+    """artifacts/client_calibration.json から該当concurrencyのキャリブレーション結果を探す
+
+    同じconcurrencyの結果が無い場合は、最も近いconcurrencyの結果を返す。
+    """
+    calibration_file = artifact_dir.parent / CALIBRATION_FILE_NAME
+    concurrency = parse_run_params(artifact_dir).get("concurrency")
+    if concurrency is None or not calibration_file.exists():
+        return None
+
+    try:
+        with open(calibration_file, "r", encoding="utf-8") as f:
+            calibration = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Failed to read {calibration_file}: {e}", file=sys.stderr)
+        return None
+
+    by_concurrency = calibration.get("concurrency", {})
+    if not by_concurrency:
+        return None
+    nearest = min(by_concurrency, key=lambda c: abs(int(c) - concurrency))
+    result = dict(by_concurrency[nearest])
+    result["concurrency"] = int(nearest)
+    return result
+
+
+def format_calibration_rows(calibration: Dict[str, Any]) -> List[Tuple[str, Dict[str, float], str]]:
+    """キャリブレーション結果をサマリ行（表示名, 統計値, 単位）に変換"""
+    rows = []
+    for key, display_name in [
+        ("ttft", "Client Floor TTFT"),
+        ("request_latency", "Client Floor Request Latency"),
+        ("inter_token_latency", "Client Floor Inter-Token Latency"),
+    ]:
+        stats = calibration.get(key)
+        if stats:
+            rows.append((display_name, stats, "ms"))
+    return rows
+
+
+def format_pacing_markdown(pacing: Dict[str, Any]) -> List[str]:
+    """summary.md 用のペーシング（pacing.json）セクション"""
+    def fmt_rate(value: Optional[float]) -> str:
+        return f"{value:.2f} req/s" if value is not None else "N/A"
+
+    return [
+        "",
+        "## Adaptive Pacing",
+        "",
+        "本番実行の前に AIMD で探した、429 が出ない持続可能なリクエストレート（プローブ後半に実際に成功した件数 / 秒）です。",
+        "",
+        f"- **Sustainable Rate:** {fmt_rate(pacing.get('sustainable_rate'))}",
+        f"- **Request Rate (used for the run):** {fmt_rate(pacing.get('request_rate'))}",
+        f"- **Rate Limit from Headers:** {fmt_rate(pacing.get('header_max_rate'))}",
+        f"- **Token Rate Limit from Headers:** {fmt_rate(pacing.get('header_token_max_rate'))}"
+        + (f"（{pacing['tokens_per_request']:.0f} tokens / request）" if pacing.get("tokens_per_request") else ""),
+        f"- **Probe Results:** OK={pacing.get('total_ok', 0)}, 429={pacing.get('total_rate_limited', 0)}, "
+        f"errors={pacing.get('total_errors', 0)}, skipped={pacing.get('total_skipped', 0)}",
+    ]
+
+
+def build_history_entry(
+    artifact_dir: Path,
+    export_files: List[Path],
+    record_count: int,
+    error_count: int,
+) -> Dict[str, Any]:
+    """実行履歴DBに記録する実行条件を組み立てる
+
+    run_meta.json（run_aiperf_profile.sh が記録）があればそれを使い、
+    無い場合はディレクトリ名とexportファイルの更新時刻で補う。
+    """
+    entry: Dict[str, Any] = dict(parse_run_params(artifact_dir))
+    meta = load_run_meta(artifact_dir) or {}
+    for key in ("mode", "model", "url", "isl", "osl", "concurrency", "dataset_hash", "git_revision"):
+        if meta.get(key) is not None:
+            entry[key] = meta[key]
+
+    run_at = meta.get("started_at_epoch")
+    if run_at is None:
+        run_at = max(f.stat().st_mtime for f in export_files)
+
+    entry.update({
+        "artifact_dir": str(artifact_dir),
+        "run_at": float(run_at),
+        "record_count": record_count,
+        "error_count": error_count,
+    })
+    return entry
+
+
+def record_run_history(
+    db_path: str,
+    artifact_dir: Path,
+    export_files: List[Path],
+    record_count: int,
+    error_count: int,
+    metric_results: Dict[str, Tuple[List[float], str]],
+) -> int:
+    """算出済みの統計値とスケッチを実行履歴DBに記録"""
+    metrics = {}
+    for display_name, (values, unit) in metric_results.items():
+        stats: Dict[str, Any] = dict(calculate_percentiles(values))
+        stats.update({"unit": unit, "count": len(values), "sketch": build_sketch(values)})
+        metrics[display_name] = stats
+
+    conn = connect(db_path)
+    try:
+        return record_run(
+            conn, build_history_entry(artifact_dir, export_files, record_count, error_count), metrics
+        )
+    finally:
+        conn.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AIPerfのexport結果からサマリ（TSV/Markdown）を生成")
+    parser.add_argument(
+        "artifact_dir",
+        nargs="?",
+        help="対象のartifactディレクトリ（省略時は artifacts/ 配下の最新ディレクトリ）",
+    )
+    parser.add_argument(
+        "--history-db",
+        default=os.getenv("RUN_HISTORY_DB", DEFAULT_DB_PATH),
+        help=f"実行履歴DBのパス（デフォルト: {DEFAULT_DB_PATH}）",
+    )
+    parser.add_argument("--no-history", action="store_true", help="実行履歴DBに記録しない")
+    parser.add_argument(
+        "--timeseries-format",
+        choices=["csv", "jsonl", "none"],
+        default="csv",
+        help="秒単位の時系列の出力形式（デフォルト: csv、none で出力しない）",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=["all", "openmetrics", "json", "none"],
+        default="all",
+        help="ダッシュボード向けの機械可読サマリ（summary.prom / summary.json）の出力形式（デフォルト: all）",
+    )
+    parser.add_argument(
+        "--textfile-dir",
+        default=os.getenv("PROMETHEUS_TEXTFILE_DIR", ""),
+        help="node_exporter の textfile collector のディレクトリ（指定するとそこにも .prom を書く）",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    # 対象のartifactディレクトリ（未指定なら最新のものを探す）
+    if args.artifact_dir:
+        artifact_dir = Path(args.artifact_dir)
+        if not artifact_dir.is_dir():
+            print(f"Error: {artifact_dir} is not a directory", file=sys.stderr)
+            sys.exit(1)
+    else:
+        artifact_dir = find_latest_artifact_dir()
     if not artifact_dir:
         sys.exit(1)
     
@@ -267,18 +343,36 @@ def main():
     ]
 
     # TSV出力
-    tsv_lines = ["metric\tp50\tp95\tp99\tavg\tunit\tcount\terrors"]
+    # errors / error_rate は、その行の計算に含まれるエラーリクエストの件数と全リクエストに対する割合（%）
+    # （成功したリクエストのみで算出する行は 0、"(all requests)" 行は全エラー、"Error: ..." 行は分類の件数）
+    tsv_lines = ["metric\tp50\tp95\tp99\tavg\tunit\tcount\terrors\terror_rate"]
     error_count = count_errors(data)
 
+    def error_columns(errors: int) -> str:
+        return f"{errors}\t{errors / len(data) * 100:.2f}"
+
+    # パーセンタイルは成功したリクエストのみで算出する（即座に返る429などが p50 を良く見せないように）
+    success_data = [record for record in data if not is_error_record(record)]
+
+    # 算出した値（表示名 → (値の一覧, 単位)）。Markdown出力と実行履歴の記録で使う
+    metric_results: Dict[str, Tuple[List[float], str]] = {}
+    # エラーも含めた全リクエストの値（エラーがメトリクスを持つ場合のみ）
+    all_request_results: Dict[str, List[float]] = {}
+
     # Latency系メトリクスを処理
     for metric_name, display_name in latency_metrics:
-        values = extract_metric_values(data, metric_name)
+        values = extract_metric_values(success_data, metric_name)
+        if error_count:
+            all_values = extract_metric_values(data, metric_name)
+            if len(all_values) > len(values):
+                all_request_results[display_name] = all_values
 
         if not values:
             print(f"Warning: No values found for {metric_name}", file=sys.stderr)
             continue
 
         stats = calculate_percentiles(values)
+        metric_results[display_name] = (values, "ms")
 
         tsv_lines.append(
             f"{display_name}\t"
@@ -288,14 +382,28 @@ def main():
             f"{stats['avg']:.2f}\t"
             f"ms\t"
             f"{len(values)}\t"
-            f"{error_count}"
+            f"{error_columns(0)}"
+        )
+
+    for display_name, values in all_request_results.items():
+        stats = calculate_percentiles(values)
+        tsv_lines.append(
+            f"{display_name} (all requests)\t"
+            f"{stats['p50']:.2f}\t"
+            f"{stats['p95']:.2f}\t"
+            f"{stats['p99']:.2f}\t"
+            f"{stats['avg']:.2f}\t"
+            f"ms\t"
+            f"{len(values)}\t"
+            f"{error_columns(error_count)}"
         )
 
     # Throughput: Output Tokens/sec を処理（avg のみ、p50/p95/p99 は N/A）
     # 注: tokens/sec はシステム全体のスループットを表すため、パーセンタイルは意味をなさない
-    tps_values = extract_tokens_per_sec(data)
+    tps_values = extract_tokens_per_sec(success_data)
     if tps_values:
         tps_avg = statistics.mean(tps_values)
+        metric_results["Output Tokens/sec"] = (tps_values, "tokens/s")
         tsv_lines.append(
             f"Output Tokens/sec\t"
             f"N/A\t"
@@ -304,10 +412,107 @@ def main():
             f"{tps_avg:.2f}\t"
             f"tokens/s\t"
             f"{len(tps_values)}\t"
-            f"{error_count}"
+            f"{error_columns(0)}"
         )
     else:
         print("Warning: No values found for tokens/sec (missing token_count or request_latency)", file=sys.stderr)
+
+    # エラー分類ごとの件数・割合・request latency（latency が無い分類は N/A）
+    error_summary = summarize_errors(data)
+    error_labels = dict(ERROR_CATEGORIES)
+    for category, summary in error_summary.items():
+        latency = summary["latency"]
+        stats_columns = (
+            f"{latency['p50']:.2f}\t{latency['p95']:.2f}\t{latency['p99']:.2f}\t{latency['avg']:.2f}"
+            if latency else "N/A\tN/A\tN/A\tN/A"
+        )
+        tsv_lines.append(
+            f"Error: {error_labels[category]}\t"
+            f"{stats_columns}\t"
+            f"ms\t"
+            f"{summary['count']}\t"
+            f"{error_columns(summary['count'])}"
+        )
+
+    # 実際に達成された並行度（設定値を保てていたか）
+    configured_concurrency = (
+        (load_run_meta(artifact_dir) or {}).get("concurrency")
+        or parse_run_params(artifact_dir).get("concurrency")
+    )
+    concurrency_analysis = analyze_concurrency(data, configured_concurrency)
+    if concurrency_analysis:
+        achieved = concurrency_analysis["steady"] or concurrency_analysis["overall"]
+        tsv_lines.append(
+            f"Achieved Concurrency\t"
+            f"{achieved['p50']:.2f}\t"
+            f"{achieved['p95']:.2f}\t"
+            f"{achieved['p99']:.2f}\t"
+            f"{achieved['mean']:.2f}\t"
+            f"requests\t"
+            f"{concurrency_analysis['request_count']}\t"
+            f"{error_columns(error_count)}"
+        )
+        if concurrency_analysis["saturated"]:
+            print(
+                f"Warning: Achieved concurrency {achieved['mean']:.2f} is well below the configured "
+                f"{configured_concurrency} (client saturation?)",
+                file=sys.stderr,
+            )
+
+    # prefill / decode の分解（リクエストごとのスループットと TTFT の律速判定）
+    phase_analysis = analyze_phases(success_data, configured_concurrency)
+    if phase_analysis:
+        for display_name, key in [("Prefill Tokens/sec", "prefill_tps"), ("Decode Tokens/sec", "decode_tps")]:
+            stats = phase_analysis[key]
+            if not stats:
+                continue
+            metric_results[display_name] = (phase_analysis[f"{key}_values"], "tokens/s")
+            tsv_lines.append(
+                f"{display_name}\t"
+                f"{stats['p50']:.2f}\t"
+                f"{stats['p95']:.2f}\t"
+                f"{stats['p99']:.2f}\t"
+                f"{stats['avg']:.2f}\t"
+                f"tokens/s\t"
+                f"{stats['count']}\t"
+                f"{error_columns(0)}"
+            )
+        tsv_lines.append(
+            f"Prefill Share\t"
+            f"N/A\t"
+            f"N/A\t"
+            f"N/A\t"
+            f"{phase_analysis['prefill_share'] * 100:.2f}\t"
+            f"%\t"
+            f"{phase_analysis['request_count']}\t"
+            f"{error_columns(0)}"
+        )
+
+    # クライアント側オーバーヘッド（キャリブレーション結果）を実測値の隣に並べる
+    calibration = load_client_calibration(artifact_dir)
+    calibration_rows = format_calibration_rows(calibration) if calibration else []
+    for display_name, stats, unit in calibration_rows:
+        tsv_lines.append(
+            f"{display_name}\t"
+            f"{stats['p50']:.2f}\t"
+            f"{stats['p95']:.2f}\t"
+            f"{stats['p99']:.2f}\t"
+            f"{stats['avg']:.2f}\t"
+            f"{unit}\t"
+            f"{stats.get('count', 0)}\t"
+            f"N/A\tN/A"
+        )
+    if calibration and calibration.get("max_request_rate"):
+        tsv_lines.append(
+            f"Client Max Request Rate\t"
+            f"N/A\t"
+            f"N/A\t"
+            f"N/A\t"
+            f"{calibration['max_request_rate']:.2f}\t"
+            f"req/s\t"
+            f"{calibration.get('request_count', 0)}\t"
+            f"N/A\tN/A"
+        )
     
     # TSVファイルに書き出し
     tsv_content = "\n".join(tsv_lines)
@@ -335,27 +540,151 @@ def main():
     ]
 
     # Latency系メトリクス
-    for metric_name, display_name in latency_metrics:
-        values = extract_metric_values(data, metric_name)
-        if values:
-            stats = calculate_percentiles(values)
-            md_lines.append(
-                f"| {display_name} | {stats['p50']:.2f} | {stats['p95']:.2f} | "
-                f"{stats['p99']:.2f} | {stats['avg']:.2f} | ms | {len(values)} | {error_count} |"
-            )
+    for display_name, (values, unit) in metric_results.items():
+        if unit != "ms":
+            continue
+        stats = calculate_percentiles(values)
+        md_lines.append(
+            f"| {display_name} | {stats['p50']:.2f} | {stats['p95']:.2f} | "
+            f"{stats['p99']:.2f} | {stats['avg']:.2f} | ms | {len(values)} | 0 |"
+        )
 
     # Throughput: Output Tokens/sec（avg のみ）
     if tps_values:
         md_lines.append(
             f"| Output Tokens/sec | N/A | N/A | "
-            f"N/A | {tps_avg:.2f} | tokens/s | {len(tps_values)} | {error_count} |"
+            f"N/A | {tps_avg:.2f} | tokens/s | {len(tps_values)} | 0 |"
+        )
+
+    # 全リクエスト（エラー含む）のパーセンタイル
+    for display_name, values in all_request_results.items():
+        stats = calculate_percentiles(values)
+        md_lines.append(
+            f"| {display_name} (all requests) | {stats['p50']:.2f} | {stats['p95']:.2f} | "
+            f"{stats['p99']:.2f} | {stats['avg']:.2f} | ms | {len(values)} | {error_count} |"
         )
 
+    if error_count:
+        md_lines.extend([
+            "",
+            "Latency / Output Tokens/sec は成功したリクエストのみで算出しています"
+            "（エラーを含む値は \"(all requests)\" の行）。Errors 列はその行に含まれるエラーの件数です。",
+        ])
+
+    # エラー分類
+    if error_summary:
+        md_lines.extend([
+            "",
+            "## Errors",
+            "",
+            f"**Total Errors:** {error_count} / {len(data)} ({error_count / len(data) * 100:.2f}%)",
+            "",
+            "| Category | Count | Rate | Latency p50 | Latency p95 | Latency p99 | Latency Avg |",
+            "|----------|-------|------|-------------|-------------|-------------|-------------|",
+        ])
+        for category, summary in error_summary.items():
+            latency = summary["latency"]
+            latency_columns = (
+                f"{latency['p50']:.2f} | {latency['p95']:.2f} | {latency['p99']:.2f} | {latency['avg']:.2f}"
+                if latency else "N/A | N/A | N/A | N/A"
+            )
+            md_lines.append(
+                f"| {error_labels[category]} | {summary['count']} | {summary['rate'] * 100:.2f}% | {latency_columns} |"
+            )
+
+    # 達成並行度
+    if concurrency_analysis:
+        md_lines.extend(format_concurrency_markdown(concurrency_analysis))
+
+    # prefill / decode の分解
+    if phase_analysis:
+        md_lines.extend(format_phase_markdown(phase_analysis))
+
+    # クライアント側オーバーヘッド（キャリブレーション結果）
+    if calibration:
+        md_lines.extend([
+            "",
+            "## Client Overhead (Calibration)",
+            "",
+            f"ゼロレイテンシのスタブサーバに対して CON={calibration['concurrency']} で測定したクライアント自身の下限値です。"
+            "実測値がこの値に近い場合、サーバではなくクライアント側が飽和しています。",
+            "",
+            "| Metric | p50 | p95 | p99 | Avg | Unit | Count |",
+            "|--------|-----|-----|-----|-----|------|-------|",
+        ])
+        for display_name, stats, unit in calibration_rows:
+            md_lines.append(
+                f"| {display_name} | {stats['p50']:.2f} | {stats['p95']:.2f} | "
+                f"{stats['p99']:.2f} | {stats['avg']:.2f} | {unit} | {stats.get('count', 0)} |"
+            )
+        if calibration.get("max_request_rate"):
+            md_lines.append(
+                f"| Client Max Request Rate | N/A | N/A | N/A | "
+                f"{calibration['max_request_rate']:.2f} | req/s | {calibration.get('request_count', 0)} |"
+            )
+
+    # クライアント側リソース（run_aiperf_profile.sh が記録した client_resources.jsonl）
+    resource_samples = load_resource_samples(artifact_dir)
+    if resource_samples:
+        md_lines.extend(format_resource_markdown(
+            summarize_resource_samples(resource_samples),
+            len(resource_samples),
+            load_resource_host(artifact_dir).get("cpu_count"),
+        ))
+
+    # 推論サーバの Prometheus メトリクス（SERVER_METRICS_URL 指定時の server_metrics.jsonl）を実行区間に合わせる
+    server_samples = load_server_metrics(artifact_dir)
+    if server_samples:
+        server_analysis = analyze_server_metrics(server_samples, extract_request_spans(data))
+        if server_analysis:
+            md_lines.extend(format_server_metrics_markdown(server_analysis))
+        else:
+            print("Warning: No server metrics samples fall within the run window", file=sys.stderr)
+
+    # 429 を避けるためのペーシング（ADAPTIVE_PACING=1 で実行した場合）
+    pacing = load_pacing_result(artifact_dir)
+    if pacing:
+        md_lines.extend(format_pacing_markdown(pacing))
+
+    # Multi-turn: セッション / turn 単位の分析
+    session_analysis = analyze_sessions(data)
+    if session_analysis:
+        md_lines.extend(format_session_markdown(session_analysis))
+
+    # 秒単位の時系列（artifactディレクトリにサイドカーとして出力）
+    if args.timeseries_format != "none":
+        timeseries_path = export_timeseries(data, artifact_dir, args.timeseries_format)
+        if timeseries_path:
+            print(f"Time series saved to: {timeseries_path}", file=sys.stderr)
+            md_lines.extend(["", f"**Time Series:** `{timeseries_path}`（1秒ごとの開始/完了数・in-flight・tokens/s・エラー・TTFT p95）"])
+        else:
+            print("Warning: No request timestamps found; time series not written", file=sys.stderr)
+
     md_content = "\n".join(md_lines)
     with open("summary.md", "w", encoding="utf-8") as f:
         f.write(md_content)
 
     print(f"Markdown summary saved to: summary.md", file=sys.stderr)
 
+    # ダッシュボード向けの OpenMetrics / JSON（固定境界のヒストグラム・スループット・エラー件数・実行ラベル）
+    if args.metrics_format != "none":
+        run_summary = build_run_summary(
+            build_history_entry(artifact_dir, export_files, len(data), error_count),
+            data, success_data, metric_results, error_summary,
+        )
+        for path in write_metrics_exports(run_summary, args.metrics_format, textfile_dir=args.textfile_dir or None):
+            print(f"Metrics saved to: {path}", file=sys.stderr)
+
+    # 実行履歴（SQLite）に記録
+    if not args.no_history:
+        try:
+            run_id = record_run_history(
+                args.history_db, artifact_dir, export_files, len(data), error_count, metric_results
+            )
+            print(f"Run recorded to history: {args.history_db} (run_id={run_id})", file=sys.stderr)
+        except Exception as e:
+            # ベストエフォート: 履歴の記録に失敗してもサマリ生成は成功扱いにする
+            print(f"Warning: Failed to record run history: {e}", file=sys.stderr)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+リクエスト単位のタイムスタンプから秒単位の時系列を作成
+
+summarize_export.py から呼ばれ、各レコードの開始/終了時刻を1秒のビンに集計して
+artifactディレクトリに timeseries.csv（または timeseries.jsonl）として書き出します。
+実行途中のスループット低下・429の集中・GC停止などを確認するためのものです。
+
+各行: 開始・完了リクエスト数、ビン終了時点のin-flight数、output tokens/s、エラー数、
+直近ウィンドウ（デフォルト10秒）に最初のトークンが届いたリクエストの TTFT p95
+"""
+
+import csv
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from export_records import (
+    OUTPUT_TOKEN_FIELDS,
+    extract_metric_value,
+    extract_request_span_ns,
+    get_record_value,
+    is_error_record,
+)
+
+DEFAULT_BIN_SEC = 1.0
+DEFAULT_TTFT_WINDOW_SEC = 10.0
+
+# ウィンドウごとの分位点を一括で計算するときの1チャンクあたりの要素数の上限（ウィンドウ数 × 最大件数）
+PERCENTILE_CHUNK_ELEMENTS = 1_000_000
+
+TIMESERIES_COLUMNS = [
+    "second", "timestamp", "requests_started", "requests_completed", "in_flight",
+    "output_tokens_per_sec", "errors", "ttft_p95_rolling_ms",
+]
+
+
+def build_request_arrays(data: List[Dict]) -> Optional[Dict[str, np.ndarray]]:
+    """タイムスタンプを持つレコードを列（NumPy配列）に変換（1件も無ければ None）
+
+    レコードは1回だけ走査し、各列の値を行のタプルとして集めてから列ごとの配列にまとめる。
+    """
+    rows = []
+    for record in data:
+        span = extract_request_span_ns(record)
+        if span is None:
+            continue
+        ttft = extract_metric_value(record, "time_to_first_token")
+        token_count = get_record_value(record, OUTPUT_TOKEN_FIELDS)
+        rows.append((
+            span[0],
+            span[1],
+            np.nan if ttft is None else ttft,
+            token_count if isinstance(token_count, (int, float)) else np.nan,
+            is_error_record(record),
+        ))
+
+    if not rows:
+        return None
+    starts, ends, ttfts, tokens, errors = zip(*rows)
+    return {
+        "start_ns": np.array(starts, dtype=np.int64),
+        "end_ns": np.array(ends, dtype=np.int64),
+        "ttft_ms": np.array(ttfts, dtype=np.float64),
+        "output_tokens": np.array(tokens, dtype=np.float64),
+        "error": np.array(errors, dtype=np.bool_),
+    }
+
+
+def _spread_tokens(first_token: np.ndarray, end: np.ndarray, tokens: np.ndarray, n_bins: int) -> np.ndarray:
+    """各リクエストの出力トークンを [最初のトークン, 終了] の区間に一様に割り振ってビンごとに合計
+
+    区間の端のビンには重なった割合だけ、間のビンには1ビン分の量を加える（差分配列 + 累積和）。
+    """
+    start_bin = np.floor(first_token).astype(np.int64)
+    end_bin = np.floor(end).astype(np.int64)
+    duration = end - first_token
+
+    totals = np.zeros(n_bins, dtype=np.float64)
+
+    # 同じビン内で完結するリクエストはそのビンに全量
+    same = start_bin == end_bin
+    totals += np.bincount(end_bin[same], weights=tokens[same], minlength=n_bins)
+
+    cross = ~same
+    if np.any(cross):
+        sb, eb = start_bin[cross], end_bin[cross]
+        rate = tokens[cross] / duration[cross]  # ビンあたりのトークン数
+        totals += np.bincount(sb, weights=rate * (sb + 1 - first_token[cross]), minlength=n_bins)
+        totals += np.bincount(eb, weights=rate * (end[cross] - eb), minlength=n_bins)
+
+        diff = np.bincount(sb + 1, weights=rate, minlength=n_bins + 1)
+        diff -= np.bincount(eb, weights=rate, minlength=n_bins + 1)
+        totals += np.cumsum(diff)[:n_bins]
+    return totals
+
+
+def _rolling_percentile(event_bin: np.ndarray, values: np.ndarray, n_bins: int, window_bins: int,
+                        q: float) -> np.ndarray:
+    """各ビン k について、[k - window_bins + 1, k] に入るイベントの値のパーセンタイル
+
+    ビン順に並べた値から各ウィンドウの範囲を searchsorted で求め、ウィンドウを行とする
+    NaN 埋めの2次元配列に展開して行ごとにソートし、np.percentile（linear）と同じ補間で一括計算する。
+    メモリを一定に保つため、行は PERCENTILE_CHUNK_ELEMENTS 要素ずつ処理する。
+    """
+    result = np.full(n_bins, np.nan)
+    if len(values) == 0:
+        return result
+
+    order = np.argsort(event_bin, kind="stable")
+    sorted_bins, sorted_values = event_bin[order], values[order]
+    bins = np.arange(n_bins)
+    lo = np.searchsorted(sorted_bins, bins - window_bins + 1, side="left")
+    hi = np.searchsorted(sorted_bins, bins, side="right")
+    counts = hi - lo
+    nonempty = np.nonzero(counts)[0]
+    if nonempty.size == 0:
+        return result
+
+    width = int(counts.max())
+    offsets = np.arange(width)
+    step = max(1, PERCENTILE_CHUNK_ELEMENTS // width)
+    for begin in range(0, nonempty.size, step):
+        rows = nonempty[begin:begin + step]
+        n = counts[rows]
+        index = np.minimum(lo[rows, None] + offsets, len(sorted_values) - 1)
+        windows = np.where(offsets < n[:, None], sorted_values[index], np.nan)
+        windows.sort(axis=1)  # NaN は各行の末尾に並ぶ
+
+        position = (n - 1) * (q / 100.0)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, n - 1)
+        row_index = np.arange(rows.size)
+        low, high = windows[row_index, below], windows[row_index, above]
+        result[rows] = low + (high - low) * (position - below)
+    return result
+
+
+def compute_timeseries(
+    arrays: Dict[str, np.ndarray],
+    bin_sec: float = DEFAULT_BIN_SEC,
+    ttft_window_sec: float = DEFAULT_TTFT_WINDOW_SEC,
+) -> Dict[str, np.ndarray]:
+    """リクエストの列から秒単位（bin_sec）の時系列を計算"""
+    t0 = int(arrays["start_ns"].min())
+    bin_ns = bin_sec * 1e9
+    # 最初の開始時刻からの経過（ビン単位の実数）
+    start = (arrays["start_ns"] - t0) / bin_ns
+    end = (arrays["end_ns"] - t0) / bin_ns
+    n_bins = int(np.floor(end.max())) + 1
+
+    start_bin = np.floor(start).astype(np.int64)
+    end_bin = np.floor(end).astype(np.int64)
+
+    started = np.bincount(start_bin, minlength=n_bins)
+    completed = np.bincount(end_bin, minlength=n_bins)
+    in_flight = np.cumsum(started) - np.cumsum(completed)
+    errors = np.bincount(end_bin, weights=arrays["error"].astype(np.float64), minlength=n_bins)
+
+    # 出力トークンは最初のトークン到着〜終了の区間に割り振る（TTFTが無ければ開始〜終了）
+    ttft_bins = arrays["ttft_ms"] * 1e6 / bin_ns
+    first_token = np.where(np.isnan(ttft_bins), start, np.minimum(start + ttft_bins, end))
+    has_tokens = ~np.isnan(arrays["output_tokens"]) & ~arrays["error"]
+    tokens = _spread_tokens(first_token[has_tokens], end[has_tokens], arrays["output_tokens"][has_tokens], n_bins)
+
+    # TTFT p95 は成功したリクエストの最初のトークン到着時刻で集計
+    has_ttft = ~np.isnan(arrays["ttft_ms"]) & ~arrays["error"]
+    window_bins = max(1, int(round(ttft_window_sec / bin_sec)))
+    ttft_p95 = _rolling_percentile(
+        np.floor(first_token[has_ttft]).astype(np.int64), arrays["ttft_ms"][has_ttft], n_bins, window_bins, 95
+    )
+
+    bins = np.arange(n_bins)
+    return {
+        "second": bins * bin_sec,
+        "timestamp": (t0 + bins * bin_ns) / 1e9,
+        "requests_started": started,
+        "requests_completed": completed,
+        "in_flight": in_flight,
+        "output_tokens_per_sec": tokens / bin_sec,
+        "errors": errors.astype(np.int64),
+        "ttft_p95_rolling_ms": ttft_p95,
+    }
+
+
+def _row(series: Dict[str, np.ndarray], i: int) -> Dict[str, Optional[float]]:
+    row: Dict[str, Optional[float]] = {}
+    for column in TIMESERIES_COLUMNS:
+        value = series[column][i].item()
+        if isinstance(value, float):
+            value = None if np.isnan(value) else round(value, 3)
+        row[column] = value
+    return row
+
+
+def write_timeseries(series: Dict[str, np.ndarray], path: Path) -> None:
+    """時系列をCSV（拡張子 .csv）またはJSONL（それ以外）で書き出す"""
+    n_rows = len(series["second"])
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.suffix == ".csv":
+            writer = csv.DictWriter(f, fieldnames=TIMESERIES_COLUMNS)
+            writer.writeheader()
+            for i in range(n_rows):
+                writer.writerow({k: ("" if v is None else v) for k, v in _row(series, i).items()})
+        else:
+            for i in range(n_rows):
+                f.write(json.dumps(_row(series, i)) + "\n")
+
+
+def export_timeseries(data: List[Dict], artifact_dir: Path, fmt: str = "csv") -> Optional[Path]:
+    """時系列を計算して artifactディレクトリに timeseries.{csv,jsonl} を書き出す"""
+    arrays = build_request_arrays(data)
+    if arrays is None:
+        return None
+    path = artifact_dir / f"timeseries.{fmt}"
+    write_timeseries(compute_timeseries(arrays), path)
+    return path
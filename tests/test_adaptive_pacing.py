@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+adaptive_pacing.py のユニットテスト
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from adaptive_pacing import (
+    AIMDController,
+    parse_rate_limit_headers,
+    parse_reset_duration,
+    parse_retry_after,
+    resolve_chat_endpoint,
+    run_probe,
+    send_probe,
+)
+from stub_server import make_server, start_in_thread
+
+
+class TestParseHeaders:
+    """レート制限ヘッダのパースのテスト"""
+
+    def test_reset_duration(self):
+        """"6m0s" / "20ms" / 秒数を秒に変換できることを確認"""
+        assert parse_reset_duration("6m0s") == pytest.approx(360.0)
+        assert parse_reset_duration("20ms") == pytest.approx(0.02)
+        assert parse_reset_duration("1.5s") == pytest.approx(1.5)
+        assert parse_reset_duration("2") == pytest.approx(2.0)
+        assert parse_reset_duration("soon") is None
+
+    def test_retry_after(self):
+        """retry-after-ms を Retry-After より優先することを確認"""
+        assert parse_retry_after({"retry-after-ms": "250", "retry-after": "1"}) == pytest.approx(0.25)
+        assert parse_retry_after({"retry-after": "3"}) == pytest.approx(3.0)
+        assert parse_retry_after({}) is None
+
+    def test_rate_limit_headers(self):
+        """x-ratelimit-* ヘッダを読めることを確認"""
+        limits = parse_rate_limit_headers({
+            "x-ratelimit-limit-requests": "600",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "100ms",
+        })
+        assert limits["limit_requests"] == 600
+        assert limits["remaining_requests"] == 0
+        assert limits["reset_requests_sec"] == pytest.approx(0.1)
+
+    def test_token_rate_limit_headers(self):
+        """x-ratelimit-*-tokens ヘッダを読めることを確認"""
+        limits = parse_rate_limit_headers({
+            "x-ratelimit-limit-tokens": "90000",
+            "x-ratelimit-remaining-tokens": "120",
+            "x-ratelimit-reset-tokens": "6m0s",
+        })
+        assert limits["limit_tokens"] == 90000
+        assert limits["remaining_tokens"] == 120
+        assert limits["reset_tokens_sec"] == pytest.approx(360.0)
+
+
+class TestAIMDController:
+    """AIMDController のテスト"""
+
+    def test_additive_increase(self):
+        """429 の無いウィンドウでは加算的に増えることを確認"""
+        controller = AIMDController(initial_rate=2.0, increase_step=1.0)
+        controller.record(200, {})
+        controller.end_window(1.0)
+        assert controller.rate == pytest.approx(3.0)
+
+    def test_multiplicative_decrease_once_per_window(self):
+        """429 が複数あっても減少は1ウィンドウ1回であることを確認"""
+        controller = AIMDController(initial_rate=8.0, decrease_factor=0.5)
+        for _ in range(5):
+            controller.record(429, {"retry-after": "2"})
+        window = controller.end_window(1.0)
+        assert controller.rate == pytest.approx(4.0)
+        assert window["retry_after_sec"] == pytest.approx(2.0)
+
+    def test_ceiling_from_headers(self):
+        """x-ratelimit-limit-requests / 60 を上限にすることを確認"""
+        controller = AIMDController(initial_rate=4.0, increase_step=10.0)
+        controller.record(200, {"x-ratelimit-limit-requests": "300"})
+        controller.end_window(1.0)
+        assert controller.rate == pytest.approx(5.0)
+
+    def test_ceiling_from_token_headers(self):
+        """x-ratelimit-limit-tokens / (ISL + OSL) / 60 を上限にすることを確認"""
+        controller = AIMDController(initial_rate=4.0, increase_step=10.0, tokens_per_request=300)
+        controller.record(200, {"x-ratelimit-limit-requests": "6000", "x-ratelimit-limit-tokens": "36000"})
+        controller.end_window(1.0)
+        assert controller.header_token_max_rate == pytest.approx(2.0)
+        assert controller.rate == pytest.approx(2.0)
+
+    def test_hold_when_remaining_is_zero(self):
+        """残りリクエスト数が0のウィンドウでは増加しないことを確認"""
+        controller = AIMDController(initial_rate=4.0, increase_step=1.0)
+        controller.record(200, {"x-ratelimit-remaining-requests": "0"})
+        controller.end_window(1.0)
+        assert controller.rate == pytest.approx(4.0)
+
+    def test_sustainable_rate(self):
+        """目標レートではなく、後半のウィンドウで成功したリクエスト数 / 秒を返すことを確認"""
+        controller = AIMDController(initial_rate=4.0, increase_step=2.0)
+        for statuses in ([200] * 4, [200] * 6, [200] * 3 + [429], [200] * 3):
+            for status in statuses:
+                controller.record(status, {})
+            controller.end_window(1.0)
+        # 目標レートは 4, 6, 8(429), 4 だが、後半（429 のウィンドウを含む）に成功したのは 3件/秒
+        assert controller.sustainable_rate() == pytest.approx(3.0)
+
+    def test_sustainable_rate_weights_by_duration(self):
+        """短いウィンドウの揺れに引きずられず、合計件数 / 合計時間になることを確認"""
+        controller = AIMDController(initial_rate=4.0, increase_step=0.0)
+        for ok, duration in ((4, 1.0), (4, 1.0), (1, 0.1)):
+            for _ in range(ok):
+                controller.record(200, {})
+            controller.end_window(duration)
+        assert controller.sustainable_rate() == pytest.approx(5 / 1.1)
+
+    def test_hold_when_saturated(self):
+        """同時実行数の上限で送れなかった送信があるウィンドウでは増加しないことを確認"""
+        controller = AIMDController(initial_rate=4.0, increase_step=1.0)
+        controller.record(200, {})
+        controller.record_skipped()
+        window = controller.end_window(1.0)
+        assert window["skipped"] == 1
+        assert controller.rate == pytest.approx(4.0)
+
+    def test_drain_window_is_ignored(self):
+        """プローブ終了後の drain ウィンドウはレートも推定も変えないことを確認"""
+        controller = AIMDController(initial_rate=4.0, increase_step=1.0)
+        for _ in range(4):
+            controller.record(200, {})
+        controller.end_window(1.0)
+        for _ in range(20):
+            controller.record(200, {})
+        controller.end_window(0.1, drain=True)
+        assert controller.rate == pytest.approx(5.0)
+        assert controller.sustainable_rate() == pytest.approx(4.0)
+
+    def test_no_clean_window(self):
+        """成功したウィンドウが無ければ None を返すことを確認"""
+        controller = AIMDController()
+        controller.record(429, {})
+        controller.end_window(1.0)
+        assert controller.sustainable_rate() is None
+
+
+class TestRunProbe:
+    """run_probe のテスト（サーバ無し）"""
+
+    def test_bounds_in_flight(self):
+        """遅い送信先では同時実行数が max_in_flight を超えず、送れなかった分を数えることを確認"""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow_sender():
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.3)
+            with lock:
+                state["active"] -= 1
+            return 200, {}
+
+        controller = AIMDController(initial_rate=50.0, increase_step=10.0)
+        run_probe(controller, slow_sender, duration_sec=1.0, window_sec=0.25, max_in_flight=2)
+        result = controller.to_dict()
+        assert state["peak"] <= 2
+        assert result["total_skipped"] > 0
+        # 送れなかったウィンドウでは増やさない
+        assert result["final_rate"] == pytest.approx(50.0)
+        # 完了ベースの推定は 2並列 / 0.3秒 ≒ 6.7件/秒 程度で、目標の 50件/秒 にはならない
+        assert 0 < result["sustainable_rate"] < 10.0
+
+    def test_no_sends_after_deadline(self):
+        """duration_sec の経過後に新しい送信が行われないことを確認"""
+        sent_at = []
+
+        def sender():
+            sent_at.append(time.monotonic())
+            time.sleep(0.05)
+            return 200, {}
+
+        controller = AIMDController(initial_rate=20.0)
+        start = time.monotonic()
+        run_probe(controller, sender, duration_sec=0.5, window_sec=0.25, max_in_flight=4)
+        assert sent_at
+        assert max(sent_at) - start < 0.5 + 0.05
+        assert controller.windows[-1].get("drain") is True
+
+
+class TestResolveChatEndpoint:
+    """resolve_chat_endpoint のテスト"""
+
+    def test_openai_default(self):
+        assert resolve_chat_endpoint("") == "https://api.openai.com/v1/chat/completions"
+
+    def test_custom_server(self):
+        assert resolve_chat_endpoint("localhost:8000/") == "http://localhost:8000/v1/chat/completions"
+
+
+class TestProbeAgainstRateLimitedStub:
+    """429 を返すスタブサーバに対するプローブのテスト"""
+
+    def test_backs_off_to_stub_limit(self):
+        """レート制限を超えた初期レートから、制限以下のレートに収束することを確認"""
+        server = make_server(rate_limit=5)
+        _, base_url = start_in_thread(server)
+        endpoint = resolve_chat_endpoint(base_url)
+        try:
+            controller = AIMDController(initial_rate=20.0, increase_step=1.0)
+            run_probe(controller, lambda: send_probe(endpoint, "stub-model"), duration_sec=3.0, window_sec=0.5)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        result = controller.to_dict()
+        assert result["total_rate_limited"] > 0
+        assert result["header_max_rate"] == pytest.approx(5.0)
+        assert 0 < result["sustainable_rate"] <= 5.0
+
+    def _probe_stub(self, controller, input_tokens, output_tokens, **limits):
+        server = make_server(**limits)
+        _, base_url = start_in_thread(server)
+        endpoint = resolve_chat_endpoint(base_url)
+        try:
+            run_probe(
+                controller,
+                lambda: send_probe(endpoint, "stub-model", input_tokens=input_tokens, output_tokens=output_tokens),
+                duration_sec=3.0,
+                window_sec=0.5,
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+        return controller.to_dict()
+
+    def test_sized_probe_hits_token_limit(self):
+        """ISL / OSL の大きさのプローブがトークン数の制限で 429 を受けて収束することを確認
+
+        スタブはリクエスト数の制限が緩く（50件/秒）、トークン数（入力 100 + 出力 200 = 300 / 件）の
+        制限 1500 トークン/秒 = 5件/秒 が実際の上限になる。
+        """
+        controller = AIMDController(initial_rate=20.0, increase_step=1.0)
+        result = self._probe_stub(controller, 100, 200, rate_limit=50, token_rate_limit=1500,
+                                  token_rate_limit_burst=1500)
+        assert result["total_rate_limited"] > 0
+        assert result["header_max_rate"] == pytest.approx(50.0)
+        assert 0 < result["sustainable_rate"] <= 5.0
+
+    def test_token_header_caps_rate(self):
+        """小さなプローブでも、tokens_per_request を渡せばトークン数の制限ヘッダから上限を決めることを確認"""
+        controller = AIMDController(initial_rate=1.0, increase_step=2.0, tokens_per_request=300)
+        result = self._probe_stub(controller, 1, 1, rate_limit=50, token_rate_limit=1500,
+                                  token_rate_limit_burst=1500)
+        assert result["total_rate_limited"] == 0
+        assert result["header_token_max_rate"] == pytest.approx(5.0)
+        assert 0 < result["sustainable_rate"] <= 5.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
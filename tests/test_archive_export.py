@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+archive_export.py のユニットテスト
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+import archive_export
+from archive_export import (
+    columns_to_records,
+    flatten_record,
+    read_archive,
+    records_to_columns,
+    unflatten_record,
+    verify_archive,
+    write_archive,
+)
+from summarize_export import extract_metric_values, find_export_files, load_export_data
+
+RECORDS = [
+    {
+        "metadata": {"x_correlation_id": "abc", "request_start_ns": 1_700_000_000_000_000_000, "was_cancelled": False},
+        "metrics": {
+            "time_to_first_token": {"value": 123.45, "unit": "ms"},
+            "output_token_count": {"value": 200, "unit": "tokens"},
+        },
+        "error": None,
+    },
+    {
+        "metadata": {"x_correlation_id": "def", "request_start_ns": 1_700_000_000_100_000_000, "was_cancelled": True},
+        "metrics": {"time_to_first_token": {"value": 234.56, "unit": "ms"}},
+        "error": {"code": 429, "message": "Too Many Requests"},
+        "inter_chunk_latency": [1.0, 2.0],
+    },
+]
+
+# 単位が行によって異なる列、キーに "." を含む列、空の dict、null とキー無しが混在する列
+IRREGULAR_RECORDS = [
+    {
+        "metrics": {"request_latency": {"value": 1.5, "unit": "s"}, "v1.0": {"value": 1, "unit": "tokens"}},
+        "extra": {},
+        "error": None,
+        "a\\.b": 1,
+    },
+    {
+        "metrics": {"request_latency": {"value": 1500.0, "unit": "ms"}, "v1": {"0": 2}},
+        "extra": {"k": "v"},
+        "a": {"b": 2},
+    },
+    {
+        "metrics": {"request_latency": 42.0, "wrapped": {"value": 3}},
+        "extra": {},
+        "error": {"code": 500},
+    },
+]
+
+
+class TestFlatten:
+    """flatten_record / unflatten_record 関数のテスト"""
+
+    def test_value_unit_split(self):
+        """{'value', 'unit'} 形式が値の列と単位に分かれることを確認"""
+        values, units = flatten_record(RECORDS[0])
+        assert values["metrics.time_to_first_token"] == 123.45
+        assert units["metrics.time_to_first_token"] == "ms"
+        assert values["metadata.x_correlation_id"] == "abc"
+
+    def test_roundtrip(self):
+        """展開して戻すと元のレコードになることを確認（Noneの値は省略）"""
+        values, units = flatten_record(RECORDS[1])
+        assert unflatten_record(values, units) == RECORDS[1]
+
+    def test_escaped_keys(self):
+        """キーに "." を含んでも、同じ綴りのネストしたキーと区別して戻せることを確認"""
+        values, units = flatten_record({"v1.0": 1, "v1": {"0": 2}, "a\\.b": 3, "a": {"b": 4}})
+        assert len(values) == 4
+        assert unflatten_record(values, units) == {"v1.0": 1, "v1": {"0": 2}, "a\\.b": 3, "a": {"b": 4}}
+
+    def test_empty_dict_and_null(self):
+        """空の dict と null の値が残ることを確認"""
+        values, units = flatten_record({"extra": {}, "error": None})
+        assert unflatten_record(values, units) == {"extra": {}, "error": None}
+
+    def test_row_units(self):
+        """単位が行によって異なる列は、列単位ではなく行ごとの単位を持つことを確認"""
+        table = records_to_columns(IRREGULAR_RECORDS)
+        assert "metrics.request_latency" not in table["units"]
+        assert table["unit_columns"]["metrics.request_latency"] == ["s", "ms", None]
+        restored = columns_to_records(table)
+        assert restored[0]["metrics"]["request_latency"] == {"value": 1.5, "unit": "s"}
+        assert restored[1]["metrics"]["request_latency"] == {"value": 1500.0, "unit": "ms"}
+        assert restored[2]["metrics"]["request_latency"] == 42.0
+
+    def test_irregular_roundtrip(self):
+        """不規則なレコードも列指向に変換して元に戻せることを確認"""
+        assert columns_to_records(records_to_columns(IRREGULAR_RECORDS)) == IRREGULAR_RECORDS
+
+    def test_version1_table(self):
+        """エスケープの無い version 1 のテーブルも読めることを確認"""
+        table = {
+            "row_count": 1,
+            "columns": {"metrics.time_to_first_token": [1.0], "error": [None]},
+            "kinds": {"metrics.time_to_first_token": "float", "error": "str"},
+            "units": {"metrics.time_to_first_token": "ms"},
+        }
+        assert columns_to_records(table) == [{"metrics": {"time_to_first_token": {"value": 1.0, "unit": "ms"}}}]
+
+    def test_column_kinds(self):
+        """列の型が推定されることを確認"""
+        kinds = records_to_columns(RECORDS)["kinds"]
+        assert kinds["metadata.request_start_ns"] == "int"
+        assert kinds["metrics.time_to_first_token"] == "float"
+        assert kinds["metadata.was_cancelled"] == "bool"
+        assert kinds["metadata.x_correlation_id"] == "str"
+        assert kinds["inter_chunk_latency"] == "json"
+
+
+class TestArchiveRoundtrip:
+    """アーカイブの保存・読み込みのテスト"""
+
+    def _check(self, restored):
+        assert restored == RECORDS
+        assert restored[0]["metadata"]["request_start_ns"] == RECORDS[0]["metadata"]["request_start_ns"]
+        assert restored[1]["error"] == {"code": 429, "message": "Too Many Requests"}
+        assert restored[1]["inter_chunk_latency"] == [1.0, 2.0]
+        assert "output_token_count" not in restored[1]["metrics"]
+        assert extract_metric_values(restored, "time_to_first_token") == [123.45, 234.56]
+
+    def test_npz(self, tmp_path):
+        """npz形式で保存して読み戻せることを確認"""
+        path = write_archive(RECORDS, tmp_path, "npz")
+        assert path.name == "profile_export.npz"
+        self._check(read_archive(path))
+
+    def test_npz_irregular(self, tmp_path):
+        """行ごとの単位・有無の補助列もnpzで保存して読み戻せることを確認"""
+        path = write_archive(IRREGULAR_RECORDS, tmp_path, "npz")
+        assert read_archive(path) == IRREGULAR_RECORDS
+
+    def test_parquet(self, tmp_path):
+        """Parquet形式で保存して読み戻せることを確認（pyarrowがある場合のみ）"""
+        pytest.importorskip("pyarrow")
+        path = write_archive(RECORDS, tmp_path, "parquet")
+        assert path.name == "profile_export.parquet"
+        self._check(read_archive(path))
+
+    def test_parquet_irregular(self, tmp_path):
+        """行ごとの単位・有無の補助列もParquetで保存して読み戻せることを確認（pyarrowがある場合のみ）"""
+        pytest.importorskip("pyarrow")
+        path = write_archive(IRREGULAR_RECORDS, tmp_path, "parquet")
+        assert read_archive(path) == IRREGULAR_RECORDS
+
+
+class TestVerifyArchive:
+    """verify_archive と --remove-source のテスト"""
+
+    def test_field_difference(self):
+        """件数が同じでもフィールドの違いを検出することを確認"""
+        changed = json.loads(json.dumps(RECORDS))
+        changed[1]["metrics"]["time_to_first_token"]["unit"] = "s"
+        assert verify_archive(RECORDS, RECORDS) is None
+        assert verify_archive(RECORDS, changed) == "record 1: field metrics.time_to_first_token.unit differs"
+        assert verify_archive(RECORDS, RECORDS[:1]) == "1 != 2 records"
+
+    def test_nan_and_numeric_kinds(self):
+        """NaN 同士と、float の列にまとめた int は一致とみなし、bool と int は区別することを確認"""
+        assert verify_archive([{"x": float("nan"), "n": 200}], [{"x": float("nan"), "n": 200.0}]) is None
+        assert verify_archive([{"b": True}], [{"b": 1}]) == "record 0: field b differs"
+
+    def _write_source(self, tmp_path):
+        source = tmp_path / "profile_export.jsonl"
+        source.write_text("\n".join(json.dumps(r) for r in IRREGULAR_RECORDS), encoding="utf-8")
+        return source
+
+    def test_remove_source(self, tmp_path):
+        """読み戻した全レコードが一致すれば元のexportを削除することを確認"""
+        source = self._write_source(tmp_path)
+        archive_export.main([str(tmp_path), "--format", "npz", "--remove-source"])
+        assert not source.exists()
+        assert load_export_data(find_export_files(tmp_path)) == IRREGULAR_RECORDS
+
+    def test_keep_source_on_mismatch(self, tmp_path, monkeypatch, capsys):
+        """フィールドが一致しなければ元のexportを残して失敗することを確認"""
+        source = self._write_source(tmp_path)
+        monkeypatch.setattr(archive_export, "read_archive", lambda path: IRREGULAR_RECORDS[:2] + [{}])
+        with pytest.raises(SystemExit) as exc:
+            archive_export.main([str(tmp_path), "--format", "npz", "--remove-source"])
+        assert exc.value.code == 1
+        assert source.exists()
+        assert not (tmp_path / "profile_export.npz").exists()
+        assert "record 2: field metrics differs" in capsys.readouterr().err
+
+
+class TestSummarizeIntegration:
+    """summarize_export.py からアーカイブを読むテスト"""
+
+    def test_archive_preferred(self, tmp_path):
+        """アーカイブがあれば元のexportより優先して読まれることを確認"""
+        (tmp_path / "profile_export.jsonl").write_text(
+            "\n".join(json.dumps(r) for r in RECORDS), encoding="utf-8"
+        )
+        assert find_export_files(tmp_path) == [tmp_path / "profile_export.jsonl"]
+
+        write_archive(RECORDS, tmp_path, "npz")
+        export_files = find_export_files(tmp_path)
+        assert export_files == [tmp_path / "profile_export.npz"]
+        assert find_export_files(tmp_path, include_archives=False) == [tmp_path / "profile_export.jsonl"]
+        assert len(load_export_data(export_files)) == 2
+
+    def test_stale_archive(self, tmp_path, capsys):
+        """元のexportの方が新しい（アーカイブ後に再実行した）場合は警告して元のexportを読むことを確認"""
+        write_archive(RECORDS, tmp_path, "npz")
+        jsonl_file = tmp_path / "profile_export.jsonl"
+        jsonl_file.write_text(json.dumps(RECORDS[0]), encoding="utf-8")
+        archive_mtime = (tmp_path / "profile_export.npz").stat().st_mtime
+        os.utime(jsonl_file, (archive_mtime + 10, archive_mtime + 10))
+
+        assert find_export_files(tmp_path) == [jsonl_file]
+        assert "older than the exports" in capsys.readouterr().err
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
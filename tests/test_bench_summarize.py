@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench_summarize.py のユニットテスト
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# benchmarksディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+import pytest
+import bench_summarize
+from bench_summarize import (
+    PROCESS_STAGE,
+    VARIANTS,
+    compare_to_baseline,
+    default_baseline_path,
+    generate_records,
+    machine_info,
+    machine_mismatches,
+    run_benchmark,
+    run_benchmark_subprocess,
+    save_baseline,
+    write_export,
+)
+from summarize_export import extract_metric_values, extract_tokens_per_sec
+
+
+class TestGenerateRecords:
+    """generate_records 関数のテスト"""
+
+    def test_deterministic(self):
+        """同じシードなら同じレコード、違うシードなら違うレコードになることを確認"""
+        assert list(generate_records(50, seed=1)) == list(generate_records(50, seed=1))
+        assert list(generate_records(50, seed=1)) != list(generate_records(50, seed=2))
+
+    def test_variants_extract_same_values(self):
+        """フィールド名のバリアントが違っても summarize_export で同じ値が取り出せることを確認"""
+        extracted = {}
+        for variant in VARIANTS:
+            data = list(generate_records(200, variant))
+            extracted[variant] = (
+                extract_metric_values(data, "time_to_first_token"),
+                extract_metric_values(data, "request_latency"),
+                extract_metric_values(data, "inter_token_latency"),
+                extract_tokens_per_sec(data),
+            )
+        assert len(extracted["aiperf"][0]) > 150
+        for variant in VARIANTS[1:]:
+            for expected, actual in zip(extracted["aiperf"], extracted[variant]):
+                assert actual == pytest.approx(expected)
+
+    def test_unknown_variant(self):
+        with pytest.raises(ValueError):
+            next(generate_records(1, "unknown"))
+
+
+class TestRunBenchmark:
+    """run_benchmark 関数のテスト"""
+
+    def test_stages(self, tmp_path):
+        """全ステージの wall time / ピークメモリと件数が記録されることを確認"""
+        path = write_export(tmp_path / "export.jsonl", 100, "aiperf")
+        results = run_benchmark(path)
+        assert list(results) == ["load", "extract_ttft", "extract_latency", "extract_itl", "percentiles", "tokens_per_sec"]
+        assert results["load"]["records"] == 100
+        assert results["load"]["peak_mb"] > 0
+        assert results["tokens_per_sec"]["values"] == results["extract_ttft"]["values"]
+
+        results = run_benchmark(path, track_memory=False)
+        assert results["load"]["peak_mb"] is None
+
+    def test_subprocess_peak_rss(self, tmp_path):
+        """子プロセスで実行した場合は、各ステージの wall time と子プロセスのピークRSSが記録されることを確認"""
+        path = write_export(tmp_path / "export.jsonl", 100, "aiperf")
+        results, peak_mb, returncode = run_benchmark_subprocess(path)
+        assert returncode == 0
+        assert results["load"]["records"] == 100
+        assert results["load"]["peak_mb"] is None
+        assert results[PROCESS_STAGE]["peak_mb"] == pytest.approx(peak_mb, abs=0.001)
+        assert peak_mb > 1
+
+    def test_subprocess_failure(self, tmp_path):
+        """子プロセスが失敗した場合は結果を返さず終了コードを返すことを確認"""
+        results, _, returncode = run_benchmark_subprocess(tmp_path / "missing.jsonl")
+        assert results is None
+        assert returncode != 0
+
+
+class TestBaseline:
+    """compare_to_baseline / save_baseline のテスト"""
+
+    def test_regressions(self):
+        """許容幅を超えたステージだけを回帰とし、短すぎる wall time と未記録のケースは無視することを確認"""
+        baseline = {"1m/aiperf": {"load": {"wall_sec": 10.0, "peak_mb": 100.0},
+                                  "percentiles": {"wall_sec": 0.001, "peak_mb": None}}}
+        results = {
+            "1m/aiperf": {"load": {"wall_sec": 16.0, "peak_mb": 140.0},
+                          "percentiles": {"wall_sec": 0.01, "peak_mb": None}},
+            "10k/flat": {"load": {"wall_sec": 1.0, "peak_mb": 1.0}},
+        }
+        regressions = compare_to_baseline(results, baseline, tolerance=0.5)
+        assert len(regressions) == 1
+        assert regressions[0].startswith("1m/aiperf load: wall_sec")
+        assert compare_to_baseline(results, baseline, tolerance=1.0) == []
+
+    def test_save_merges(self, tmp_path):
+        """保存時に既存のケースを残して今回のケースを上書きすることを確認"""
+        path = tmp_path / "baseline.json"
+        save_baseline({"10k/aiperf": {"load": {"wall_sec": 1.0}}}, path)
+        save_baseline({"1m/aiperf": {"load": {"wall_sec": 2.0}}}, path)
+        baseline = json.loads(path.read_text(encoding="utf-8"))
+        assert set(baseline["results"]) == {"10k/aiperf", "1m/aiperf"}
+        assert "machine" in baseline
+
+    def test_per_host_path(self):
+        """baseline はホスト名と Python のマイナーバージョンごとの git 管理外のファイルになることを確認"""
+        path = default_baseline_path()
+        assert path.parent.name == "baselines"
+        assert path.name.endswith(f"-py{sys.version_info.major}.{sys.version_info.minor}.json")
+
+    def test_machine_mismatches(self):
+        """ホスト・CPU数・Python のマイナーバージョンが違えば列挙し、パッチバージョンの違いは無視することを確認"""
+        current = machine_info()
+        assert machine_mismatches(current, current) == []
+        assert machine_mismatches({}, current) == []
+        major, minor = sys.version_info.major, sys.version_info.minor
+        same_minor = dict(current, python=f"{major}.{minor}.999")
+        assert machine_mismatches(same_minor, current) == []
+        other = dict(current, python="2.7.18", cpu_count=(current["cpu_count"] or 0) + 1)
+        assert [m.split(":")[0] for m in machine_mismatches(other, current)] == ["cpu_count", "python"]
+
+
+class TestMain:
+    """main の終了コードのテスト"""
+
+    def _run(self, tmp_path, *extra):
+        argv = ["--sizes", "10k", "--variants", "aiperf", "--data-dir", str(tmp_path),
+                "--baseline", str(tmp_path / "baseline.json"), *extra]
+        bench_summarize.main(argv)
+
+    @pytest.fixture(autouse=True)
+    def small_size(self, monkeypatch):
+        monkeypatch.setitem(bench_summarize.SIZES, "10k", 20)
+
+    def test_missing_baseline_fails(self, tmp_path, capsys):
+        """baseline が無い場合は比較しなかったことを表示して失敗することを確認"""
+        with pytest.raises(SystemExit) as exc:
+            self._run(tmp_path)
+        assert exc.value.code == 1
+        assert "No baseline found" in capsys.readouterr().err
+
+    def test_compared_against_baseline(self, tmp_path, capsys):
+        """baseline を保存した後は比較して成功し、baseline に無いケースだけなら失敗することを確認"""
+        self._run(tmp_path, "--save-baseline")
+        self._run(tmp_path)
+        assert "No regressions" in capsys.readouterr().err
+
+        (tmp_path / "baseline.json").write_text(json.dumps({"results": {"other/aiperf": {}}}), encoding="utf-8")
+        with pytest.raises(SystemExit) as exc:
+            self._run(tmp_path)
+        assert exc.value.code == 1
+        assert "No case was compared" in capsys.readouterr().err
+
+    def test_subprocess_failure_fails(self, tmp_path, monkeypatch, capsys):
+        """子プロセスで失敗したケースがあれば結果に記録して失敗することを確認"""
+        monkeypatch.setattr(bench_summarize, "TRACEMALLOC_MAX_RECORDS", 10)
+        monkeypatch.setattr(bench_summarize, "run_benchmark_subprocess", lambda path: (None, 512.0, -9))
+        output = tmp_path / "result.json"
+        with pytest.raises(SystemExit) as exc:
+            self._run(tmp_path, "--save-baseline", "--output", str(output))
+        assert exc.value.code == 1
+        assert "10k/aiperf failed in the subprocess (exit code -9" in capsys.readouterr().err
+        assert json.loads(output.read_text(encoding="utf-8"))["failures"] == {
+            "10k/aiperf": {"returncode": -9, "peak_mb": 512.0}
+        }
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+calibrate_client.py / stub_server.py のユニットテスト
+"""
+
+import json
+import sys
+import urllib.request
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from calibrate_client import (
+    compute_calibration_stats,
+    parse_concurrencies,
+    update_calibration_file,
+)
+from stub_server import make_server, start_in_thread
+
+
+class TestParseConcurrencies:
+    """parse_concurrencies関数のテスト"""
+
+    def test_comma_separated(self):
+        """カンマ区切りをパースできることを確認"""
+        assert parse_concurrencies("1,5,10") == [1, 5, 10]
+
+    def test_space_separated(self):
+        """空白区切り（make sweep と同じ形式）もパースできることを確認"""
+        assert parse_concurrencies("1 5  10") == [1, 5, 10]
+
+    def test_rejects_non_positive(self):
+        """0以下のconcurrencyはエラーになることを確認"""
+        with pytest.raises(ValueError):
+            parse_concurrencies("0,5")
+
+
+class TestComputeCalibrationStats:
+    """compute_calibration_stats関数のテスト"""
+
+    def test_floor_and_max_rate(self):
+        """下限値のパーセンタイルと最大リクエストレートを算出できることを確認"""
+        data = [
+            {
+                "metadata": {"request_start_ns": 1_000_000_000 + i * 100_000_000,
+                             "request_end_ns": 1_100_000_000 + i * 100_000_000},
+                "metrics": {"time_to_first_token": {"value": 2.0, "unit": "ms"},
+                            "request_latency": {"value": 100.0, "unit": "ms"}},
+            }
+            for i in range(10)
+        ]
+        stats = compute_calibration_stats(data)
+
+        assert stats["request_count"] == 10
+        assert stats["ttft"]["p50"] == 2.0
+        assert stats["ttft"]["count"] == 10
+        assert stats["request_latency"]["p99"] == 100.0
+        # 10リクエストが1.0秒間に完了 → 10 req/s
+        assert stats["max_request_rate"] == pytest.approx(10.0)
+
+    def test_without_timestamps(self):
+        """タイムスタンプが無い場合はレートを出さないことを確認"""
+        stats = compute_calibration_stats([{"metrics": {"time_to_first_token": 3.0}}])
+        assert "max_request_rate" not in stats
+        assert stats["ttft"]["avg"] == 3.0
+
+
+class TestUpdateCalibrationFile:
+    """update_calibration_file関数のテスト"""
+
+    def test_merges_concurrencies(self, tmp_path):
+        """既存の結果を残したままconcurrencyごとに追記されることを確認"""
+        path = tmp_path / "client_calibration.json"
+        update_calibration_file(path, 1, {"max_request_rate": 50.0})
+        update_calibration_file(path, 10, {"max_request_rate": 400.0})
+
+        calibration = json.loads(path.read_text(encoding="utf-8"))
+        assert calibration["concurrency"]["1"]["max_request_rate"] == 50.0
+        assert calibration["concurrency"]["10"]["max_request_rate"] == 400.0
+
+
+class TestStubServer:
+    """stub_server.py のテスト（実際にローカルで起動して確認）"""
+
+    @pytest.fixture
+    def base_url(self):
+        server = make_server(output_tokens=4)
+        _, url = start_in_thread(server)
+        yield url
+        server.shutdown()
+        server.server_close()
+
+    def _post(self, url, payload):
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        return urllib.request.urlopen(request, timeout=5)
+
+    def test_streaming_response(self, base_url):
+        """SSEで max_tokens 個のトークンと [DONE] が返ることを確認"""
+        with self._post(f"{base_url}/v1/chat/completions",
+                        {"model": "m", "stream": True, "max_tokens": 3}) as resp:
+            body = resp.read().decode("utf-8")
+
+        events = [line[len("data: "):] for line in body.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        contents = [
+            json.loads(e)["choices"][0]["delta"].get("content")
+            for e in events[:-1]
+        ]
+        assert len([c for c in contents if c]) == 3
+
+    def test_non_streaming_response(self, base_url):
+        """非ストリーミングでは usage にトークン数が入ることを確認"""
+        with self._post(f"{base_url}/v1/chat/completions", {"model": "m"}) as resp:
+            body = json.loads(resp.read())
+        assert body["usage"]["completion_tokens"] == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+concurrency_analysis.py のユニットテスト
+"""
+
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import numpy as np
+import pytest
+from concurrency_analysis import (
+    analyze_concurrency,
+    format_concurrency_markdown,
+    summarize_levels,
+    sweep_concurrency,
+)
+
+SEC = 1_000_000_000
+
+
+def make_record(start_sec, end_sec):
+    return {"metadata": {"request_start_ns": int(start_sec * SEC), "request_end_ns": int(end_sec * SEC)}}
+
+
+class TestSweepConcurrency:
+    """sweep_concurrency / summarize_levels 関数のテスト"""
+
+    def test_levels(self):
+        """開始/終了イベントからin-flight数の推移が求まることを確認"""
+        times, levels = sweep_concurrency(np.array([0, 1, 2]), np.array([4, 3, 5]))
+        assert times.tolist() == [0, 1, 2, 3, 4, 5]
+        assert levels.tolist() == [1, 2, 3, 2, 1, 0]
+
+    def test_end_before_start_at_same_time(self):
+        """同時刻の終了と開始では終了が先に処理されることを確認（並行度が過大にならない）"""
+        _, levels = sweep_concurrency(np.array([0, 2]), np.array([2, 4]))
+        assert levels.max() == 1
+
+    def test_time_weighted_stats(self):
+        """時間加重の平均・パーセンタイルが算出されることを確認"""
+        # [0,1): 1, [1,3): 2, [3,4): 1
+        times, levels = sweep_concurrency(np.array([0, 1]), np.array([3, 4]))
+        stats = summarize_levels(times, levels)
+        assert stats["mean"] == pytest.approx(1.5)
+        assert stats["p50"] == 1.0
+        assert stats["p95"] == 2.0
+        assert stats["max"] == 2.0
+
+    def test_window(self):
+        """区間を指定するとその範囲だけで集計されることを確認"""
+        times, levels = sweep_concurrency(np.array([0, 1]), np.array([3, 4]))
+        stats = summarize_levels(times, levels, (1, 3))
+        assert stats["mean"] == pytest.approx(2.0)
+        assert stats["duration_sec"] == pytest.approx(2 / 1e9)
+
+
+class TestAnalyzeConcurrency:
+    """analyze_concurrency関数のテスト"""
+
+    def test_target_held(self):
+        """設定値どおりの並行度が保たれていれば飽和と判定しないことを確認"""
+        # concurrency 2 を保ったまま順に投げる
+        data = [make_record(i, i + 2) for i in range(10)]
+        analysis = analyze_concurrency(data, 2)
+        assert analysis["steady"]["mean"] == pytest.approx(2.0, rel=0.1)
+        assert analysis["saturated"] is False
+
+    def test_saturation_detected(self):
+        """達成並行度が設定値を大きく下回る場合は飽和と判定されることを確認"""
+        data = [make_record(i, i + 1) for i in range(10)]
+        analysis = analyze_concurrency(data, 10)
+        assert analysis["ratio"] == pytest.approx(0.1)
+        assert analysis["saturated"] is True
+        assert any("⚠️" in line for line in format_concurrency_markdown(analysis))
+
+    def test_unknown_configured(self):
+        """設定値が不明な場合は比率を出さないことを確認"""
+        analysis = analyze_concurrency([make_record(0, 1), make_record(0, 2)], None)
+        assert analysis["ratio"] is None
+        assert analysis["saturated"] is False
+
+    def test_not_enough_records(self):
+        """タイムスタンプを持つレコードが2件未満ならNoneを返すことを確認"""
+        assert analyze_concurrency([make_record(0, 1)], 1) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
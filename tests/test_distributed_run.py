@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+distributed_run.py のユニットテスト
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from distributed_run import (
+    Coordinator,
+    apply_clock_offset,
+    estimate_clock_offset,
+    make_coordinator_server,
+    merge_shard_exports,
+    run_profile_script,
+    run_shard,
+    split_counts,
+    validate_shards,
+)
+
+
+def _write_shard(shard_dir: Path, index: int, offset_ns: int, starts, concurrency: int = 1):
+    shard_dir.mkdir(parents=True)
+    with open(shard_dir / "profile_export.jsonl", "w", encoding="utf-8") as f:
+        for start in starts:
+            record = {
+                "metadata": {"request_start_ns": start, "request_end_ns": start + 1_000_000},
+                "metrics": {"request_latency": {"value": 1.0, "unit": "ms"}},
+            }
+            f.write(json.dumps(record) + "\n")
+    (shard_dir / "shard_info.json").write_text(
+        json.dumps({"index": index, "clock_offset_ns": offset_ns, "concurrency": concurrency, "request_count": len(starts)}),
+        encoding="utf-8",
+    )
+    (shard_dir / "run_meta.json").write_text(
+        json.dumps({"model": "m", "concurrency": concurrency, "started_at_epoch": 100.0 + index}), encoding="utf-8"
+    )
+
+
+class TestSplitCounts:
+    """split_counts のテスト"""
+
+    def test_even_and_remainder(self):
+        """合計が保たれ、余りは先頭のシャードに配られることを確認"""
+        assert split_counts(10, 2) == [5, 5]
+        assert split_counts(10, 3) == [4, 3, 3]
+        assert split_counts(2, 4) == [1, 1, 0, 0]
+
+    def test_reject_more_shards_than_concurrency(self):
+        """並行度0のシャードができるシャード数を拒否することを確認"""
+        assert validate_shards(2, 2) is None
+        assert "must not exceed CONCURRENCY" in validate_shards(2, 1)
+        assert validate_shards(0, 4) is not None
+
+
+class TestApplyClockOffset:
+    """apply_clock_offset のテスト"""
+
+    def test_only_epoch_timestamps(self):
+        """エポック時刻の *_ns だけを補正し、所要時間は変えないことを確認"""
+        record = {"metadata": {"request_start_ns": 1_700_000_000_000_000_000, "duration_ns": 5_000, "turn_index": 0}}
+        apply_clock_offset(record, 250)
+        assert record["metadata"]["request_start_ns"] == 1_700_000_000_000_000_250
+        assert record["metadata"]["duration_ns"] == 5_000
+
+
+class TestMergeShardExports:
+    """merge_shard_exports のテスト"""
+
+    def test_merge_with_offsets(self, tmp_path):
+        """時計のずれを補正して開始時刻順にマージし、run_meta の並行度を合計することを確認"""
+        base = 1_700_000_000_000_000_000
+        artifact_dir = tmp_path / "ISL100_OSL200_CON3"
+        _write_shard(artifact_dir / "shards" / "shard_00", 0, 0, [base + 10, base + 30], concurrency=2)
+        # shard 1 の時計は 100ns 遅れている（offset = +100）
+        _write_shard(artifact_dir / "shards" / "shard_01", 1, 100, [base - 80], concurrency=1)
+
+        summary = merge_shard_exports(artifact_dir)
+        assert summary["records"] == 3
+
+        lines = (artifact_dir / "profile_export.jsonl").read_text(encoding="utf-8").splitlines()
+        records = [json.loads(line) for line in lines]
+        assert [r["metadata"]["request_start_ns"] for r in records] == [base + 10, base + 20, base + 30]
+        assert [r["metadata"]["shard_index"] for r in records] == [0, 1, 0]
+
+        meta = json.loads((artifact_dir / "run_meta.json").read_text(encoding="utf-8"))
+        assert meta["concurrency"] == 3
+        assert meta["request_count"] == 3
+        assert meta["shards"] == 2
+
+    def test_skip_missing_shards(self, tmp_path):
+        """完了報告の無いシャードは読まず、shards.json と run_meta の合計から除くことを確認"""
+        base = 1_700_000_000_000_000_000
+        artifact_dir = tmp_path / "ISL100_OSL200_CON3"
+        _write_shard(artifact_dir / "shards" / "shard_00", 0, 0, [base + 10, base + 30], concurrency=2)
+        # shard 1 はタイムアウトした（書き込み途中の export が残っている）
+        _write_shard(artifact_dir / "shards" / "shard_01", 1, 0, [base + 20], concurrency=1)
+
+        summary = merge_shard_exports(artifact_dir, missing_shards=[1])
+        assert summary["records"] == 2
+        assert summary["missing_shards"] == [1]
+        saved = json.loads((artifact_dir / "shards.json").read_text(encoding="utf-8"))
+        assert saved["missing_shards"] == [1]
+        meta = json.loads((artifact_dir / "run_meta.json").read_text(encoding="utf-8"))
+        assert meta["concurrency"] == 2
+        assert meta["request_count"] == 2
+
+    def test_no_shards(self, tmp_path):
+        """シャードが無い場合は FileNotFoundError"""
+        with pytest.raises(FileNotFoundError):
+            merge_shard_exports(tmp_path)
+
+
+class TestRunProfileScript:
+    """run_profile_script のテスト"""
+
+    def test_shard_env(self, tmp_path, monkeypatch):
+        """シャードのレートを .env より優先して渡し、シャードごとのペーシングは無効にすることを確認"""
+        import distributed_run
+
+        captured = {}
+
+        def fake_run(command, env):
+            captured.update(env)
+            return distributed_run.subprocess.CompletedProcess(command, 0)
+
+        monkeypatch.setattr(distributed_run.subprocess, "run", fake_run)
+        assert run_profile_script("profile", tmp_path, 2, 10, 2.5) == 0
+        assert captured["REQUEST_RATE"] == "2.5"
+        assert captured["ADAPTIVE_PACING"] == "0"
+        assert set(captured["ENV_OVERRIDES"].split()) == {"REQUEST_RATE", "ADAPTIVE_PACING"}
+
+        run_profile_script("profile", tmp_path, 2, 10, None)
+        assert captured["REQUEST_RATE"] == ""
+
+
+class TestBarrier:
+    """coordinator の開始バリアのテスト"""
+
+    def test_shards_start_together(self, tmp_path):
+        """全シャードが同じ開始時刻を受け取り、番号と並行度が重複なく割り当てられることを確認"""
+        artifact_dir = tmp_path / "run"
+        coordinator = Coordinator(3, artifact_dir, start_delay_sec=0.2, request_rate=9.0)
+        server = make_coordinator_server(coordinator, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        calls = []
+        lock = threading.Lock()
+
+        def fake_runner(mode, shard_dir, concurrency, request_count, request_rate):
+            with lock:
+                calls.append((shard_dir.name, concurrency, request_count, request_rate))
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            return 0
+
+        try:
+            offset, rtt = estimate_clock_offset(url, samples=3)
+            assert abs(offset) < 0.5
+            assert rtt >= 0
+
+            threads = [threading.Thread(target=run_shard, args=(url, 7, 21, fake_runner)) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(timeout=30)
+            assert coordinator.wait_done(timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # 全体の REQUEST_RATE はシャード数で割って渡す
+        assert sorted(calls) == [("shard_00", 3, 7, 3.0), ("shard_01", 2, 7, 3.0), ("shard_02", 2, 7, 3.0)]
+        infos = [json.loads((artifact_dir / "shards" / name / "shard_info.json").read_text()) for name, *_ in calls]
+        assert len({info["start_at"] for info in infos}) == 1
+        assert coordinator.done == {0: 0, 1: 0, 2: 0}
+        assert coordinator.missing_shards() == []
+
+    def test_start_waits_for_rate(self, tmp_path):
+        """レートのプローブ中は全員が登録しても開始せず、レートが決まってから開始時刻を返すことを確認"""
+        coordinator = Coordinator(1, tmp_path / "run", start_delay_sec=0.0, rate_ready=False)
+        assignments = []
+        thread = threading.Thread(target=lambda: assignments.append(coordinator.register("h")))
+        thread.start()
+        thread.join(timeout=0.2)
+        assert thread.is_alive()
+        assert coordinator.start_at is None
+
+        coordinator.set_request_rate(4.0)
+        thread.join(timeout=5)
+        assert assignments[0]["start_at"] is not None
+        assert assignments[0]["request_rate"] == pytest.approx(4.0)
+
+    def test_wait_done_timeout(self, tmp_path):
+        """完了報告が揃わなければ期限で False を返し、未完了のシャードが分かることを確認"""
+        coordinator = Coordinator(3, tmp_path / "run")
+        coordinator.mark_done(0, 0)
+        coordinator.mark_done(2, 1)
+        assert not coordinator.wait_done(timeout=0.1)
+        assert coordinator.missing_shards() == [1]
+
+    def test_rejected_registration(self, tmp_path, capsys):
+        """定員を超えたシャードは 409 を受けて、トレースバックではなくエラーメッセージで 1 を返すことを確認"""
+        coordinator = Coordinator(1, tmp_path / "run", start_delay_sec=0.0)
+        coordinator.registered = 1  # 既に定員まで登録済み
+        server = make_coordinator_server(coordinator, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        calls = []
+        try:
+            returncode = run_shard(url, 2, 4, lambda *args: calls.append(args) or 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert returncode == 1
+        assert calls == []
+        err = capsys.readouterr().err
+        assert "HTTP 409" in err
+        assert "Barrier is full or timed out" in err
+
+    def test_zero_concurrency_shard_reports_failure(self, tmp_path):
+        """並行度0になったシャードは実行せず、失敗として完了報告することを確認"""
+        coordinator = Coordinator(1, tmp_path / "run", start_delay_sec=0.0)
+        server = make_coordinator_server(coordinator, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        calls = []
+        try:
+            returncode = run_shard(url, 0, 5, lambda *args: calls.append(args) or 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert returncode == 1
+        assert calls == []
+        assert coordinator.done == {0: 1}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+matrix_run.py のユニットテスト
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from matrix_run import (
+    expand_points,
+    is_point_complete,
+    load_spec,
+    run_matrix,
+    serpentine_order,
+    summarize_point,
+    write_matrix_summary,
+)
+
+SPEC_TOML = """
+isl = [1024, 128]
+osl = 64
+concurrency = [1, 8]
+requests_per_concurrency = 2
+
+[env]
+INPUT_TOKENS_STDDEV = 0
+"""
+
+
+def _write_export(artifact_dir: Path, count: int):
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    with open(artifact_dir / "profile_export.jsonl", "w", encoding="utf-8") as f:
+        for i in range(count):
+            start = 1_700_000_000_000_000_000 + i * 100_000_000
+            record = {
+                "metadata": {"request_start_ns": start, "request_end_ns": start + 50_000_000},
+                "metrics": {
+                    "time_to_first_token": {"value": 10.0, "unit": "ms"},
+                    "request_latency": {"value": 50.0, "unit": "ms"},
+                    "input_sequence_length": {"value": 128, "unit": "tokens"},
+                    "output_token_count": {"value": 5, "unit": "tokens"},
+                },
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def spec(tmp_path):
+    path = tmp_path / "matrix.toml"
+    path.write_text(SPEC_TOML, encoding="utf-8")
+    return load_spec(path)
+
+
+class TestLoadSpec:
+    """load_spec 関数のテスト"""
+
+    def test_normalize(self, spec):
+        """リストはソート、スカラーは1要素のリスト、env は文字列になることを確認"""
+        assert spec["isl"] == [128, 1024]
+        assert spec["osl"] == [64]
+        assert spec["order"] == "serpentine"
+        assert spec["env"] == {"INPUT_TOKENS_STDDEV": "0"}
+
+    @pytest.mark.parametrize("body", ["isl = [1]\nosl = [1]\n", "isl = [1]\nosl = [1]\nconcurrency = [0]\n",
+                                      "isl = 1\nosl = 1\nconcurrency = 1\norder = \"random\"\n"])
+    def test_invalid(self, tmp_path, body):
+        """必須キーの欠落・不正な値は ValueError"""
+        path = tmp_path / "bad.toml"
+        path.write_text(body, encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_spec(path)
+
+
+class TestOrdering:
+    """serpentine_order / expand_points のテスト"""
+
+    def test_serpentine(self):
+        """concurrency と OSL が折り返して並ぶことを確認"""
+        points = serpentine_order([1, 2], [10, 20], [1, 8])
+        assert [(p["isl"], p["osl"], p["concurrency"]) for p in points] == [
+            (1, 10, 1), (1, 10, 8), (1, 20, 8), (1, 20, 1),
+            (2, 20, 1), (2, 20, 8), (2, 10, 8), (2, 10, 1),
+        ]
+
+    def test_expand(self, spec):
+        """REQUEST_COUNT と artifactディレクトリ名が run_aiperf_profile.sh と同じ規則になることを確認"""
+        points = expand_points(spec)
+        assert [(p["isl"], p["concurrency"], p["request_count"]) for p in points] == [
+            (128, 1, 2), (128, 8, 16), (1024, 8, 16), (1024, 1, 2),
+        ]
+        assert points[0]["artifact_dir"] == Path("artifacts/ISL128_OSL64_CON1")
+
+
+class TestRunMatrix:
+    """run_matrix のテスト（run_aiperf_profile.sh の代わりに export を書く関数を使う）"""
+
+    def test_resume(self, spec, tmp_path, monkeypatch):
+        """完了済みの点をスキップし、export が足りない点と失敗した点を区別することを確認"""
+        monkeypatch.chdir(tmp_path)
+        points = expand_points(spec)
+        _write_export(points[0]["artifact_dir"], 2)  # 完了済み
+        _write_export(points[1]["artifact_dir"], 3)  # 途中で中断（16件中3件）
+        assert is_point_complete(points[0])
+        assert not is_point_complete(points[1])
+
+        calls = []
+
+        def fake_runner(mode, point, env):
+            calls.append((mode, point["concurrency"], point["request_count"], env["INPUT_TOKENS_STDDEV"]))
+            if point["isl"] == 1024 and point["concurrency"] == 1:
+                return 1
+            _write_export(point["artifact_dir"], point["request_count"])
+            return 0
+
+        statuses = run_matrix(spec, points, runner=fake_runner)
+        assert calls == [("profile", 8, 16, "0"), ("profile", 8, 16, "0"), ("profile", 1, 2, "0")]
+        assert list(statuses.values()).count("skipped") == 1
+        assert statuses["artifacts/ISL1024_OSL64_CON1"] == "failed"
+        assert statuses["artifacts/ISL128_OSL64_CON8"] == "completed"
+
+    def test_warmup(self, spec, tmp_path, monkeypatch):
+        """warmup = true の場合は最初の点の ISL / OSL で warmup を実行することを確認"""
+        monkeypatch.chdir(tmp_path)
+        spec["warmup"] = True
+        modes = []
+
+        def fake_runner(mode, point, env):
+            modes.append((mode, point["isl"], point["concurrency"]))
+            _write_export(point["artifact_dir"], point["request_count"])
+            return 0
+
+        run_matrix(spec, expand_points(spec)[:1], runner=fake_runner)
+        assert modes == [("warmup", 128, 3), ("profile", 128, 1)]
+
+
+class TestMatrixSummary:
+    """summarize_point / write_matrix_summary のテスト"""
+
+    def test_summary_files(self, spec, tmp_path, monkeypatch):
+        """export がある点は集計し、無い点は空欄で出力することを確認"""
+        monkeypatch.chdir(tmp_path)
+        points = expand_points(spec)
+        _write_export(points[0]["artifact_dir"], 4)
+        rows = [dict(summarize_point(p), status="complete") for p in points]
+        assert rows[0]["ttft_p50"] == pytest.approx(10.0)
+        assert rows[0]["prefill_share"] == pytest.approx(20.0)
+        assert rows[1]["records"] == 0
+
+        tsv_path, md_path = write_matrix_summary(rows, tmp_path)
+        tsv_lines = tsv_path.read_text(encoding="utf-8").splitlines()
+        assert tsv_lines[0].startswith("isl\tosl\tconcurrency\tstatus")
+        assert tsv_lines[1].startswith("128\t64\t1\tcomplete\t4\t0\t10.00")
+        assert "N/A" in tsv_lines[2]
+        md = md_path.read_text(encoding="utf-8")
+        assert "## ISL 128 / OSL 64" in md
+        assert "## ISL 1024 / OSL 64" in md
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+metrics_export.py のユニットテスト
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from metrics_export import (
+    build_run_summary,
+    format_openmetrics,
+    histogram,
+    run_labels,
+    textfile_name,
+    write_metrics_exports,
+)
+
+ENTRY = {
+    "model": 'org/model "v2"',
+    "isl": 100,
+    "osl": 200,
+    "concurrency": 10,
+    "mode": "profile",
+    "artifact_dir": "artifacts/ISL100_OSL200_CON10",
+    "run_at": 1700000000.5,
+}
+
+
+def make_record(start_s, latency_ms, tokens=10, error=None):
+    start_ns = int(start_s * 1e9)
+    record = {
+        "metadata": {"request_start_ns": start_ns, "request_end_ns": start_ns + int(latency_ms * 1e6)},
+        "metrics": {
+            "request_latency": {"value": latency_ms, "unit": "ms"},
+            "output_token_count": {"value": tokens, "unit": "tokens"},
+        },
+    }
+    if error:
+        record["error"] = error
+    return record
+
+
+@pytest.fixture
+def summary():
+    success = [make_record(0.0, 200.0), make_record(0.5, 400.0), make_record(1.0, 1000.0)]
+    data = success + [make_record(1.5, 1.0, error={"code": 429, "message": "Too Many Requests"})]
+    metric_results = {
+        "Request Latency": ([200.0, 400.0, 1000.0], "ms"),
+        "Output Tokens/sec": ([50.0, 25.0, 10.0], "tokens/s"),
+    }
+    error_summary = {"http_429": {"count": 1}}
+    return build_run_summary(ENTRY, data, success, metric_results, error_summary)
+
+
+class TestHistogram:
+    """histogram 関数のテスト"""
+
+    def test_cumulative(self):
+        """le 以下の件数を累積で数えることを確認（境界ちょうどの値は含む）"""
+        result = histogram([0.1, 0.25, 0.3, 2.0], [0.25, 1.0])
+        assert result["counts"] == [2, 3]
+        assert result["count"] == 4
+        assert result["sum"] == pytest.approx(2.65)
+
+
+class TestBuildRunSummary:
+    """build_run_summary 関数のテスト"""
+
+    def test_summary(self, summary):
+        """ラベル・件数・エラー分類・スループット・ヒストグラム（秒に変換）を確認"""
+        assert summary["labels"] == {"model": 'org/model "v2"', "isl": "100", "osl": "200", "con": "10", "mode": "profile"}
+        assert summary["requests"]["total"] == 4
+        assert summary["requests"]["errors"] == 1
+        assert summary["requests"]["errors_by_category"]["http_429"] == 1
+        assert summary["requests"]["errors_by_category"]["http_5xx"] == 0
+
+        # 実行区間は 0.0s〜2.0s（3件目の終了）、成功3件・出力30トークン
+        assert summary["throughput"]["duration_seconds"] == pytest.approx(2.0)
+        assert summary["throughput"]["requests_per_second"] == pytest.approx(1.5)
+        assert summary["throughput"]["output_tokens_per_second"] == pytest.approx(15.0)
+
+        latency = summary["metrics"]["request_latency"]
+        assert latency["unit"] == "seconds"
+        assert latency["p50"] == pytest.approx(0.4)
+        assert latency["counts"][latency["le"].index(0.25)] == 1
+        assert latency["counts"][latency["le"].index(1.0)] == 3
+        assert summary["metrics"]["output"]["unit"] == "tokens_per_second"
+        assert "time_to_first_token" not in summary["metrics"]
+
+    def test_missing_labels(self):
+        assert run_labels({"isl": 100}) == {"model": "", "isl": "100", "osl": "", "con": "", "mode": ""}
+
+
+class TestFormatOpenMetrics:
+    """format_openmetrics 関数のテスト"""
+
+    def test_format(self, summary):
+        """ヒストグラム・分位点・ラベルのエスケープと # EOF を確認"""
+        text = format_openmetrics(summary)
+        lines = text.splitlines()
+        assert lines[-1] == "# EOF"
+        labels = 'model="org/model \\"v2\\"",isl="100",osl="200",con="10",mode="profile"'
+        assert f"aiperf_run_info{{{labels}}} 1" in lines
+        assert "# TYPE aiperf_request_latency_seconds histogram" in lines
+        assert "# UNIT aiperf_request_latency_seconds seconds" in lines
+        assert f'aiperf_request_latency_seconds_bucket{{{labels},le="0.25"}} 1' in lines
+        assert f'aiperf_request_latency_seconds_bucket{{{labels},le="+Inf"}} 3' in lines
+        assert f"aiperf_request_latency_seconds_count{{{labels}}} 3" in lines
+        assert f'aiperf_request_errors{{{labels},category="http_429"}} 1' in lines
+        assert f'aiperf_latency_percentile_seconds{{{labels},metric="request_latency",percentile="p50"}} 0.4' in lines
+        assert f'aiperf_output_tokens_per_second_bucket{{{labels},le="10.0"}} 1' in lines
+
+        # 各メトリクスファミリーの TYPE は1回だけ、サンプルより前に出る
+        types = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+        assert len(types) == len(set(types))
+
+
+class TestWriteMetricsExports:
+    """write_metrics_exports 関数のテスト"""
+
+    def test_write(self, summary, tmp_path):
+        """summary.prom / summary.json と textfile collector 用のファイルを書き出すことを確認"""
+        textfile_dir = tmp_path / "textfile"
+        paths = write_metrics_exports(summary, "all", tmp_path, str(textfile_dir))
+        textfile = "aiperf_profile_ISL100_OSL200_CON10_org_model_v2.prom"
+        assert [p.name for p in paths] == ["summary.prom", textfile, "summary.json"]
+        assert (textfile_dir / textfile).read_text() == (tmp_path / "summary.prom").read_text()
+        json_text = (tmp_path / "summary.json").read_text(encoding="utf-8")
+        assert json.loads(json_text) == summary
+        assert len(json_text.splitlines()) == 1
+        assert not list(tmp_path.glob(".*.tmp"))
+
+    def test_same_config_overwrites(self, summary, tmp_path):
+        """同じ実行条件の別の実行（別の artifactディレクトリ）は同じファイルを上書きし、系列が重複しないことを確認"""
+        textfile_dir = tmp_path / "textfile"
+        write_metrics_exports(summary, "openmetrics", tmp_path / "run1", str(textfile_dir))
+        rerun = dict(summary, artifact_dir="artifacts/rerun/ISL100_OSL200_CON10", run_at=1700003600.0)
+        write_metrics_exports(rerun, "openmetrics", tmp_path / "run2", str(textfile_dir))
+        files = list(textfile_dir.glob("*.prom"))
+        assert len(files) == 1
+        # どの実行の値かは開始時刻の gauge で分かる（後から書いた実行の値になっている）
+        assert any(line.startswith("aiperf_run_start_timestamp_seconds{") and line.endswith(" 1700003600")
+                   for line in files[0].read_text().splitlines())
+
+        other = dict(summary, labels=dict(summary["labels"], con="20"))
+        write_metrics_exports(other, "openmetrics", tmp_path / "run3", str(textfile_dir))
+        assert len(list(textfile_dir.glob("*.prom"))) == 2
+
+    def test_textfile_name(self):
+        """不明なラベルは省き、ファイル名に使えない文字は _ にすることを確認"""
+        assert textfile_name({"model": "org/m:1", "isl": "", "osl": "", "con": "4", "mode": ""}) == "aiperf_run_CON4_org_m_1.prom"
+
+    def test_json_only(self, summary, tmp_path):
+        paths = write_metrics_exports(summary, "json", tmp_path)
+        assert [p.name for p in paths] == ["summary.json"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
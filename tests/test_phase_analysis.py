@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+phase_analysis.py のユニットテスト
+"""
+
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import numpy as np
+import pytest
+from phase_analysis import (
+    analyze_phases,
+    bucket_label,
+    extract_phase_arrays,
+    fit_ttft_vs_isl,
+    format_phase_markdown,
+)
+
+
+def make_record(isl, osl, ttft, latency):
+    metrics = {
+        "time_to_first_token": {"value": ttft, "unit": "ms"},
+        "request_latency": {"value": latency, "unit": "ms"},
+        "output_token_count": {"value": osl, "unit": "tokens"},
+    }
+    if isl is not None:
+        metrics["input_sequence_length"] = {"value": isl, "unit": "tokens"}
+    return {"metrics": metrics}
+
+
+class TestExtractPhaseArrays:
+    """extract_phase_arrays 関数のテスト"""
+
+    def test_throughputs(self):
+        """prefill = ISL / TTFT、decode = (OSL - 1) / (Latency - TTFT) を確認"""
+        arrays = extract_phase_arrays([make_record(1000, 101, 500.0, 2500.0)])
+        assert arrays["prefill_tps"][0] == pytest.approx(2000.0)
+        assert arrays["decode_tps"][0] == pytest.approx(50.0)
+
+    def test_missing_values(self):
+        """ISL が無い / OSL が1以下の場合は NaN になることを確認"""
+        arrays = extract_phase_arrays([make_record(None, 1, 500.0, 600.0)])
+        assert np.isnan(arrays["prefill_tps"][0])
+        assert np.isnan(arrays["decode_tps"][0])
+
+
+class TestFitTtftVsIsl:
+    """fit_ttft_vs_isl 関数のテスト"""
+
+    def test_linear_fit(self):
+        """TTFT = 20ms + 0.5ms/token × ISL を復元できることを確認"""
+        isl = np.array([100.0, 200.0, 400.0, 800.0])
+        fit = fit_ttft_vs_isl(isl, 20.0 + 0.5 * isl)
+        assert fit["intercept_ms"] == pytest.approx(20.0)
+        assert fit["slope_ms_per_token"] == pytest.approx(0.5)
+        assert fit["prefill_tokens_per_sec"] == pytest.approx(2000.0)
+        assert fit["r_squared"] == pytest.approx(1.0)
+
+    def test_constant_isl(self):
+        """ISL が一定の場合は回帰しない"""
+        assert fit_ttft_vs_isl(np.array([100.0, 100.0, 100.0]), np.array([10.0, 11.0, 12.0])) is None
+
+
+class TestAnalyzePhases:
+    """analyze_phases 関数のテスト"""
+
+    def test_buckets_and_verdict(self):
+        """バケット分けと、TTFT が latency の大半を占める場合の prefill 律速判定を確認"""
+        data = [
+            make_record(100, 10, 300.0, 400.0),
+            make_record(120, 10, 300.0, 400.0),
+            make_record(3000, 10, 900.0, 1000.0),
+        ]
+        analysis = analyze_phases(data, concurrency=8)
+        assert analysis["verdict"] == "prefill-bound"
+        assert analysis["prefill_share"] == pytest.approx(1500.0 / 1800.0)
+        assert [(row["bucket"], row["count"]) for row in analysis["by_input_length"]] == [("<128", 2), ("2048-4095", 1)]
+        assert analysis["by_output_length"][0]["decode_tps"]["p50"] == pytest.approx(90.0)
+        assert analysis["ttft_fit"] is not None
+
+        lines = format_phase_markdown(analysis)
+        assert "## Prefill / Decode" in lines
+        assert any("prefill-bound" in line and "CON=8" in line for line in lines)
+        assert "### By Input Length (ISL)" in lines
+
+    def test_decode_bound(self):
+        """decode が長い場合は decode 律速、ISL が一定なら回帰なしと出力することを確認"""
+        analysis = analyze_phases([make_record(100, 201, 50.0, 4050.0)] * 3)
+        assert analysis["verdict"] == "decode-bound"
+        assert analysis["ttft_fit"] is None
+        assert any("回帰なし" in line for line in format_phase_markdown(analysis))
+
+    def test_no_data(self):
+        assert analyze_phases([]) is None
+        assert analyze_phases([{"metrics": {}}]) is None
+
+
+class TestBucketLabel:
+    """bucket_label 関数のテスト"""
+
+    def test_labels(self):
+        assert bucket_label(0) == "<128"
+        assert bucket_label(1) == "128-255"
+        assert bucket_label(9) == ">=32768"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+resource_sampler.py のユニットテスト
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from resource_sampler import (
+    ResourceSampler,
+    format_resource_markdown,
+    list_process_tree,
+    load_resource_host,
+    load_resource_samples,
+    read_stat,
+    read_tcp_table,
+    summarize_resource_samples,
+)
+
+TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def _tcp_line(state: str, inode: str) -> str:
+    return f"   0: 0100007F:1F90 0100007F:C350 {state} 00000000:00000000 00:00000000 00000000  1000        0 {inode} 1\n"
+
+
+def _make_process(proc_root: Path, pid: int, ppid: int, ticks: int, rss_kb: int, sockets=(), ctx=(0, 0)):
+    pid_dir = proc_root / str(pid)
+    (pid_dir / "fd").mkdir(parents=True)
+    # comm に空白と括弧を含めて、パースが壊れないことも確認する
+    utime, stime = ticks // 2, ticks - ticks // 2
+    fields = ["S", str(ppid)] + ["0"] * 9 + [str(utime), str(stime)] + ["0"] * 10
+    (pid_dir / "stat").write_text(f"{pid} (python (worker) 1) " + " ".join(fields) + "\n")
+    (pid_dir / "status").write_text(
+        f"Name:\tpython\nVmRSS:\t{rss_kb} kB\n"
+        f"voluntary_ctxt_switches:\t{ctx[0]}\nnonvoluntary_ctxt_switches:\t{ctx[1]}\n"
+    )
+    os.symlink("/dev/null", pid_dir / "fd" / "0")
+    for i, inode in enumerate(sockets, start=3):
+        os.symlink(f"socket:[{inode}]", pid_dir / "fd" / str(i))
+
+
+@pytest.fixture
+def proc_root(tmp_path):
+    root = tmp_path / "proc"
+    root.mkdir()
+    _make_process(root, 100, 1, ticks=100, rss_kb=1024, ctx=(10, 1))
+    _make_process(root, 101, 100, ticks=200, rss_kb=2048, sockets=["555", "556"], ctx=(20, 2))
+    _make_process(root, 102, 101, ticks=50, rss_kb=1024)
+    _make_process(root, 200, 1, ticks=999, rss_kb=9999)  # 対象外のプロセス
+    (root / "net").mkdir()
+    (root / "net" / "tcp").write_text(
+        TCP_HEADER + _tcp_line("01", "555") + _tcp_line("08", "556") + _tcp_line("06", "0") + _tcp_line("01", "777")
+    )
+    (root / "meminfo").write_text("MemAvailable:    2048000 kB\nSwapTotal:       1024 kB\nSwapFree:         512 kB\n")
+    (root / "loadavg").write_text("0.50 0.40 0.30 1/100 12345\n")
+    return root
+
+
+class TestProcParsing:
+    """/proc のパースのテスト"""
+
+    def test_read_stat(self, proc_root):
+        """comm に空白や括弧があっても ppid と CPU tick を読めることを確認"""
+        assert read_stat(101, proc_root) == (100, 200)
+        assert read_stat(999, proc_root) is None
+
+    def test_process_tree(self, proc_root):
+        """子孫だけを含むことを確認"""
+        assert list_process_tree(100, proc_root) == {100, 101, 102}
+
+    def test_tcp_table(self, proc_root):
+        """inode → 状態と TIME_WAIT 数を読めることを確認"""
+        table, time_wait = read_tcp_table(proc_root)
+        assert table == {"555": "01", "556": "08", "777": "01"}
+        assert time_wait == 1
+
+
+class TestResourceSampler:
+    """ResourceSampler のテスト"""
+
+    def test_sample_and_rates(self, proc_root):
+        """合計値と、2回目のサンプルでCPU使用率・コンテキストスイッチの率が出ることを確認"""
+        sampler = ResourceSampler(100, proc_root)
+        sampler.clock_ticks = 100
+
+        first = sampler.sample(now=1000.0)
+        assert first["processes"] == 3
+        assert first["rss_mb"] == pytest.approx(4.0)
+        assert first["open_fds"] == 5
+        assert first["tcp_connections"] == 2
+        assert first["tcp_established"] == 1
+        assert first["system_tcp_time_wait"] == 1
+        assert first["swap_used_mb"] == pytest.approx(0.5)
+        assert first["cpu_percent"] is None
+
+        # 2秒間で 100 tick（= 1秒分のCPU）と自発的コンテキストスイッチ 30 回
+        _make_process(proc_root, 103, 100, ticks=100, rss_kb=0, ctx=(30, 0))
+        second = sampler.sample(now=1002.0)
+        assert second["processes"] == 4
+        assert second["cpu_percent"] == pytest.approx(50.0)
+        assert second["max_process_cpu_percent"] == pytest.approx(50.0)
+        assert second["ctx_switches_voluntary_per_sec"] == pytest.approx(15.0)
+
+    def test_exclude_subtree(self, proc_root):
+        """除外したプロセスとその子孫（別のサンプラーなど）を集計に含めないことを確認"""
+        sampler = ResourceSampler(100, proc_root, exclude={101})
+        sample = sampler.sample(now=1000.0)
+        assert sample["processes"] == 1
+        assert sample["rss_mb"] == pytest.approx(1.0)
+
+
+class TestSummarize:
+    """集計と summary.md 出力のテスト"""
+
+    def test_mean_and_peak(self):
+        """None を除いて平均とピークを計算することを確認"""
+        samples = [{"cpu_percent": None, "rss_mb": 10.0}, {"cpu_percent": 50.0, "rss_mb": 30.0}]
+        summary = summarize_resource_samples(samples)
+        assert summary["cpu_percent"] == {"mean": 50.0, "peak": 50.0, "min": 50.0, "count": 1}
+        assert summary["rss_mb"]["mean"] == pytest.approx(20.0)
+        assert summary["rss_mb"]["peak"] == pytest.approx(30.0)
+
+    def test_markdown_and_load(self, tmp_path):
+        """client_resources.jsonl を読み込み（壊れた行は無視）、表を出力することを確認"""
+        (tmp_path / "client_resources.jsonl").write_text(
+            json.dumps({"cpu_percent": 20.0, "swap_used_mb": 0.0}) + "\n"
+            + json.dumps({"cpu_percent": 40.0, "swap_used_mb": 64.0}) + "\n{\"cpu_"
+        )
+        samples = load_resource_samples(tmp_path)
+        assert len(samples) == 2
+
+        lines = format_resource_markdown(summarize_resource_samples(samples), len(samples))
+        assert "## Client Resources" in lines
+        assert "| CPU | 30.00 | 40.00 | % |" in lines
+        assert any("スワップ" in line for line in lines)
+
+    def test_missing_file(self, tmp_path):
+        assert load_resource_samples(tmp_path) == []
+        assert load_resource_host(tmp_path) == {}
+
+    def test_cpu_bound_uses_recorded_host(self, tmp_path):
+        """先頭行のホストのコア数で飽和を判定し、ホスト情報の行はサンプルに含めないことを確認"""
+        (tmp_path / "client_resources.jsonl").write_text(
+            json.dumps({"host": {"hostname": "loadgen", "cpu_count": 2}}) + "\n"
+            + json.dumps({"cpu_percent": 190.0, "max_process_cpu_percent": 100.0}) + "\n"
+        )
+        samples = load_resource_samples(tmp_path)
+        assert len(samples) == 1
+        host = load_resource_host(tmp_path)
+        assert host["cpu_count"] == 2
+
+        lines = format_resource_markdown(summarize_resource_samples(samples), len(samples), host["cpu_count"])
+        assert any("（2コア）" in line for line in lines)
+        # 集計するマシンのコア数が多くても、記録したホストのコア数で判定する
+        lines = format_resource_markdown(summarize_resource_samples(samples), len(samples), 64)
+        assert not any("（64コア）" in line for line in lines)
+
+    def test_single_process_saturation(self):
+        """ホスト全体に余裕があっても、1プロセスが1コアに張り付いていれば警告することを確認"""
+        samples = [{"cpu_percent": 120.0, "max_process_cpu_percent": 98.0}] * 3
+        lines = format_resource_markdown(summarize_resource_samples(samples), len(samples), 16)
+        assert "| CPU (busiest process) | 98.00 | 98.00 | % |" in lines
+        assert any("1コアの上限付近" in line for line in lines)
+        assert not any("（16コア）" in line for line in lines)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+run_history.py / run_meta.py のユニットテスト
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from run_history import (
+    build_sketch,
+    connect,
+    merge_sketches,
+    parse_since,
+    query_trend,
+    record_run,
+    sketch_quantile,
+)
+from run_meta import compute_dataset_hash, load_run_meta, write_run_meta
+
+
+def make_run(artifact_dir="artifacts/ISL100_OSL200_CON20", run_at=1_000.0, con=20, model="m"):
+    return {
+        "artifact_dir": artifact_dir, "mode": "profile", "model": model, "url": "http://x",
+        "isl": 100, "osl": 200, "concurrency": con, "dataset_hash": "abc",
+        "git_revision": "deadbee", "run_at": run_at, "record_count": 30, "error_count": 0,
+    }
+
+
+class TestSketch:
+    """スケッチ（対数バケットヒストグラム）のテスト"""
+
+    def test_quantile_within_relative_accuracy(self):
+        """復元したquantileが相対誤差1%以内に収まることを確認"""
+        values = [float(v) for v in range(1, 1001)]
+        sketch = build_sketch(values)
+        assert sketch_quantile(sketch, 0.50) == pytest.approx(500.5, rel=0.01)
+        assert sketch_quantile(sketch, 0.99) == pytest.approx(990.0, rel=0.01)
+
+    def test_merge(self):
+        """マージしたスケッチが全値のスケッチと一致することを確認"""
+        a = build_sketch([1.0, 2.0, 3.0])
+        b = build_sketch([4.0, 5.0, 0.0])
+        merged = merge_sketches([a, b])
+        assert merged == build_sketch([1.0, 2.0, 3.0, 4.0, 5.0, 0.0])
+        assert merged["zero_count"] == 1
+
+    def test_empty(self):
+        """空のスケッチは0を返すことを確認"""
+        assert sketch_quantile(build_sketch([]), 0.99) == 0.0
+
+
+class TestStore:
+    """実行履歴DBのテスト"""
+
+    def test_record_and_query(self, tmp_path):
+        """条件で絞り込んで時刻順に取得できることを確認"""
+        conn = connect(str(tmp_path / "history.sqlite"))
+        metrics = {"TTFT": {"unit": "ms", "p50": 100.0, "p95": 150.0, "p99": 200.0, "avg": 110.0, "count": 30}}
+        record_run(conn, make_run(run_at=2_000.0), metrics)
+        record_run(conn, make_run(artifact_dir="artifacts/b", run_at=1_000.0), metrics)
+        record_run(conn, make_run(artifact_dir="artifacts/c", con=5), metrics)
+
+        rows = query_trend(conn, "TTFT", {"concurrency": 20})
+        assert [row["run_at"] for row in rows] == [1_000.0, 2_000.0]
+        assert rows[0]["p99"] == 200.0
+
+        assert len(query_trend(conn, "TTFT", {"concurrency": 20}, since=1_500.0)) == 1
+        assert query_trend(conn, "Request Latency") == []
+
+    def test_rerecord_replaces(self, tmp_path):
+        """同じ実行を再記録すると置き換えられることを確認（make summary の再実行）"""
+        conn = connect(str(tmp_path / "history.sqlite"))
+        record_run(conn, make_run(), {"TTFT": {"p99": 200.0}})
+        record_run(conn, make_run(), {"TTFT": {"p99": 250.0}})
+
+        rows = query_trend(conn, "TTFT")
+        assert len(rows) == 1
+        assert rows[0]["p99"] == 250.0
+        assert conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0] == 1
+
+
+class TestParseSince:
+    """parse_since関数のテスト"""
+
+    def test_relative_days(self):
+        """30d が30日前のエポック秒になることを確認"""
+        assert parse_since("30d") == pytest.approx(time.time() - 30 * 86400, abs=5)
+
+    def test_invalid(self):
+        """不正な値はエラーになることを確認"""
+        with pytest.raises(ValueError):
+            parse_since("last month")
+
+
+class TestRunMeta:
+    """run_meta.py のテスト"""
+
+    def test_dataset_hash_for_file(self, tmp_path):
+        """入力ファイルの内容が変わるとハッシュが変わることを確認"""
+        trace = tmp_path / "trace.jsonl"
+        trace.write_text('{"text": "a"}\n', encoding="utf-8")
+        first = compute_dataset_hash(str(trace), {})
+        trace.write_text('{"text": "b"}\n', encoding="utf-8")
+        assert compute_dataset_hash(str(trace), {}) != first
+
+    def test_dataset_hash_for_synthetic(self):
+        """synthetic modeでは同じパラメータなら同じハッシュになることを確認"""
+        env = {"INPUT_TOKENS_MEAN": "100", "INPUT_TOKENS_STDDEV": "20", "OUTPUT_TOKENS_MEAN": "200"}
+        assert compute_dataset_hash(None, env) == compute_dataset_hash(None, dict(env))
+        assert compute_dataset_hash(None, env) != compute_dataset_hash(None, dict(env, OUTPUT_TOKENS_MEAN="100"))
+
+    def test_write_and_load(self, tmp_path):
+        """run_meta.json を書き込んで読み込めることを確認"""
+        write_run_meta(tmp_path, {"model": "m", "concurrency": 10})
+        assert load_run_meta(tmp_path) == {"model": "m", "concurrency": 10}
+        assert load_run_meta(tmp_path / "missing") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
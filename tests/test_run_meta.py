@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+run_meta.py のユニットテスト
+"""
+
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from run_meta import default_artifact_dir
+
+
+class TestDefaultArtifactDir:
+    """default_artifact_dir のテスト"""
+
+    def test_modes(self):
+        """run_aiperf_profile.sh と同じ名前になることを確認"""
+        assert default_artifact_dir("profile", 100, 200, 40) == Path("artifacts/ISL100_OSL200_CON40")
+        assert default_artifact_dir("warmup", 100, 200, 3) == Path("artifacts/warmup_ISL100_OSL200_CON3")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+sample_trace.py のユニットテスト
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from sample_trace import (
+    HEURISTIC_TOKENIZER,
+    allocate_counts,
+    extract_text,
+    index_path,
+    is_sample_current,
+    sample_trace,
+)
+
+
+def _write_trace(path: Path, lengths):
+    """指定した文字数のプロンプトを持つ trace.jsonl（近似では文字数 / 4 トークン）"""
+    with open(path, "w", encoding="utf-8") as f:
+        for i, n in enumerate(lengths):
+            f.write(json.dumps({"role": "user", "texts": [{"name": "prompt", "contents": [f"{i:06d}" + "x" * (n - 6)]}]}) + "\n")
+    return path
+
+
+class TestExtractText:
+    """extract_text 関数のテスト"""
+
+    def test_single_turn(self):
+        assert extract_text({"text": "a"}) == "a"
+        assert extract_text({"texts": [{"name": "p", "contents": ["a", "b"]}, "c"]}) == "a\nb\nc"
+
+    def test_multi_turn(self):
+        """multi_turn はセッション内のすべての turn を連結"""
+        entry = {"session_id": "s1", "turns": [{"text": "hello"}, {"texts": [{"contents": ["again"]}]}]}
+        assert extract_text(entry) == "hello\nagain"
+
+
+class TestAllocateCounts:
+    """allocate_counts 関数のテスト"""
+
+    def test_proportional(self):
+        """件数に比例し、合計がちょうど total になることを確認"""
+        quotas = allocate_counts({0: 600, 1: 300, 2: 99, 3: 1}, 10)
+        assert quotas == {0: 6, 1: 3, 2: 1, 3: 0}
+        assert sum(allocate_counts({0: 1, 1: 1, 2: 1}, 2).values()) == 2
+
+    def test_small_population(self):
+        """元の行数が total 以下なら全件"""
+        assert allocate_counts({0: 2, 5: 1}, 10) == {0: 2, 5: 1}
+
+
+class TestSampleTrace:
+    """sample_trace 関数のテスト"""
+
+    def test_distribution_and_index(self, tmp_path):
+        """バケットの割合を保って抽出し、元の順序・インデックスを書き出すことを確認"""
+        # 近似トークン数: 25（<128）× 600、250（128-255）× 300、1250（1024-2047）× 100
+        source = _write_trace(tmp_path / "trace.jsonl", [100] * 600 + [1000] * 300 + [5000] * 100)
+        with open(source, "a", encoding="utf-8") as f:
+            f.write("not json\n")
+        output = tmp_path / "trace.sample50.jsonl"
+
+        index = sample_trace(source, output, 50, seed=1)
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 50
+        prefixes = [json.loads(line)["texts"][0]["contents"][0][:6] for line in lines]
+        assert prefixes == sorted(prefixes)
+
+        assert index["lines"] == 1000
+        assert index["invalid_lines"] == 1
+        assert index["tokenizer"] == HEURISTIC_TOKENIZER
+        assert [(b["bucket"], b["count"], b["sampled"]) for b in index["buckets"]] == [
+            ("<128", 600, 30), ("128-255", 300, 15), ("1024-2047", 100, 5),
+        ]
+        assert json.loads(index_path(output).read_text(encoding="utf-8")) == index
+
+    def test_deterministic_across_workers(self, tmp_path):
+        """同じシードなら、プロセスプールを使っても同じ行が選ばれることを確認"""
+        source = _write_trace(tmp_path / "trace.jsonl", [40 + (i * 37) % 2000 for i in range(500)])
+        first = sample_trace(source, tmp_path / "a.jsonl", 20, seed=7, batch_size=16)
+        second = sample_trace(source, tmp_path / "b.jsonl", 20, workers=2, seed=7, batch_size=16)
+        assert first["buckets"] == second["buckets"]
+        assert (tmp_path / "a.jsonl").read_text() == (tmp_path / "b.jsonl").read_text()
+
+    def test_tokenizer_fallback(self, tmp_path, capsys):
+        """tokenizer を読み込めない場合は近似で数え、同じ指定なら再利用できることを確認"""
+        source = _write_trace(tmp_path / "trace.jsonl", [100] * 10)
+        output = tmp_path / "out.jsonl"
+        index = sample_trace(source, output, 5, tokenizer_name="no-such/tokenizer-for-tests")
+        assert index["tokenizer"] == HEURISTIC_TOKENIZER
+        assert "Failed to load tokenizer" in capsys.readouterr().err
+
+        assert is_sample_current(source, output, 5, "no-such/tokenizer-for-tests", 42)
+        assert not is_sample_current(source, output, 5, None, 42)
+        assert not is_sample_current(source, output, 6, "no-such/tokenizer-for-tests", 42)
+        with open(source, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"text": "new"}) + "\n")
+        assert not is_sample_current(source, output, 5, "no-such/tokenizer-for-tests", 42)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
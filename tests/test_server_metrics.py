@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+server_metrics.py のユニットテスト
+"""
+
+import json
+import sys
+import urllib.request
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from server_metrics import (
+    analyze_server_metrics,
+    format_server_metrics_markdown,
+    load_server_metrics,
+    parse_prometheus_text,
+    scrape,
+    select_samples,
+)
+from stub_server import StubMetrics, make_server, start_in_thread
+
+PROMETHEUS_TEXT = """\
+# HELP vllm:num_requests_running Number of requests running.
+# TYPE vllm:num_requests_running gauge
+vllm:num_requests_running{model_name="m",engine="0"} 3.0
+vllm:num_requests_running{model_name="m",engine="1"} 2.0
+vllm:num_requests_waiting{model_name="m"} 7
+vllm:kv_cache_usage_perc{model_name="m"} 0.25
+vllm:e2e_request_latency_seconds_bucket{le="0.5",model_name="m"} 10
+vllm:e2e_request_latency_seconds_sum{model_name="m"} 4.5
+escaped{path="a\\"b\\\\c"} 1
+broken_line
+nan_metric NaN
+"""
+
+BASE_SEC = 1_700_000_000.0
+
+
+def _sample(offset_sec: float, running: float, hits: float, queries: float):
+    return {
+        "timestamp": BASE_SEC + offset_sec,
+        "metrics": {
+            'vllm:num_requests_running{model_name="m"}': running,
+            'vllm:prefix_cache_hits_total{model_name="m"}': hits,
+            'vllm:prefix_cache_queries_total{model_name="m"}': queries,
+        },
+    }
+
+
+def _span(start_sec: float, end_sec: float):
+    return int((BASE_SEC + start_sec) * 1e9), int((BASE_SEC + end_sec) * 1e9)
+
+
+class TestParsePrometheusText:
+    """parse_prometheus_text / select_samples のテスト"""
+
+    def test_parse(self):
+        """コメント・壊れた行を無視し、ラベルのエスケープを戻すことを確認"""
+        samples = parse_prometheus_text(PROMETHEUS_TEXT)
+        names = [name for name, _, _ in samples]
+        assert "broken_line" not in names
+        assert names.count("vllm:num_requests_running") == 2
+        assert ("escaped", {"path": 'a"b\\c'}, 1.0) in samples
+
+    def test_select_drops_buckets_and_nan(self):
+        """既定では _bucket と NaN を保存しないことを確認"""
+        selected = select_samples(parse_prometheus_text(PROMETHEUS_TEXT))
+        assert not any("_bucket" in key for key in selected)
+        assert not any(key.startswith("nan_metric") for key in selected)
+        assert selected['vllm:num_requests_running{engine="0",model_name="m"}'] == 3.0
+        assert 'vllm:e2e_request_latency_seconds_sum{model_name="m"}' in selected
+
+    def test_select_with_filter(self):
+        """正規表現を指定した場合は一致する名前だけを保存することを確認"""
+        selected = select_samples(parse_prometheus_text(PROMETHEUS_TEXT), r"^vllm:kv_cache")
+        assert list(selected) == ['vllm:kv_cache_usage_perc{model_name="m"}']
+
+
+class TestAnalyzeServerMetrics:
+    """analyze_server_metrics のテスト"""
+
+    def test_window_gauges_and_prefix_cache(self):
+        """実行区間外のサンプルを除き、ゲージの平均・最大とカウンタ増分のヒット率を求めることを確認"""
+        samples = [
+            _sample(-5, 0, 100, 100),  # 実行前（ウォームアップ等）は含めない
+            _sample(1, 2, 100, 110),
+            _sample(2, 4, 105, 130),
+            _sample(3, 6, 110, 150),
+            _sample(20, 0, 500, 500),  # 実行後も含めない
+        ]
+        analysis = analyze_server_metrics(samples, [_span(0, 4), _span(1.5, 3.5)])
+        assert analysis["sample_count"] == 3
+        assert analysis["total_samples"] == 5
+        assert analysis["gauges"]["requests_running"]["mean"] == pytest.approx(4.0)
+        assert analysis["gauges"]["requests_running"]["max"] == pytest.approx(6.0)
+        assert analysis["prefix_cache"] == {"hits": 10.0, "queries": 40.0, "hit_rate": pytest.approx(25.0)}
+
+        timeline = analysis["timeline"]
+        assert [row["client_in_flight"] for row in timeline] == [1, 2, 2]
+        assert timeline[0]["prefix_cache_hit_rate"] is None
+        assert timeline[1]["prefix_cache_hit_rate"] == pytest.approx(25.0)
+
+    def test_ratio_gauge_in_percent(self):
+        """0〜1 の比率で公開されるゲージを % に直すことを確認"""
+        samples = [{"timestamp": BASE_SEC, "metrics": {"vllm:gpu_prefix_cache_hit_rate": 0.5}}]
+        analysis = analyze_server_metrics(samples, [])
+        assert analysis["gauges"]["prefix_cache_hit_rate"]["mean"] == pytest.approx(50.0)
+        assert analysis["prefix_cache"] is None
+
+    def test_no_samples_in_window(self):
+        """実行区間にサンプルが無ければ None"""
+        assert analyze_server_metrics([_sample(-5, 0, 0, 0)], [_span(0, 1)]) is None
+
+
+class TestFormatServerMetricsMarkdown:
+    """format_server_metrics_markdown のテスト"""
+
+    def test_prefix_cache_warning(self):
+        """prefix cache のヒットがあれば警告を出すことを確認"""
+        analysis = analyze_server_metrics([_sample(1, 2, 0, 0), _sample(2, 2, 5, 10)], [_span(0, 3)])
+        lines = format_server_metrics_markdown(analysis)
+        assert "## Server Metrics (Prometheus)" in lines
+        assert "| Running Requests | 2.00 | 2.00 | count |" in lines
+        assert any("5 hits / 10 queries = 50.0%" in line for line in lines)
+        assert any("PROMPT_CACHE_AVOIDANCE.md" in line for line in lines)
+
+    def test_unknown_metrics(self):
+        """既知のメトリクスが無い場合もエラーにならないことを確認"""
+        analysis = analyze_server_metrics([{"timestamp": BASE_SEC, "metrics": {"other": 1.0}}], [])
+        lines = format_server_metrics_markdown(analysis)
+        assert any("見つかりませんでした" in line for line in lines)
+
+
+class TestLoadServerMetrics:
+    """load_server_metrics のテスト"""
+
+    def test_skip_errors_and_broken_lines(self, tmp_path):
+        """スクレイプ失敗の行と壊れた行を除くことを確認"""
+        (tmp_path / "server_metrics.jsonl").write_text(
+            json.dumps({"timestamp": 1.0, "metrics": {"a": 1.0}}) + "\n"
+            + json.dumps({"timestamp": 2.0, "error": "connection refused"}) + "\n{\"time"
+        )
+        assert load_server_metrics(tmp_path) == [{"timestamp": 1.0, "metrics": {"a": 1.0}}]
+
+    def test_missing_file(self, tmp_path):
+        assert load_server_metrics(tmp_path) == []
+
+
+class TestStubServerMetrics:
+    """スタブサーバの /metrics をスクレイプするテスト"""
+
+    def test_scrape_stub(self):
+        """同じプロンプトの2回目が prefix cache ヒットとして数えられることを確認"""
+        server = make_server(output_tokens=2)
+        _, base_url = start_in_thread(server)
+        try:
+            body = json.dumps({"model": "stub-model", "messages": [{"role": "user", "content": "hi"}]}).encode()
+            for _ in range(2):
+                request = urllib.request.Request(
+                    f"{base_url}/v1/chat/completions", data=body, headers={"Content-Type": "application/json"}
+                )
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+            metrics = scrape(f"{base_url}/metrics")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert metrics['vllm:prefix_cache_queries_total{model_name="stub-model"}'] == 2.0
+        assert metrics['vllm:prefix_cache_hits_total{model_name="stub-model"}'] == 1.0
+        assert metrics['vllm:num_requests_running{model_name="stub-model"}'] == 0.0
+
+    def test_prefix_cache_is_bounded(self, monkeypatch):
+        """覚えるプロンプトの数が上限を超えず、古いものから忘れる（LRU）ことを確認"""
+        monkeypatch.setattr(StubMetrics, "PREFIX_CACHE_MAX_ENTRIES", 2)
+        metrics = StubMetrics()
+
+        def send(content):
+            metrics.start({"messages": [{"role": "user", "content": content}]})
+            metrics.finish()
+
+        for content in ("a", "b", "a", "c", "b", "a"):
+            send(content)
+        # a, b → a はヒット（a が最新に）→ c で b を忘れる → b はミスで a を忘れる → a もミス
+        assert len(metrics.seen_prompts) == 2
+        assert metrics.prefix_cache_queries == 6
+        assert metrics.prefix_cache_hits == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
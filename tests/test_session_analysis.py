@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+session_analysis.py のユニットテスト
+"""
+
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import pytest
+from session_analysis import (
+    analyze_sessions,
+    compute_context_ttft,
+    compute_session_completion,
+    extract_turns,
+    group_sessions,
+)
+
+
+def make_turn(session, turn, ttft, isl, osl, start_ns=None, end_ns=None):
+    metadata = {"x_correlation_id": session, "turn_index": turn}
+    if start_ns is not None:
+        metadata["request_start_ns"] = start_ns
+        metadata["request_end_ns"] = end_ns
+    return {
+        "metadata": metadata,
+        "metrics": {
+            "time_to_first_token": {"value": ttft, "unit": "ms"},
+            "request_latency": {"value": ttft * 4, "unit": "ms"},
+            "input_sequence_length": {"value": isl, "unit": "tokens"},
+            "output_token_count": {"value": osl, "unit": "tokens"},
+        },
+    }
+
+
+class TestGroupSessions:
+    """extract_turns / group_sessions 関数のテスト"""
+
+    def test_sorted_by_turn_index(self):
+        """セッションごとにまとめられ、turn index順に並ぶことを確認"""
+        data = [
+            make_turn("a", 1, 200.0, 10, 10),
+            make_turn("b", 0, 100.0, 10, 10),
+            make_turn("a", 0, 100.0, 10, 10),
+        ]
+        sessions = group_sessions(extract_turns(data))
+        assert sorted(sessions) == ["a", "b"]
+        assert [t["turn_index"] for t in sessions["a"]] == [0, 1]
+
+    def test_missing_turn_index_uses_order(self):
+        """turn indexが無い場合は出現順で振り直されることを確認"""
+        data = [{"session_id": "s", "ttft": 100.0}, {"session_id": "s", "ttft": 120.0}]
+        sessions = group_sessions(extract_turns(data))
+        assert [t["turn_index"] for t in sessions["s"]] == [0, 1]
+
+    def test_records_without_session_are_skipped(self):
+        """セッションIDが無いレコードは除外されることを確認"""
+        assert extract_turns([{"metrics": {"time_to_first_token": 100.0}}]) == []
+
+
+class TestSessionCompletion:
+    """compute_session_completion関数のテスト"""
+
+    def test_from_timestamps(self):
+        """タイムスタンプがあれば最初の開始〜最後の終了を使うことを確認"""
+        data = [
+            make_turn("a", 0, 100.0, 10, 10, start_ns=0, end_ns=400_000_000),
+            make_turn("a", 1, 100.0, 10, 10, start_ns=500_000_000, end_ns=900_000_000),
+        ]
+        durations = compute_session_completion(group_sessions(extract_turns(data)))
+        assert durations == [900.0]
+
+    def test_fallback_to_latency_sum(self):
+        """タイムスタンプが無い場合はlatencyの合計を使うことを確認"""
+        data = [make_turn("a", 0, 100.0, 10, 10), make_turn("a", 1, 50.0, 10, 10)]
+        durations = compute_session_completion(group_sessions(extract_turns(data)))
+        assert durations == [600.0]
+
+
+class TestContextTtft:
+    """compute_context_ttft関数のテスト"""
+
+    def test_accumulated_context_and_slope(self):
+        """累積文脈長のバケットとTTFTの傾きを算出できることを確認"""
+        # 文脈長: turn0 = 100, turn1 = 100 + 50 + 100 = 250
+        data = [make_turn("a", 0, 100.0, 100, 50), make_turn("a", 1, 250.0, 100, 50)]
+        context = compute_context_ttft(group_sessions(extract_turns(data)))
+
+        assert [b["lower"] for b in context["buckets"]] == [64, 128]
+        # (250 - 100) ms / (250 - 100) tokens = 1 ms/token = 1000 ms / 1k tokens
+        assert context["slope_ms_per_1k_tokens"] == pytest.approx(1000.0)
+
+
+class TestAnalyzeSessions:
+    """analyze_sessions関数のテスト"""
+
+    def test_single_turn_returns_none(self):
+        """single_turnのデータではNoneを返すことを確認"""
+        data = [make_turn("a", 0, 100.0, 10, 10), make_turn("b", 0, 100.0, 10, 10)]
+        assert analyze_sessions(data) is None
+
+    def test_turn_stats(self):
+        """turn index別の統計が算出されることを確認"""
+        data = [
+            make_turn("a", 0, 100.0, 10, 10),
+            make_turn("a", 1, 300.0, 10, 10),
+            make_turn("b", 0, 200.0, 10, 10),
+        ]
+        analysis = analyze_sessions(data)
+        assert analysis["session_count"] == 2
+        assert analysis["turn_stats"][0]["ttft"]["p50"] == 150.0
+        assert analysis["turn_stats"][1]["count"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
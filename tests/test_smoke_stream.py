@@ -144,5 +144,81 @@ class TestSmokeStream:
         assert full_response == "Hello World"
 
 
+class TestProbeCountConfig:
+    """SMOKE_PROBES の検証のテスト"""
+
+    def test_parse_probe_count(self):
+        """空は0、0以上の整数はそのまま、それ以外は ValueError になることを確認"""
+        from smoke_stream import parse_probe_count
+
+        assert parse_probe_count("") == 0
+        assert parse_probe_count(" 5 ") == 5
+        for value in ("abc", "1.5", "-1"):
+            with pytest.raises(ValueError):
+                parse_probe_count(value)
+
+    @patch.dict(os.environ, {"MODEL": "m", "AIPERF_URL": "http://127.0.0.1:9", "API_KEY": "", "SMOKE_PROBES": "three"})
+    @patch('openai.OpenAI')
+    def test_invalid_probe_count_exits_before_connecting(self, mock_openai, capsys):
+        """不正な SMOKE_PROBES は接続を試みる前に設定エラーとして終了することを確認"""
+        from smoke_stream import main
+
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+        assert exc_info.value.code == 1
+        mock_openai.assert_not_called()
+        err = capsys.readouterr().err
+        assert "SMOKE_PROBES must be a non-negative integer" in err
+        assert "Troubleshooting" not in err
+
+
+class TestConnectionPhaseProbes:
+    """接続フェーズごとの計測（スタブサーバに対して実行）"""
+
+    @pytest.fixture
+    def stub_url(self):
+        from stub_server import make_server, start_in_thread
+
+        server = make_server(output_tokens=4)
+        _, base_url = start_in_thread(server)
+        yield base_url
+        server.shutdown()
+        server.server_close()
+
+    def test_cold_and_keepalive(self, stub_url):
+        """cold は DNS / TCP を含み、keep-alive は同じ接続を再利用することを確認"""
+        from smoke_stream import run_phase_probes
+
+        results = run_phase_probes(f"{stub_url}/v1/chat/completions", "stub-model", "", 2)
+        assert len(results["cold"]) == 2
+        assert len(results["keepalive"]) == 2
+        for timings in results["cold"]:
+            assert {"dns_ms", "tcp_ms", "headers_ms", "first_token_ms", "ttft_ms", "total_ms"} <= set(timings)
+            assert "tls_ms" not in timings
+            assert timings["headers_ms"] <= timings["first_token_ms"] <= timings["ttft_ms"] <= timings["total_ms"]
+        for timings in results["keepalive"]:
+            assert "dns_ms" not in timings
+            assert timings["reused"] == 1.0
+
+    def test_http_error(self, stub_url):
+        """200以外の応答は RuntimeError になることを確認"""
+        from smoke_stream import run_phase_probes
+
+        with pytest.raises(RuntimeError, match="HTTP 404"):
+            run_phase_probes(f"{stub_url}/v1/unknown", "stub-model", "", 1)
+
+    def test_report(self):
+        """中央値の表と、接続確立のコスト・サーバ側の内訳を出力することを確認"""
+        from smoke_stream import format_phase_report
+
+        cold = [{"dns_ms": 1.0, "tcp_ms": 2.0, "tls_ms": 30.0, "headers_ms": 5.0, "first_token_ms": 20.0,
+                 "ttft_ms": 53.0, "total_ms": 60.0}]
+        keepalive = [{"headers_ms": 4.0, "first_token_ms": 18.0, "ttft_ms": 18.0, "total_ms": 25.0, "reused": 1.0}]
+        lines = format_phase_report({"cold": cold, "keepalive": keepalive})
+        assert any(line.split()[:2] == ["TLS", "handshake"] and "30.00" in line for line in lines)
+        assert any("cold TTFT - keep-alive TTFT): 35.00 ms" in line for line in lines)
+        assert any("4.00 ms until headers" in line and "14.00 ms from headers" in line for line in lines)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -3,6 +3,7 @@
 summarize_export.py のユニットテスト
 """
 
+import json
 import sys
 from pathlib import Path
 
@@ -15,7 +16,16 @@ from summarize_export import (
     calculate_percentiles,
     count_errors,
     extract_tokens_per_sec,
+    get_record_value,
+    extract_request_span_ns,
+    parse_run_params,
+    load_client_calibration,
+    build_history_entry,
+    classify_error,
+    summarize_errors,
+    main,
 )
+from export_records import REQUEST_LATENCY_FIELDS, extract_metric_value
 
 
 class TestExtractMetricValues:
@@ -275,6 +285,212 @@ class TestExtractTokensPerSec:
         values = extract_tokens_per_sec(data)
         assert len(values) == 0
 
+    def test_same_latency_fields_as_metric_extraction(self):
+        """request latency の別名はどれも extract_metric_value と同じように認識されることを確認"""
+        for field in REQUEST_LATENCY_FIELDS:
+            for record in ({"token_count": 100, field: 500}, {"metrics": {"token_count": 100, field: 500}}):
+                assert extract_metric_value(record, "request_latency") == 500.0, field
+                assert extract_tokens_per_sec([record]) == [200.0], field
+
+
+class TestGetRecordValue:
+    """get_record_value関数のテスト"""
+
+    def test_lookup_order_and_dict_value(self):
+        """直接フィールド・metrics・metadataから探し、辞書形式はvalueを返すことを確認"""
+        record = {
+            "metrics": {"input_sequence_length": {"value": 120, "unit": "tokens"}},
+            "metadata": {"turn_index": 2},
+        }
+        assert get_record_value(record, ["input_sequence_length"]) == 120
+        assert get_record_value(record, ["turn_index"]) == 2
+        assert get_record_value(record, ["missing"]) is None
+
+    def test_first_candidate_wins(self):
+        """候補リストの先頭にあるフィールドが優先されることを確認"""
+        record = {"latency": 10, "metrics": {"request_latency": 20}}
+        assert get_record_value(record, ["request_latency", "latency"]) == 20
+
+
+class TestExtractRequestSpan:
+    """extract_request_span_ns関数のテスト"""
+
+    def test_from_metadata(self):
+        """metadata.request_start_ns / request_end_ns から抽出できることを確認"""
+        record = {"metadata": {"request_start_ns": 1000, "request_end_ns": 5000}}
+        assert extract_request_span_ns(record) == (1000, 5000)
+
+    def test_end_from_latency(self):
+        """終了時刻が無い場合は request_latency（ms）で補完されることを確認"""
+        record = {"metadata": {"request_start_ns": 1000}, "metrics": {"request_latency": 2.0}}
+        assert extract_request_span_ns(record) == (1000, 2_001_000)
+
+    def test_missing_start(self):
+        """開始時刻が無い場合はNoneを返すことを確認"""
+        assert extract_request_span_ns({"metrics": {"request_latency": 2.0}}) is None
+
+
+class TestParseRunParams:
+    """parse_run_params関数のテスト"""
+
+    def test_profile_dir(self):
+        """profileのディレクトリ名からISL/OSL/CONを読み取れることを確認"""
+        params = parse_run_params(Path("artifacts/ISL100_OSL200_CON10"))
+        assert params == {"mode": "profile", "isl": 100, "osl": 200, "concurrency": 10}
+
+    def test_prefixed_dir(self):
+        """モード接頭辞付きのディレクトリ名を扱えることを確認"""
+        params = parse_run_params(Path("artifacts/sweep_5_ISL100_OSL200_CON5"))
+        assert params["mode"] == "sweep_5"
+        assert params["concurrency"] == 5
+
+    def test_unknown_dir(self):
+        """形式が異なる場合はモード名のみ返すことを確認"""
+        assert parse_run_params(Path("artifacts/custom")) == {"mode": "custom"}
+
+
+class TestLoadClientCalibration:
+    """load_client_calibration関数のテスト"""
+
+    def test_nearest_concurrency(self, tmp_path):
+        """最も近いconcurrencyのキャリブレーション結果が選ばれることを確認"""
+        (tmp_path / "client_calibration.json").write_text(
+            '{"concurrency": {"1": {"max_request_rate": 50.0}, "20": {"max_request_rate": 800.0}}}',
+            encoding="utf-8",
+        )
+        calibration = load_client_calibration(tmp_path / "ISL100_OSL200_CON15")
+        assert calibration["concurrency"] == 20
+        assert calibration["max_request_rate"] == 800.0
+
+    def test_missing_file(self, tmp_path):
+        """キャリブレーションファイルが無い場合はNoneを返すことを確認"""
+        assert load_client_calibration(tmp_path / "ISL100_OSL200_CON10") is None
+
+
+class TestBuildHistoryEntry:
+    """build_history_entry関数のテスト"""
+
+    def test_uses_run_meta(self, tmp_path):
+        """run_meta.json があればその実行条件を使うことを確認"""
+        artifact_dir = tmp_path / "ISL100_OSL200_CON10"
+        artifact_dir.mkdir()
+        export_file = artifact_dir / "profile_export.jsonl"
+        export_file.write_text("{}\n", encoding="utf-8")
+        (artifact_dir / "run_meta.json").write_text(
+            '{"model": "m", "git_revision": "abc1234", "started_at_epoch": 1234.5}', encoding="utf-8"
+        )
+
+        entry = build_history_entry(artifact_dir, [export_file], 30, 2)
+        assert entry["model"] == "m"
+        assert entry["git_revision"] == "abc1234"
+        assert entry["run_at"] == 1234.5
+        assert entry["concurrency"] == 10
+        assert entry["error_count"] == 2
+
+    def test_without_run_meta(self, tmp_path):
+        """run_meta.json が無い場合はexportの更新時刻を実行時刻にすることを確認"""
+        artifact_dir = tmp_path / "ISL100_OSL200_CON10"
+        artifact_dir.mkdir()
+        export_file = artifact_dir / "profile_export.jsonl"
+        export_file.write_text("{}\n", encoding="utf-8")
+
+        entry = build_history_entry(artifact_dir, [export_file], 1, 0)
+        assert entry["run_at"] == export_file.stat().st_mtime
+        assert "model" not in entry
+
+
+class TestClassifyError:
+    """classify_error のテスト"""
+
+    def test_http_status_code(self):
+        """error.code のHTTPステータスで分類されることを確認"""
+        assert classify_error({"error": {"code": 429, "message": "Too Many Requests"}}) == "http_429"
+        assert classify_error({"error": {"code": 503}}) == "http_5xx"
+        assert classify_error({"error": {"code": 400}}) == "http_4xx"
+        assert classify_error({"error": {"code": 408}}) == "timeout"
+
+    def test_status_in_message(self):
+        """ステータスコードが message にしか無い場合も分類されることを確認"""
+        assert classify_error({"error": {"type": "ClientResponseError", "message": "HTTP 502 Bad Gateway"}}) == "http_5xx"
+        assert classify_error({"error": "rate limit exceeded"}) == "http_429"
+
+    def test_status_line_with_http_version(self):
+        """"HTTP/1.1 503" のようにバージョン付きのステータス行からも分類されることを確認"""
+        assert classify_error({"error": {"message": "HTTP/1.1 503 Service Unavailable"}}) == "http_5xx"
+        assert classify_error({"error": {"message": "HTTP/2 429 Too Many Requests"}}) == "http_429"
+        assert classify_error({"error": {"message": "upstream returned HTTP/1.0 404"}}) == "http_4xx"
+
+    def test_keywords(self):
+        """timeout / stream truncation をキーワードで判定することを確認"""
+        assert classify_error({"error": {"type": "TimeoutError", "message": ""}}) == "timeout"
+        assert classify_error({"error": {"message": "Response payload is not completed"}}) == "stream_truncated"
+        assert classify_error({"status": "failed"}) == "other"
+
+    def test_stream_truncated_requires_no_status(self):
+        """4xx の本文に "payload" などが含まれても stream_truncated にならないことを確認"""
+        assert classify_error({"error": {"message": "Invalid payload: missing field 'model'"}}) == "other"
+        assert classify_error({"error": {"code": 400, "message": "Response payload is not completed"}}) == "http_4xx"
+        assert classify_error({"error": {"code": 302, "message": "connection reset"}}) == "other"
+        assert classify_error({"error": {"type": "SSLError", "message": "unexpected EOF while reading"}}) == "stream_truncated"
+
+    def test_success_record(self):
+        """成功レコードは None を返すことを確認"""
+        assert classify_error({"metrics": {"request_latency": 10.0}}) is None
+
+
+class TestSummarizeErrors:
+    """summarize_errors のテスト"""
+
+    def test_counts_rates_and_latency(self):
+        """分類ごとの件数・割合・latency 分布を確認"""
+        data = [
+            {"metrics": {"request_latency": 100.0}},
+            {"metrics": {"request_latency": 120.0}},
+            {"error": {"code": 429}, "metrics": {"request_latency": 2.0}},
+            {"error": {"code": 429}, "metrics": {"request_latency": 4.0}},
+            {"error": {"code": 500}},
+        ]
+        result = summarize_errors(data)
+        assert list(result) == ["http_429", "http_5xx"]
+        assert result["http_429"]["count"] == 2
+        assert result["http_429"]["rate"] == pytest.approx(0.4)
+        assert result["http_429"]["latency"]["avg"] == pytest.approx(3.0)
+        assert result["http_5xx"]["latency"] is None
+
+    def test_no_errors(self):
+        """エラーが無ければ空になることを確認"""
+        assert summarize_errors([{"metrics": {"request_latency": 1.0}}]) == {}
+
+
+class TestMainErrorAwareStats:
+    """main のエラーを除いたパーセンタイルのテスト"""
+
+    def test_success_only_and_all_requests_rows(self, tmp_path, monkeypatch):
+        """成功のみの行と (all requests) 行・エラー分類の行が出力されることを確認"""
+        artifact_dir = tmp_path / "ISL100_OSL200_CON2"
+        artifact_dir.mkdir()
+        records = [{"metrics": {"request_latency": {"value": 100.0, "unit": "ms"}}} for _ in range(4)]
+        records.append({"error": {"code": 429}, "metrics": {"request_latency": {"value": 1.0, "unit": "ms"}}})
+        (artifact_dir / "profile_export.jsonl").write_text(
+            "\n".join(json.dumps(r) for r in records) + "\n", encoding="utf-8"
+        )
+        monkeypatch.chdir(tmp_path)
+
+        main([str(artifact_dir), "--no-history", "--timeseries-format", "none"])
+
+        rows = {line.split("\t")[0]: line.split("\t") for line in (tmp_path / "summary.tsv").read_text().splitlines()}
+        assert rows["Request Latency"][1] == "100.00"
+        assert rows["metric"][-2:] == ["errors", "error_rate"]
+        assert rows["Request Latency"][6:] == ["4", "0", "0.00"]
+        assert rows["Request Latency (all requests)"][6:] == ["5", "1", "20.00"]
+        assert rows["Error: HTTP 429 (Rate Limited)"][6:] == ["1", "1", "20.00"]
+        assert "## Errors" in (tmp_path / "summary.md").read_text(encoding="utf-8")
+
+        run_summary = json.loads((tmp_path / "summary.json").read_text(encoding="utf-8"))
+        assert run_summary["labels"]["con"] == "2"
+        assert run_summary["requests"]["errors_by_category"]["http_429"] == 1
+        assert "aiperf_request_latency_seconds_count" in (tmp_path / "summary.prom").read_text(encoding="utf-8")
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
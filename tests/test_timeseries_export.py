@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+timeseries_export.py のユニットテスト
+"""
+
+import csv
+import json
+import sys
+from pathlib import Path
+
+# scriptsディレクトリをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import numpy as np
+import pytest
+import timeseries_export
+from timeseries_export import (
+    build_request_arrays,
+    compute_timeseries,
+    export_timeseries,
+)
+
+SEC = 1_000_000_000
+T0 = 1_700_000_000 * SEC
+
+
+def make_record(start_sec, end_sec, ttft_ms=None, tokens=None, error=None):
+    record = {
+        "metadata": {"request_start_ns": T0 + int(start_sec * SEC), "request_end_ns": T0 + int(end_sec * SEC)},
+        "metrics": {},
+        "error": error,
+    }
+    if ttft_ms is not None:
+        record["metrics"]["time_to_first_token"] = {"value": ttft_ms, "unit": "ms"}
+    if tokens is not None:
+        record["metrics"]["output_token_count"] = {"value": tokens, "unit": "tokens"}
+    return record
+
+
+class TestComputeTimeseries:
+    """compute_timeseries関数のテスト"""
+
+    def test_counts_and_in_flight(self):
+        """開始/完了数とビン終了時点のin-flight数が正しいことを確認"""
+        data = [make_record(0.1, 0.5), make_record(0.2, 2.5), make_record(1.5, 2.2)]
+        series = compute_timeseries(build_request_arrays(data))
+
+        assert series["requests_started"].tolist() == [2, 1, 0]
+        assert series["requests_completed"].tolist() == [1, 0, 2]
+        assert series["in_flight"].tolist() == [1, 2, 0]
+        assert series["timestamp"][0] == pytest.approx(1_700_000_000.1)
+
+    def test_tokens_spread_over_decode_interval(self):
+        """出力トークンが最初のトークン〜終了の区間に按分されることを確認"""
+        # 最初のトークンは 0.5秒、終了は 3.5秒 → 300トークンを3秒間で 100 tokens/s
+        data = [make_record(0.0, 3.5, ttft_ms=500.0, tokens=300)]
+        series = compute_timeseries(build_request_arrays(data))
+
+        np.testing.assert_allclose(series["output_tokens_per_sec"], [50.0, 100.0, 100.0, 50.0])
+        assert series["output_tokens_per_sec"].sum() == pytest.approx(300.0)
+
+    def test_errors_excluded_from_tokens_and_ttft(self):
+        """エラーは完了ビンに数えられ、tokens/sとTTFTからは除外されることを確認"""
+        data = [
+            make_record(0.0, 0.5, ttft_ms=100.0, tokens=10),
+            make_record(0.0, 1.5, ttft_ms=5.0, tokens=10, error={"code": 429}),
+        ]
+        series = compute_timeseries(build_request_arrays(data))
+
+        assert series["errors"].tolist() == [0, 1]
+        assert series["output_tokens_per_sec"].sum() == pytest.approx(10.0)
+        assert series["ttft_p95_rolling_ms"][0] == pytest.approx(100.0)
+
+    def test_rolling_ttft_window(self):
+        """TTFT p95 が直近ウィンドウのリクエストだけで計算されることを確認"""
+        data = [make_record(0.0, 0.5, ttft_ms=100.0), make_record(3.0, 3.5, ttft_ms=300.0)]
+        series = compute_timeseries(build_request_arrays(data), ttft_window_sec=2.0)
+
+        ttft = series["ttft_p95_rolling_ms"]
+        assert ttft[0] == pytest.approx(100.0)
+        assert ttft[1] == pytest.approx(100.0)
+        assert np.isnan(ttft[2])
+        assert ttft[3] == pytest.approx(300.0)
+
+    def test_rolling_percentile_matches_numpy(self, monkeypatch):
+        """一括計算した分位点が np.percentile と一致することを確認（チャンク分割あり）"""
+        monkeypatch.setattr(timeseries_export, "PERCENTILE_CHUNK_ELEMENTS", 7)
+        rng = np.random.default_rng(0)
+        event_bin = rng.integers(0, 30, 200)
+        values = rng.random(200) * 1000
+        result = timeseries_export._rolling_percentile(event_bin, values, 32, 4, 95)
+        for k in range(32):
+            window = values[(event_bin >= k - 3) & (event_bin <= k)]
+            if window.size:
+                assert result[k] == pytest.approx(np.percentile(window, 95))
+            else:
+                assert np.isnan(result[k])
+
+
+class TestExportTimeseries:
+    """export_timeseries関数のテスト"""
+
+    def test_csv(self, tmp_path):
+        """CSVのサイドカーが書き出されることを確認"""
+        path = export_timeseries([make_record(0.0, 1.5, ttft_ms=100.0, tokens=10)], tmp_path)
+        assert path == tmp_path / "timeseries.csv"
+        rows = list(csv.DictReader(path.open(encoding="utf-8")))
+        assert len(rows) == 2
+        assert rows[0]["requests_started"] == "1"
+
+    def test_jsonl(self, tmp_path):
+        """JSONLでは欠損値がnullになることを確認"""
+        path = export_timeseries([make_record(0.0, 1.5)], tmp_path, "jsonl")
+        rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert rows[0]["ttft_p95_rolling_ms"] is None
+
+    def test_without_timestamps(self, tmp_path):
+        """タイムスタンプが無い場合は何も書き出さないことを確認"""
+        assert export_timeseries([{"metrics": {"time_to_first_token": 1.0}}], tmp_path) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])